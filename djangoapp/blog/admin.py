@@ -1,17 +1,43 @@
 from django.contrib import admin
-from django.forms import ModelForm
+from django.contrib.admin.views.main import ChangeList
+from django.db.models import Q
+from django.forms import BaseModelFormSet, ModelForm
 from django.http import HttpRequest
 from blog.models import Tag, Category, Page, Post
+from blog.pagination import EstimatedCountPaginator
+from blog.search import get_search_backend
 from typing import Any
 from django_summernote.admin import SummernoteModelAdmin
 from django.utils.safestring import mark_safe
+from images.jobs import get_status
+
+
+class FastChangeListMixin:
+    """
+    Changelists that stay usable on big tables: no COUNT(*) of the whole
+    table (estimated above BLOG_ADMIN_ESTIMATED_COUNT_THRESHOLD rows, and
+    no "N total" next to the filtered count) and numbers searched as an
+    exact id instead of an icontains over id::text.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(
+            request, queryset, search_term)
+        term = search_term.strip()
+        if term.isdigit():
+            results |= queryset.filter(pk=int(term))
+        return results, may_have_duplicates
 
 
 @admin.register(Tag)
-class TagAdmin(admin.ModelAdmin):
+class TagAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = 'id', 'name', 'slug',
     list_display_links = 'name',
-    search_fields = 'id', 'name', 'slug',
+    search_fields = 'name', 'slug',
     list_per_page = 10
     ordering = '-id',
     prepopulated_fields = {
@@ -20,10 +46,10 @@ class TagAdmin(admin.ModelAdmin):
 
 
 @admin.register(Category)
-class CategoryAdmin(admin.ModelAdmin):
+class CategoryAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = 'id', 'name', 'slug',
     list_display_links = 'name',
-    search_fields = 'id', 'name', 'slug',
+    search_fields = 'name', 'slug',
     list_per_page = 10
     ordering = '-id',
     prepopulated_fields = {
@@ -32,11 +58,11 @@ class CategoryAdmin(admin.ModelAdmin):
 
 
 @admin.register(Page)
-class PageAdmin(SummernoteModelAdmin):
+class PageAdmin(FastChangeListMixin, SummernoteModelAdmin):
     summernote_fields = 'content',
     list_display = 'id', 'title', 'slug', 'is_published',
     list_display_links = 'title',
-    search_fields = 'id', 'title', 'slug',
+    search_fields = 'title', 'slug',
     list_per_page = 10
     ordering = '-id',
     prepopulated_fields = {
@@ -45,18 +71,37 @@ class PageAdmin(SummernoteModelAdmin):
     list_editable = 'is_published',
 
 
+class PostChangeListFormSet(BaseModelFormSet):
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        # the hidden id field looks its post up again
+        pk_field = form.fields[self._pk_field.name]
+        pk_field.queryset = pk_field.queryset.defer(*PostChangeList.deferred)
+
+
+class PostChangeList(ChangeList):
+    # 50 rows of post HTML nobody sees in the list
+    deferred = 'content', 'rendered_content', 'rendered_toc', 'search_vector'
+
+    def get_queryset(self, request, exclude_parameters=None):
+        return super().get_queryset(
+            request, exclude_parameters).defer(*self.deferred)
+
+
 @admin.register(Post)
-class PostAdmin(SummernoteModelAdmin):
+class PostAdmin(FastChangeListMixin, SummernoteModelAdmin):
     summernote_fields = 'content',
     list_display = 'id', 'title', 'is_published',  'created_by',
     list_display_links = 'title',
-    search_fields = 'id', 'slug', 'title', 'excerpt', 'content',
+    list_select_related = 'created_by',
+    # see get_search_results
+    search_fields = 'slug',
     list_per_page = 50
     list_filter = 'category', 'is_published',
     list_editable = 'is_published',
     ordering = '-id',
     readonly_fields = ('created_at', 'updated_at', 'created_by',
-                       'updated_by', 'link',)
+                       'updated_by', 'link', 'cover_status',)
     prepopulated_fields = {
         "slug": ('title',),
     }
@@ -72,6 +117,38 @@ class PostAdmin(SummernoteModelAdmin):
 
         return safe_link
 
+    def get_changelist(self, request, **kwargs):
+        return PostChangeList
+
+    def get_changelist_formset(self, request, **kwargs):
+        kwargs.setdefault('formset', PostChangeListFormSet)
+        return super().get_changelist_formset(request, **kwargs)
+
+    def _get_list_editable_queryset(self, request, prefix):
+        # the rows saved by list_editable only change is_published: Post.save
+        # skips the rendering when the content isn't loaded
+        return super()._get_list_editable_queryset(
+            request, prefix).defer(*PostChangeList.deferred)
+
+    def get_search_results(self, request, queryset, search_term):
+        # the indexed search backend of the site search (title, excerpt and
+        # content) instead of icontains over every post's HTML, plus the
+        # exact slug and id
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        matches = get_search_backend().search(Post.objects.all(), term)
+        condition = Q(pk__in=matches.values('pk')) | Q(slug=term)
+        if term.isdigit():
+            condition |= Q(pk=int(term))
+        return queryset.filter(condition), False
+
+    @admin.display(description='Processamento da capa')
+    def cover_status(self, obj):
+        if not obj.cover:
+            return '-'
+        return get_status(obj.cover.name)
+
     def save_model(self, request: HttpRequest, obj: Any,
                    form: ModelForm, change: bool) -> None:
 
@@ -79,4 +156,11 @@ class PostAdmin(SummernoteModelAdmin):
             obj.updated_by = request.user
         else:
             obj.created_by = request.user
+
+        if 'content' in obj.get_deferred_fields():
+            # a list_editable row: only the columns its form changed, so the
+            # post isn't rendered or indexed again
+            obj.save(update_fields={
+                *form.changed_data, 'updated_by', 'updated_at'})
+            return
         obj.save()
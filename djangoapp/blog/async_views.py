@@ -0,0 +1,149 @@
+"""
+Async versions of the views in blog.views, used when
+settings.BLOG_ASYNC_VIEWS is on (see blog/urls.py). Meant for ASGI
+(SERVER_MODE=asgi): under WSGI django runs them in an event loop per request.
+
+Every query, the post count of the pagination included, goes through the
+async ORM before the template is rendered, so rendering never hits the
+database. Django 5.1 still runs each query in a
+thread (sync_to_async), but the request only holds that thread while the
+query runs instead of for the whole request.
+"""
+from django.contrib.auth.models import User
+from django.core.paginator import InvalidPage
+from django.http import Http404
+from django.shortcuts import redirect
+
+from blog import views
+from blog.cards import as_cards, related_cards
+from blog.pagination import CursorPaginator, InvalidCursor
+from blog.slugs import aget_by_slug
+from site_setup.cache import aget_snapshot
+
+
+class AsyncListMixin:
+    """
+    Paginates with the async ORM in get(). ListView.get_context_data then
+    reuses that page instead of paginating (and querying) again.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        request.site_setup_snapshot = await aget_snapshot()
+        await self.aprepare()
+        self.object_list = self.get_queryset()
+        self._paginated = await self.apaginate_queryset(
+            self.object_list, self.get_paginate_by(self.object_list))
+
+        if not self.get_allow_empty() and not self._paginated[2]:
+            raise Http404('Nenhum post encontrado')
+        return self.render_to_response(self.get_context_data())
+
+    async def aprepare(self) -> None:
+        # loads what get_queryset()/get_context_data() need from the database
+        pass
+
+    def paginate_queryset(self, queryset, page_size):
+        return self._paginated
+
+    async def apaginate_queryset(self, queryset, page_size):
+        queryset = as_cards(queryset)
+
+        if self.uses_cursor_pagination():
+            paginator = CursorPaginator(queryset, page_size)
+            try:
+                page = await paginator.apage(self.request.GET.get('cursor'))
+            except InvalidCursor:
+                raise Http404('Página inválida')
+            # for the "N posts" of _pagination.html
+            await paginator.acount()
+            return paginator, page, page.object_list, page.has_other_pages()
+
+        paginator = self.get_paginator(
+            queryset, page_size, orphans=self.get_paginate_orphans(),
+            allow_empty_first_page=self.get_allow_empty())
+        # Paginator.count is a cached_property: set it so nothing counts
+        # synchronously later
+        paginator.count = await queryset.acount()
+
+        page_number = self.request.GET.get(self.page_kwarg) or 1
+        try:
+            page_number = int(page_number)
+        except ValueError:
+            if page_number != 'last':
+                raise Http404('Página inválida')
+            page_number = paginator.num_pages
+
+        try:
+            page = paginator.page(page_number)
+        except InvalidPage:
+            raise Http404('Página inválida')
+        page.object_list = [card async for card in page.object_list]
+        return paginator, page, page.object_list, page.has_other_pages()
+
+
+class PostListView(AsyncListMixin, views.PostListView):
+    pass
+
+
+class CreatedByListView(AsyncListMixin, views.CreatedByListView):
+    async def aprepare(self):
+        author_id = self.kwargs.get('author_id')
+        user = await User.objects.filter(id=author_id).afirst()
+        if user is None:
+            raise Http404()
+        self._temp_context.update({'author_id': author_id, 'user': user})
+
+
+class SlugListMixin:
+    async def aprepare(self):
+        target = await aget_by_slug(self.slug_model, self.kwargs.get('slug'))
+        if target is None:
+            raise Http404()
+        # what views.SlugListMixin.target would look up synchronously
+        self.target = target
+
+
+class CategoryListView(SlugListMixin, AsyncListMixin,
+                       views.CategoryListView):
+    pass
+
+
+class TagListView(SlugListMixin, AsyncListMixin, views.TagListView):
+    pass
+
+
+class SearchListView(AsyncListMixin, views.SearchListView):
+    async def get(self, request, *args, **kwargs):
+        if self._search_value == '':
+            return redirect('blog:index')
+        return await super().get(request, *args, **kwargs)
+
+
+class AsyncDetailMixin:
+    async def get(self, request, *args, **kwargs):
+        request.site_setup_snapshot = await aget_snapshot()
+        slug = self.kwargs.get(self.slug_url_kwarg)
+        queryset = self.get_queryset()
+        try:
+            self.object = await queryset.aget(
+                **{self.get_slug_field(): slug})
+        except queryset.model.DoesNotExist:
+            raise Http404('Nenhum resultado encontrado')
+        await self.aprepare()
+        return self.render_to_response(
+            self.get_context_data(object=self.object))
+
+    async def aprepare(self) -> None:
+        # loads what get_context_data() needs besides the object
+        pass
+
+
+class PageDetailView(AsyncDetailMixin, views.PageDetailView):
+    pass
+
+
+class PostDetailView(AsyncDetailMixin, views.PostDetailView):
+    async def aprepare(self):
+        # what views.PostDetailView.related_posts would query synchronously
+        self.related_posts = [
+            card async for card in related_cards(self.object.pk)]
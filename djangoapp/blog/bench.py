@@ -0,0 +1,103 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+from django.urls import reverse
+
+from blog.models import Category, Page, Post, Tag
+from blog.views import PER_PAGE
+
+
+def sample_urls() -> dict[str, str]:
+    """
+    One URL per public blog view (plus a deep listing page), built from
+    whatever published data is in the database. Views without data to show
+    are left out.
+    """
+    published = Post.objects.get_published()
+    index = reverse('blog:index')
+    urls = {'index': index}
+
+    last_page = -(-published.count() // PER_PAGE)
+    if last_page >= 2:
+        urls['index_page_2'] = index + '?page=2'
+    if last_page > 2:
+        urls['index_last_page'] = index + f'?page={last_page}'
+
+    post = published.first()
+    if post is not None:
+        urls['post'] = reverse('blog:post', args=(post.slug,))
+        urls['search'] = reverse('blog:search') + '?' + urlencode(
+            {'search': post.title.split()[0]})
+    author_id = published.filter(created_by__isnull=False).values_list(
+        'created_by_id', flat=True).first()
+    if author_id is not None:
+        urls['created_by'] = reverse('blog:created_by', args=(author_id,))
+    category = Category.objects.filter(post__is_published=True).first()
+    if category is not None:
+        urls['category'] = reverse('blog:category', args=(category.slug,))
+    tag = Tag.objects.filter(post__is_published=True).first()
+    if tag is not None:
+        urls['tag'] = reverse('blog:tag', args=(tag.slug,))
+    page = Page.objects.filter(is_published=True).first()
+    if page is not None:
+        urls['page'] = reverse('blog:page', args=(page.slug,))
+    return urls
+
+
+def fetch(url: str, timeout: float = 30) -> tuple[float, int]:
+    start = time.perf_counter()
+    try:
+        with urlopen(url, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except HTTPError as error:
+        status = error.code
+    return time.perf_counter() - start, status
+
+
+def fetch_or_fail(url: str) -> tuple[float, int]:
+    # refused/reset connections and timeouts count as errors (status 0)
+    start = time.perf_counter()
+    try:
+        return fetch(url)
+    except OSError:
+        return time.perf_counter() - start, 0
+
+
+def load(url: str, requests: int, concurrency: int, warmup: int = 0):
+    """
+    GETs url requests times from concurrency threads. Returns the latency and
+    status of each request and the wall time of the whole run.
+    """
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(fetch_or_fail, [url] * warmup))
+        start = time.perf_counter()
+        results = list(pool.map(fetch_or_fail, [url] * requests))
+        elapsed = time.perf_counter() - start
+    return results, elapsed
+
+
+def summarize(name, url, mode, timings, errors, elapsed, queries):
+    timings_ms = sorted(t * 1000 for t in timings)
+    if len(timings_ms) > 1:
+        centiles = statistics.quantiles(timings_ms, n=100, method='inclusive')
+        p50, p95, p99 = centiles[49], centiles[94], centiles[98]
+    else:
+        p50 = p95 = p99 = timings_ms[0] if timings_ms else 0
+    return {
+        'view': name,
+        'url': url,
+        'mode': mode,
+        'requests': len(timings),
+        'errors': errors,
+        'p50_ms': round(p50, 3),
+        'p95_ms': round(p95, 3),
+        'p99_ms': round(p99, 3),
+        'mean_ms': round(statistics.fmean(timings_ms), 3) if timings else 0,
+        'rps': round(len(timings) / elapsed, 1) if elapsed else 0,
+        'queries': max(queries) if queries else 0,
+    }
@@ -0,0 +1,76 @@
+from django.db.models import OuterRef, Subquery
+from django.db.models.query import QuerySet, ValuesListIterable
+from django.urls import reverse
+
+from blog.models import Post
+from images.models import ImageRendition
+
+COVER_FIELD = Post._meta.get_field('cover')
+
+# the newest rendition of the cover (None without renditions): changes when
+# they are generated, so it goes in the key of the card fragments next to
+# updated_at
+COVER_VERSION = Subquery(ImageRendition.objects.filter(
+    source_name=OuterRef('cover')).order_by('-pk').values('pk')[:1])
+
+
+class PostCard:
+    """
+    What _post-card.html needs from a post, without the content column and
+    with the URL reversed once.
+    """
+
+    __slots__ = ('id', 'title', 'slug', 'excerpt', 'cover', 'updated_at',
+                 'cover_version', 'url')
+    fields = ('id', 'title', 'slug', 'excerpt', 'cover', 'updated_at',
+              'cover_version')
+
+    def __init__(self, id, title, slug, excerpt, cover, updated_at,
+                 cover_version=None, url=None):
+        self.id = id
+        self.title = title
+        self.slug = slug
+        self.excerpt = excerpt
+        # a FieldFile, so {% responsive_image %} and .url keep working
+        self.cover = COVER_FIELD.attr_class(None, COVER_FIELD, cover)
+        self.updated_at = updated_at
+        self.cover_version = cover_version
+        self.url = url or reverse('blog:post', args=(slug,))
+
+    @property
+    def pk(self):
+        return self.id
+
+    def get_absolute_url(self):
+        return self.url
+
+
+class PostCardIterable(ValuesListIterable):
+    slug_marker = 'slug-marker'
+
+    def __iter__(self):
+        # one reverse() per query: slugs never need quoting in the URL
+        url = reverse('blog:post', args=(self.slug_marker,))
+        for row in super().__iter__():
+            yield PostCard(*row, url=url.replace(self.slug_marker, row[2]))
+
+
+def as_cards(queryset: QuerySet) -> QuerySet:
+    """
+    Same filters and ordering as queryset, but only selects the card columns
+    and yields PostCard objects.
+    """
+    cards = queryset.annotate(cover_version=COVER_VERSION).values_list(
+        *PostCard.fields)
+    cards._iterable_class = PostCardIterable
+    return cards
+
+
+def related_cards(post_id: int) -> QuerySet:
+    """
+    The published RelatedPost of the post, in rank order: one query on the
+    (post, rank) index.
+    """
+    return as_cards(Post.objects.filter(
+        is_published=True, related_to__post_id=post_id,
+    ).order_by('related_to__rank'))
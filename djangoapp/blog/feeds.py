@@ -0,0 +1,66 @@
+"""
+RSS/Atom feeds of the latest posts (blog.views.PostFeedView and the
+category, tag and author feeds).
+
+A feed is built from a values() projection of the listing's queryset, without
+loading the content or any related object, and cached by CachedPageMixin
+under the same tags as the listing it mirrors.
+"""
+from django.conf import settings
+from django.db.models import QuerySet
+from django.http import HttpRequest
+from django.urls import reverse
+from django.utils import feedgenerator
+
+from site_setup.cache import get_snapshot
+
+FEED_FIELDS = (
+    'slug', 'title', 'excerpt', 'created_at', 'updated_at',
+    'created_by__username', 'created_by__first_name',
+    'created_by__last_name', 'category__name',
+)
+FEED_TYPES = {
+    'rss': feedgenerator.Rss201rev2Feed,
+    'atom': feedgenerator.Atom1Feed,
+}
+
+
+def feed_items(queryset: QuerySet) -> list[dict]:
+    """The latest BLOG_FEED_ITEMS posts of queryset, newest first."""
+    limit = getattr(settings, 'BLOG_FEED_ITEMS', 20)
+    return list(queryset.order_by('-pk').values(*FEED_FIELDS)[:limit])
+
+
+def _author_name(item: dict) -> str | None:
+    if item['created_by__first_name']:
+        return (f'{item["created_by__first_name"]} '
+                f'{item["created_by__last_name"]}').strip()
+    return item['created_by__username']
+
+
+def build_feed(request: HttpRequest, feed_type: str, title: str, link: str,
+               items: list[dict]) -> feedgenerator.SyndicationFeed:
+    snapshot = get_snapshot()
+    site_title = snapshot.title if snapshot else 'Blog'
+    feed = FEED_TYPES[feed_type](
+        title=f'{title} - {site_title}' if title else site_title,
+        link=request.build_absolute_uri(link),
+        description=snapshot.description if snapshot else '',
+        feed_url=request.build_absolute_uri(),
+        language=settings.LANGUAGE_CODE,
+    )
+    for item in items:
+        url = request.build_absolute_uri(
+            reverse('blog:post', args=(item['slug'],)))
+        feed.add_item(
+            title=item['title'],
+            link=url,
+            description=item['excerpt'],
+            unique_id=url,
+            pubdate=item['created_at'],
+            updateddate=item['updated_at'],
+            author_name=_author_name(item),
+            categories=[item['category__name']]
+            if item['category__name'] else None,
+        )
+    return feed
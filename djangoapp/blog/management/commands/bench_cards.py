@@ -0,0 +1,95 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.template import engines
+
+from blog.cards import COVER_VERSION, PostCard, as_cards
+from blog.models import Post
+from blog.views import PER_PAGE
+
+# _post-card.html before the card projection: full Post rows and three
+# get_absolute_url() calls per card
+LEGACY_CARD = '''{% load responsive_images %}{% for post in posts %}
+<article class="card">
+    {% if post.cover %}
+      <div class="card-cover-wrapper">
+        <a href="{{post.get_absolute_url}}" class="card-cover-link">
+        {% responsive_image post.cover alt=post.title css_class="card-cover" %}
+        </a>
+      </div>
+    {% endif %}
+    <h2 class="card-title">
+      <a href="{{post.get_absolute_url}}">{{post.title}}</a>
+    </h2>
+    <p class="card-content">{{post.excerpt}}</p>
+    <a class="card-action-link" href="{{post.get_absolute_url}}">Read</a>
+</article>{% endfor %}'''
+
+CARDS = '''{% for post in posts %}
+{% include 'blog/partials/_post-card.html' %}{% endfor %}'''
+
+
+def row_bytes(row) -> int:
+    return sum(len(str(value).encode()) for value in row if value is not None)
+
+
+class Command(BaseCommand):
+    help = ('Compares rows/bytes fetched and render time of the listing '
+            'pages with full Post rows and with PostCard.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def measure(self, name, fetch, columns, template, pages, repeat):
+        engine = engines['django']
+        template = engine.from_string(template)
+        # PostCard.cover_version is an annotation of as_cards()
+        published = Post.objects.get_published().annotate(
+            cover_version=COVER_VERSION)
+
+        rows = transferred = 0
+        for page in range(pages):
+            page_rows = list(
+                published.values_list(*columns)[
+                    page * PER_PAGE:(page + 1) * PER_PAGE])
+            rows += len(page_rows)
+            transferred += sum(row_bytes(row) for row in page_rows)
+
+        fetch_time = render_time = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            all_posts = [
+                list(fetch()[page * PER_PAGE:(page + 1) * PER_PAGE])
+                for page in range(pages)
+            ]
+            fetched = time.perf_counter()
+            for posts in all_posts:
+                template.render({'posts': posts})
+            rendered = time.perf_counter()
+            fetch_time = min(fetch_time, fetched - start)
+            render_time = min(render_time, rendered - fetched)
+
+        return {
+            'projection': name,
+            'pages': pages,
+            'rows': rows,
+            'bytes': transferred,
+            'fetch_ms': round(fetch_time * 1000, 2),
+            'render_ms': round(render_time * 1000, 2),
+        }
+
+    def handle(self, *args, **options):
+        pages, repeat = options['pages'], options['repeat']
+        post_columns = [field.attname for field in Post._meta.concrete_fields]
+
+        results = [
+            self.measure(
+                'post', Post.objects.get_published, post_columns,
+                LEGACY_CARD, pages, repeat),
+            self.measure(
+                'card', lambda: as_cards(Post.objects.get_published()),
+                PostCard.fields, CARDS, pages, repeat),
+        ]
+        self.stdout.write(json.dumps(results, indent=2))
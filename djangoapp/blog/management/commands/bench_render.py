@@ -0,0 +1,103 @@
+import json
+import statistics
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.template import Engine, engines
+from django.template.context import make_context
+from django.test import RequestFactory, override_settings
+
+from blog import views
+from blog.templatetags.fragments import fragments
+
+LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+
+def make_engine(cached: bool) -> Engine:
+    # the settings' engine, with or without the cached loader
+    engine = engines['django'].engine
+    return Engine(
+        dirs=engine.dirs,
+        context_processors=engine.context_processors,
+        loaders=[('django.template.loaders.cached.Loader', LOADERS)]
+        if cached else LOADERS,
+        libraries=engine.libraries,
+        debug=False,
+    )
+
+
+class Command(BaseCommand):
+    help = ('Renders the first index page (9 post cards) with and without '
+            'the cached template loader and the {% fragment %} cache. '
+            'Prints the render times as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=500)
+        parser.add_argument('--warmup', type=int, default=20)
+
+    def index_context(self, request):
+        with override_settings(BLOG_PAGE_CACHE_ENABLED=False):
+            response = views.PostListView.as_view()(request)
+        if not response.context_data['posts']:
+            raise CommandError('No published posts: run seed_blog first.')
+        return response.template_name[0], response.context_data
+
+    def measure(self, request, template_name, context, cached, fragment_size,
+                options):
+        engine = make_engine(cached)
+        fragments.clear()
+
+        def render():
+            # a request loads the template (and its includes) again unless
+            # the loader caches them
+            start = time.perf_counter()
+            engine.get_template(template_name).render(
+                make_context(context, request))
+            return time.perf_counter() - start
+
+        with override_settings(BLOG_FRAGMENT_CACHE_SIZE=fragment_size):
+            for _ in range(options['warmup']):
+                render()
+            timings = [render() for _ in range(options['repeat'])]
+
+        timings.sort()
+        return {
+            'cached_loader': cached,
+            'fragments': bool(fragment_size),
+            'p50_ms': round(statistics.median(timings) * 1000, 3),
+            'p95_ms': round(
+                timings[int(len(timings) * 0.95) - 1] * 1000, 3),
+            'mean_ms': round(statistics.fmean(timings) * 1000, 3),
+        }
+
+    def handle(self, *args, **options):
+        options['repeat'] = max(1, options['repeat'])
+        cache.clear()
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        template_name, context = self.index_context(request)
+
+        results = []
+        for cached, fragment_size in ((False, 0), (True, 0), (True, 2000)):
+            row = self.measure(request, template_name, context, cached,
+                               fragment_size, options)
+            results.append(row)
+            self.stderr.write(
+                f'cached loader {cached!s:<5} fragments '
+                f'{row["fragments"]!s:<5} p50 {row["p50_ms"]:.3f}ms '
+                f'p95 {row["p95_ms"]:.3f}ms')
+
+        report = {
+            'meta': {
+                'template': template_name,
+                'cards': len(context['posts']),
+                'repeat': options['repeat'],
+            },
+            'results': results,
+        }
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,210 @@
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.bench import fetch, load, sample_urls, summarize
+
+# name: (command, extra environment)
+SERVERS = {
+    'runserver': (
+        [sys.executable, 'manage.py', 'runserver', '--noreload', '{bind}'],
+        {},
+    ),
+    'gunicorn-wsgi': (
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py',
+         '--bind', '{bind}'],
+        {'SERVER_MODE': 'wsgi', 'GUNICORN_ACCESSLOG': ''},
+    ),
+    'gunicorn-asgi': (
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py',
+         '--bind', '{bind}'],
+        {'SERVER_MODE': 'asgi', 'GUNICORN_ACCESSLOG': ''},
+    ),
+    # the same ASGI workers with blog.async_views
+    'gunicorn-asgi-async': (
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py',
+         '--bind', '{bind}'],
+        {'SERVER_MODE': 'asgi', 'BLOG_ASYNC_VIEWS': '1',
+         'GUNICORN_ACCESSLOG': ''},
+    ),
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def process_tree(pid: int) -> list[int]:
+    pids = [pid]
+    for task in Path(f'/proc/{pid}/task').glob('*/children'):
+        for child in task.read_text().split():
+            pids += process_tree(int(child))
+    return pids
+
+
+def pss_mb(pid: int) -> float | None:
+    # proportional set size: pages shared copy-on-write between the master
+    # and its workers are split between them instead of counted in each
+    total = 0
+    try:
+        for member in process_tree(pid):
+            rollup = Path(f'/proc/{member}/smaps_rollup').read_text()
+            for line in rollup.splitlines():
+                if line.startswith('Pss:'):
+                    total += int(line.split()[1])
+    except OSError:
+        return None
+    return round(total / 1024, 1)
+
+
+class Command(BaseCommand):
+    help = ('Starts the development server and gunicorn (WSGI workers, ASGI '
+            'workers with the sync and with the async views) and compares '
+            'their latency, requests/s, errors and memory on every blog '
+            'view, at one or more client concurrencies. Prints JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--server', choices=SERVERS, action='append',
+            help='Repeatable, defaults to every server.')
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument(
+            '--concurrency', type=int, action='append',
+            help='Concurrent clients, repeatable to compare how many '
+                 'connections each server takes (default 16).')
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument(
+            '--workers', type=int,
+            help='GUNICORN_WORKERS, defaults to gunicorn.conf.py.')
+        parser.add_argument(
+            '--view', action='append',
+            help='Only benchmarks these views (repeatable).')
+        parser.add_argument(
+            '--page-cache', action='store_true',
+            help='Keeps the page cache on (off by default).')
+        parser.add_argument('--output', help='Also writes the JSON here.')
+
+    def start(self, name, port, options):
+        command, extra_env = SERVERS[name]
+        env = {
+            **os.environ,
+            **extra_env,
+            'DEBUG': '0',
+            'ALLOWED_HOSTS': '127.0.0.1',
+            'BLOG_PAGE_CACHE': str(int(options['page_cache'])),
+        }
+        if options['workers']:
+            env['GUNICORN_WORKERS'] = str(options['workers'])
+        if settings.CACHES['default']['BACKEND'].endswith('.LocMemCache'):
+            # gunicorn.conf.py refuses a per-process cache with several
+            # workers: they share a cache directory instead
+            env['CACHE_BACKEND'] = (
+                'django.core.cache.backends.filebased.FileBasedCache')
+            env['CACHE_LOCATION'] = tempfile.mkdtemp(prefix='bench-cache-')
+
+        process = subprocess.Popen(
+            [part.format(bind=f'127.0.0.1:{port}') for part in command],
+            cwd=settings.BASE_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f'{name} exited with {process.returncode}')
+            try:
+                fetch(f'http://127.0.0.1:{port}/')
+                return process
+            except OSError:
+                time.sleep(0.2)
+        self.stop(process)
+        raise CommandError(f'{name} did not start in 30s')
+
+    def stop(self, process):
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    def run_level(self, name, port, urls, concurrency, options):
+        views = []
+        for view, path in urls.items():
+            results, elapsed = load(
+                f'http://127.0.0.1:{port}{path}', options['requests'],
+                concurrency, options['warmup'])
+            row = summarize(
+                view, path, name, [timing for timing, _ in results],
+                sum(not 0 < status < 400 for _, status in results), elapsed,
+                [])
+            del row['queries']
+            views.append(row)
+            self.stderr.write(
+                f'{name:<19} {concurrency:>4} {view:<16} '
+                f'p50 {row["p50_ms"]:.2f}ms p95 {row["p95_ms"]:.2f}ms '
+                f'{row["rps"]} req/s')
+
+        total = sum(row['requests'] for row in views)
+        wall = sum(row['requests'] / row['rps'] for row in views
+                   if row['rps'])
+        return {
+            'concurrency': concurrency,
+            'rps': round(total / wall, 1) if wall else 0,
+            'errors': sum(row['errors'] for row in views),
+            'views': views,
+        }
+
+    def handle(self, *args, **options):
+        urls = sample_urls()
+        if options['view']:
+            urls = {
+                name: url for name, url in urls.items()
+                if name in options['view']
+            }
+
+        servers = []
+        for name in options['server'] or SERVERS:
+            port = free_port()
+            process = self.start(name, port, options)
+            levels = []
+            try:
+                for concurrency in options['concurrency'] or [16]:
+                    levels.append(self.run_level(
+                        name, port, urls, concurrency, options))
+                    levels[-1]['pss_mb'] = pss_mb(process.pid)
+                    self.stderr.write(
+                        f'{name:<19} {concurrency:>4} clients '
+                        f'{levels[-1]["rps"]} req/s, '
+                        f'{levels[-1]["errors"]} errors, '
+                        f'{levels[-1]["pss_mb"]} MB PSS')
+            finally:
+                self.stop(process)
+            servers.append({'server': name, 'levels': levels})
+
+        report = {
+            'meta': {
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'cpus': os.cpu_count(),
+                'requests': options['requests'],
+                'concurrency': options['concurrency'] or [16],
+                'workers': options['workers'],
+                'page_cache': options['page_cache'],
+            },
+            'servers': servers,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+        self.stdout.write(output)
@@ -0,0 +1,222 @@
+import json
+import platform
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+import django
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.core.servers.basehttp import ThreadedWSGIServer
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, connections
+from django.test import AsyncClient, Client, override_settings
+
+from blog.bench import load, sample_urls, summarize
+from blog.models import Post
+
+MODES = ('client', 'asgi', 'wsgi')
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def count_queries():
+    # connections are per thread: only counts the queries of the calling
+    # thread
+    counter = QueryCounter()
+    with ExitStack() as stack:
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(counter))
+        yield counter
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def counting_app(app, counts: dict):
+    # wraps the WSGI app to record queries per path from the server threads
+    def wrapper(environ, start_response):
+        with count_queries() as counter:
+            response = app(environ, start_response)
+            try:
+                content = b''.join(response)
+            finally:
+                # sends request_finished, which closes the connections
+                response.close()
+        counts.setdefault(environ['PATH_INFO'], []).append(counter.count)
+        return [content]
+    return wrapper
+
+
+class Command(BaseCommand):
+    help = ('Benchmarks every blog view through the test client, the ASGI '
+            'handler and a local threaded WSGI server. Prints p50/p95/p99 '
+            'latency, requests/s and queries per view as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument(
+            '--mode', choices=MODES, action='append',
+            help='Repeatable, defaults to every mode.')
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Client threads in the wsgi mode.')
+        parser.add_argument(
+            '--view', action='append',
+            help='Only benchmarks these views (repeatable).')
+        parser.add_argument(
+            '--page-cache', action='store_true',
+            help='Keeps the page cache on (off by default, to measure the '
+                 'views themselves).')
+        parser.add_argument('--output', help='Also writes the JSON here.')
+        parser.add_argument(
+            '--compare', help='A previous --output to print deltas against.')
+
+    def bench_client(self, name, url, options):
+        client = Client()
+        for _ in range(options['warmup']):
+            client.get(url)
+
+        timings, queries, errors = [], [], 0
+        start = time.perf_counter()
+        for _ in range(options['requests']):
+            with count_queries() as counter:
+                request_start = time.perf_counter()
+                status = client.get(url).status_code
+                timings.append(time.perf_counter() - request_start)
+            queries.append(counter.count)
+            errors += status >= 400
+        elapsed = time.perf_counter() - start
+        return summarize(name, url, 'client', timings, errors, elapsed,
+                         queries)
+
+    def bench_asgi(self, name, url, options):
+        client = AsyncClient()
+
+        # the sync parts of the request (the ORM) run in the thread calling
+        # async_to_sync, so count_queries() has to wrap each call
+        @async_to_sync
+        async def fetch():
+            request_start = time.perf_counter()
+            status = (await client.get(url)).status_code
+            return time.perf_counter() - request_start, status
+
+        for _ in range(options['warmup']):
+            fetch()
+
+        timings, queries, errors = [], [], 0
+        start = time.perf_counter()
+        for _ in range(options['requests']):
+            with count_queries() as counter:
+                timing, status = fetch()
+            timings.append(timing)
+            queries.append(counter.count)
+            errors += status >= 400
+        elapsed = time.perf_counter() - start
+        return summarize(name, url, 'asgi', timings, errors, elapsed, queries)
+
+    def bench_wsgi(self, name, url, options, server, counts):
+        base = f'http://127.0.0.1:{server.server_port}'
+        load(base + url, options['warmup'], options['concurrency'])
+        counts.clear()
+        results, elapsed = load(
+            base + url, options['requests'], options['concurrency'])
+
+        timings = [timing for timing, _ in results]
+        errors = sum(not 0 < status < 400 for _, status in results)
+        queries = counts.get(url.split('?')[0], [])
+        return summarize(name, url, 'wsgi', timings, errors, elapsed, queries)
+
+    def start_server(self, counts):
+        server = make_server(
+            '127.0.0.1', 0, counting_app(get_wsgi_application(), counts),
+            server_class=ThreadedWSGIServer, handler_class=QuietHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def compare(self, results, path):
+        with open(path) as file:
+            baseline = {
+                (row['view'], row['mode']): row
+                for row in json.load(file)['views']
+            }
+        for row in results:
+            before = baseline.get((row['view'], row['mode']))
+            if before is None:
+                continue
+            deltas = []
+            for key in ('p50_ms', 'p95_ms', 'rps', 'queries'):
+                if before[key]:
+                    change = (row[key] - before[key]) / before[key] * 100
+                    deltas.append(f'{key} {change:+.1f}%')
+            self.stderr.write(
+                f'{row["mode"]:<7} {row["view"]:<16} {", ".join(deltas)}')
+
+    def handle(self, *args, **options):
+        modes = options['mode'] or MODES
+        urls = sample_urls()
+        if options['view']:
+            urls = {
+                name: url for name, url in urls.items()
+                if name in options['view']
+            }
+
+        results = []
+        counts: dict[str, list[int]] = {}
+        with override_settings(BLOG_PAGE_CACHE_ENABLED=options['page_cache'],
+                               ALLOWED_HOSTS=['*'], DEBUG=False):
+            cache.clear()
+            server = self.start_server(counts) if 'wsgi' in modes else None
+            try:
+                for name, url in urls.items():
+                    for mode in modes:
+                        if mode == 'wsgi':
+                            row = self.bench_wsgi(
+                                name, url, options, server, counts)
+                        else:
+                            row = getattr(self, f'bench_{mode}')(
+                                name, url, options)
+                        results.append(row)
+                        self.stderr.write(
+                            f'{mode:<7} {name:<16} p50 {row["p50_ms"]:.2f}ms '
+                            f'p95 {row["p95_ms"]:.2f}ms {row["rps"]} req/s '
+                            f'{row["queries"]} queries')
+            finally:
+                if server is not None:
+                    server.shutdown()
+                    server.server_close()
+
+        report = {
+            'meta': {
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'posts': Post.objects.count(),
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'page_cache': options['page_cache'],
+            },
+            'views': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+        if options['compare']:
+            self.compare(results, options['compare'])
+        self.stdout.write(output)
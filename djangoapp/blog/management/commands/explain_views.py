@@ -0,0 +1,86 @@
+import re
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from blog.bench import sample_urls
+
+# how each database reports reading a whole table
+FULL_SCAN = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (\w+)\b(?! USING)'),
+}
+INDEX = re.compile(r'(?:USING (?:COVERING )?INDEX|Index (?:Only )?Scan'
+                   r'(?: Backward)? using) (\w+)')
+# small lookup tables: scanning them is cheaper than any index
+IGNORED_TABLES = {'site_setup_sitesetup', 'site_setup_menulink',
+                  'django_session'}
+
+
+class Command(BaseCommand):
+    help = ('Requests every blog view and prints the query plan of each '
+            'SELECT it runs (EXPLAIN ANALYZE on PostgreSQL), flagging full '
+            'table scans.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verbose-plans', action='store_true',
+            help='Prints the whole plan instead of a summary.')
+
+    def explain(self, sql: str) -> str:
+        vendor = connection.vendor
+        if vendor == 'postgresql':
+            sql = f'EXPLAIN (ANALYZE, BUFFERS) {sql}'
+        elif vendor == 'sqlite':
+            sql = f'EXPLAIN QUERY PLAN {sql}'
+        else:
+            sql = f'EXPLAIN {sql}'
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+            rows = cursor.fetchall()
+        # sqlite: (id, parent, notused, detail), the rest: one text column
+        return '\n'.join(str(row[-1]) for row in rows)
+
+    def handle(self, *args, **options):
+        full_scan = FULL_SCAN.get(connection.vendor)
+        # sqlite also reports scans of subqueries, which are not tables
+        tables = set(connection.introspection.table_names()) - IGNORED_TABLES
+        client = Client()
+        warnings = 0
+
+        with override_settings(BLOG_PAGE_CACHE_ENABLED=False,
+                               ALLOWED_HOSTS=['*']):
+            for name, url in sample_urls().items():
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    status = client.get(url).status_code
+
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    f'{name} {url} ({status}, {len(queries)} queries)'))
+
+                for query in queries:
+                    sql = query['sql']
+                    if not sql.lstrip().upper().startswith('SELECT'):
+                        continue
+                    plan = self.explain(sql)
+                    indexes = sorted(set(INDEX.findall(plan)))
+                    scans = sorted(
+                        set(full_scan.findall(plan)) & tables
+                        if full_scan else ())
+
+                    self.stdout.write(f'  {sql[:120]}')
+                    if options['verbose_plans']:
+                        for line in plan.splitlines():
+                            self.stdout.write(f'    {line}')
+                    self.stdout.write(
+                        f'    indexes: {", ".join(indexes) or "-"}')
+                    if scans:
+                        warnings += 1
+                        self.stdout.write(self.style.WARNING(
+                            f'    full scan: {", ".join(scans)}'))
+
+        self.stdout.write(f'{warnings} queries with full table scans')
@@ -0,0 +1,48 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.models import Post
+from blog.transfer import export_posts
+
+
+class Command(BaseCommand):
+    help = ('Writes the posts as NDJSON (one post per line, with its '
+            'category, tags and authors) for `manage.py import_posts`. '
+            'Streams in batches, in constant memory.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default='-',
+            help='File to write (default: stdout).')
+        parser.add_argument('--batch-size', type=int, default=1_000)
+        parser.add_argument(
+            '--published', action='store_true',
+            help='Exports only the published posts.')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.all()
+        if options['published']:
+            posts = posts.filter(is_published=True)
+
+        if options['output'] == '-':
+            self.export(posts, sys.stdout, options)
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                self.export(posts, file, options)
+
+    def export(self, posts, file, options):
+        start = time.perf_counter()
+        exported = 0
+        for record in export_posts(posts, max(1, options['batch_size'])):
+            file.write(json.dumps(record, ensure_ascii=False))
+            file.write('\n')
+            exported += 1
+
+        elapsed = time.perf_counter() - start
+        # stdout may be the export itself
+        self.stderr.write(
+            f'{exported} posts exported in {elapsed:.1f}s '
+            f'({exported / elapsed if elapsed else 0:.0f} posts/s)')
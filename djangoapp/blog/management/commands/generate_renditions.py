@@ -0,0 +1,60 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from blog.models import Post, PostAttachment
+from images.models import ImageRendition
+from images.renditions import generate_renditions
+
+
+def render(name: str) -> tuple[str, str]:
+    try:
+        generate_renditions(name)
+    except Exception as error:
+        return name, repr(error)
+    return name, ''
+
+
+class Command(BaseCommand):
+    help = ('Generates the srcset renditions of the existing post covers '
+            'and attachments.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=1,
+            help='Number of processes generating renditions in parallel.')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Regenerates images that already have renditions.')
+
+    def handle(self, *args, **options):
+        names = set(Post.objects.exclude(cover='').values_list(
+            'cover', flat=True))
+        names |= set(PostAttachment.objects.exclude(file='').values_list(
+            'file', flat=True))
+
+        if not options['force']:
+            names -= set(ImageRendition.objects.values_list(
+                'source_name', flat=True))
+
+        names = sorted(names)
+        processes = max(1, options['processes'])
+
+        if processes == 1:
+            results = list(map(render, names))
+        else:
+            # children must not share the parent's database connection
+            connections.close_all()
+            ctx = multiprocessing.get_context('fork')
+            with ctx.Pool(processes) as pool:
+                results = list(pool.imap_unordered(render, names, 4))
+
+        failed = 0
+        for name, error in results:
+            if error:
+                failed += 1
+                self.stderr.write(f'{name}: {error}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(names) - failed} images processed, {failed} failed.'))
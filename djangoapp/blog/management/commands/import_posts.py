@@ -0,0 +1,94 @@
+import json
+import sys
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from blog import page_cache
+from blog.transfer import import_posts
+from site_setup.cache import bump_version
+from utils.rands import new_slugfy
+
+
+class Command(BaseCommand):
+    help = ('Creates or updates (by slug) the posts of an NDJSON file of '
+            '`manage.py export_posts`, in batches of bulk queries that '
+            'also index them for the search. Authors are matched by '
+            'username. The covers are queued for '
+            '`manage.py run_image_jobs` and the content is rendered at the '
+            'end, in parallel.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='NDJSON file ("-" for stdin).')
+        parser.add_argument(
+            '--batch-size', type=int, default=1_000,
+            help='Posts per transaction.')
+        parser.add_argument(
+            '--write-batch-size', type=int, default=None,
+            help='Maximum rows per INSERT/UPDATE of posts, categories, tags '
+                 'and tag links (default: as many as the database accepts).')
+        parser.add_argument(
+            '--no-render', action='store_true',
+            help='Leaves the content to `manage.py render_posts`.')
+        parser.add_argument(
+            '--no-index', action='store_true',
+            help='Leaves the search index to `manage.py '
+                 'rebuild_search_index` (each batch is indexed by default).')
+
+    def records(self, file):
+        for number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as error:
+                raise CommandError(f'Line {number}: {error}') from error
+            if not isinstance(record, dict) or not record.get('title'):
+                raise CommandError(f'Line {number}: a post needs a title.')
+            if not record.get('slug'):
+                record['slug'] = new_slugfy(record['title'], 5)
+            yield record
+
+    def handle(self, *args, **options):
+        if options['input'] == '-':
+            stats, elapsed = self.load(sys.stdin, options)
+        else:
+            try:
+                with open(options['input'], encoding='utf-8') as file:
+                    stats, elapsed = self.load(file, options)
+            except OSError as error:
+                raise CommandError(error) from error
+
+        self.stdout.write(
+            f'{stats.posts} posts ({stats.created} new) and '
+            f'{stats.tag_links} tag links imported in {elapsed:.1f}s '
+            f'({stats.posts / elapsed if elapsed else 0:.0f} posts/s)')
+        if stats.covers:
+            self.stdout.write(
+                f'{stats.covers} covers queued for run_image_jobs')
+        if stats.unknown_users:
+            self.stderr.write(
+                f'{stats.unknown_users} unknown usernames: imported '
+                'without author')
+
+        # bulk writes send no signals: nothing was invalidated
+        page_cache.flush()
+        bump_version()
+
+        if not options['no_render']:
+            call_command('render_posts', stdout=self.stdout,
+                         stderr=self.stderr)
+
+    def load(self, file, options):
+        def progress(stats):
+            if options['verbosity'] > 1:
+                self.stderr.write(f'{stats.posts} posts')
+
+        start = time.perf_counter()
+        stats = import_posts(
+            self.records(file),
+            batch_size=max(1, options['batch_size']),
+            write_batch_size=options['write_batch_size'],
+            on_batch=progress, index=not options['no_index'])
+        return stats, time.perf_counter() - start
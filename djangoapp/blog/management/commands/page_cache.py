@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from blog import page_cache
+import blog.views  # noqa: F401 (registers the cached views)
+
+
+class Command(BaseCommand):
+    help = 'Shows the page cache hit rates per view and flushes entries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--flush', action='store_true',
+            help='Invalidates every cached page.')
+        parser.add_argument(
+            '--tag', action='append', default=[],
+            help='Invalidates the pages stored with this tag '
+                 '(e.g. index, post:12, category:3). Can be repeated.')
+        parser.add_argument(
+            '--reset-stats', action='store_true',
+            help='Resets the hit/miss counters.')
+
+    def handle(self, *args, **options):
+        if options['flush']:
+            page_cache.flush()
+            self.stdout.write(self.style.SUCCESS('Page cache flushed.'))
+
+        if options['tag']:
+            page_cache.bump_tags(*options['tag'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Invalidated tags: {", ".join(options["tag"])}'))
+
+        stats = page_cache.get_stats()
+        self.stdout.write(
+            f'{"view":<20} {"hits":>8} {"misses":>8} {"rate":>7}')
+        for view, counters in sorted(stats.items()):
+            total = counters['hits'] + counters['misses']
+            rate = counters['hits'] / total if total else 0
+            self.stdout.write(
+                f'{view:<20} {counters["hits"]:>8} '
+                f'{counters["misses"]:>8} {rate:>7.1%}')
+
+        if options['reset_stats']:
+            page_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS('Stats reset.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import Post
+from blog.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Indexes every post again with the configured search backend.'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        count = backend.rebuild(Post.objects.order_by('id'))
+        self.stdout.write(self.style.SUCCESS(
+            f'{count} posts indexed with {type(backend).__name__}.'))
@@ -0,0 +1,68 @@
+import multiprocessing
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+from blog.models import Post
+from blog.page_cache import bump_tags
+from blog.rendering import RENDER_VERSION, RENDERED_FIELDS, render_post
+
+
+def render_batch(ids: list[int]) -> list[Post]:
+    posts = list(Post.objects.filter(pk__in=ids).only('pk', 'content'))
+    for post in posts:
+        render_post(post)
+    # only what bulk_update needs goes back to the parent
+    return [
+        Post(pk=post.pk, **{name: getattr(post, name)
+                            for name in RENDERED_FIELDS})
+        for post in posts
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Renders the content of the posts rendered by an older version '
+            'of blog.rendering (or never rendered) again, in parallel '
+            'batches.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Renders every post, even the up to date ones.')
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(),
+            help='Number of processes rendering in parallel (default: one '
+                 'per CPU).')
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        posts = Post.objects.order_by('pk')
+        if not options['all']:
+            posts = posts.exclude(render_version=RENDER_VERSION)
+        ids = list(posts.values_list('pk', flat=True))
+
+        size = max(1, options['batch_size'])
+        batches = [ids[i:i + size] for i in range(0, len(ids), size)]
+        processes = max(1, min(options['processes'] or 1, len(batches)))
+
+        if processes == 1:
+            results = map(render_batch, batches)
+            self.save(results)
+        else:
+            # children must not share the parent's database connection
+            connections.close_all()
+            ctx = multiprocessing.get_context('fork')
+            with ctx.Pool(processes) as pool:
+                # the parent is the only writer: the children only render
+                self.save(pool.imap_unordered(render_batch, batches))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(ids)} posts rendered with version {RENDER_VERSION}.'))
+
+    def save(self, results):
+        for rendered in results:
+            with transaction.atomic():
+                Post.objects.bulk_update(rendered, RENDERED_FIELDS)
+            bump_tags(*(f'post:{post.pk}' for post in rendered))
+            self.stderr.write(f'{len(rendered)} posts rendered')
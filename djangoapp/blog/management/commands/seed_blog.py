@@ -0,0 +1,247 @@
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+from blog import page_cache
+from blog.models import (Category, Page, Post, PostSearchTerm, RelatedPost,
+                         Tag)
+from blog.search import get_search_backend
+from blog.slugs import forget_slugs
+from site_setup.cache import bump_version
+from utils.rands import random_letters
+
+WORDS = (
+    'python django banco dados consulta índice cache template servidor '
+    'requisição resposta página post categoria tag autor busca desempenho '
+    'memória processo fila imagem arquivo deploy docker nginx gunicorn '
+    'postgres migração modelo view rota formulário teste benchmark api json '
+    'async thread conexão réplica sessão cookie segurança html css '
+    'javascript código função classe objeto lista dicionário laço erro '
+    'exceção log métrica latência throughput escala produção'
+).split()
+
+SEED_PREFIX = 'seed-'
+
+
+class Command(BaseCommand):
+    help = ('Bulk-creates users, categories, tags, posts and pages with '
+            'realistic volumes for benchmarks, then indexes and renders the '
+            'posts like Post.save would. Seeded rows have slugs '
+            f'starting with "{SEED_PREFIX}" and can be removed with --clear.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100_000)
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--categories', type=int, default=200)
+        parser.add_argument('--tags', type=int, default=5_000)
+        parser.add_argument('--pages', type=int, default=20)
+        parser.add_argument(
+            '--tags-per-post', type=int, default=4,
+            help='Maximum number of tags linked to each post.')
+        parser.add_argument(
+            '--unpublished', type=float, default=0.1,
+            help='Fraction of posts left unpublished.')
+        parser.add_argument('--batch-size', type=int, default=2_000)
+        parser.add_argument(
+            '--seed', type=int, default=None,
+            help='Random seed, for reproducible datasets.')
+        parser.add_argument(
+            '--no-index', action='store_true',
+            help='Leaves the search index to `manage.py '
+                 'rebuild_search_index` (each batch is indexed by default).')
+        parser.add_argument(
+            '--no-render', action='store_true',
+            help='Leaves the content to `manage.py render_posts`.')
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Deletes previously seeded rows and exits.')
+
+    def sentence(self, min_words: int, max_words: int) -> str:
+        words = self.random.choices(
+            WORDS, k=self.random.randint(min_words, max_words))
+        return ' '.join(words).capitalize()
+
+    def content(self) -> str:
+        paragraphs = (
+            f'<p>{self.sentence(40, 120)}.</p>'
+            for _ in range(self.random.randint(3, 12))
+        )
+        return f'<h2>{self.sentence(3, 6)}</h2>' + ''.join(paragraphs)
+
+    def slug(self, text: str, number: int) -> str:
+        # unique without a query per row: run token + sequence number
+        return f'{SEED_PREFIX}{slugify(text)[:40]}-{self.run}{number}'
+
+    def bulk_create(self, model, objects, batch_size):
+        created = []
+        for start in range(0, len(objects), batch_size):
+            with transaction.atomic():
+                created += model.objects.bulk_create(
+                    objects[start:start + batch_size])
+        return created
+
+    def clear(self, batch_size):
+        # Raw deletes, children first: a queryset delete() would load every
+        # post and send the post/tag/category signals once per row. The
+        # page cache is flushed by handle() instead.
+        seeded = Post.objects.filter(slug__startswith=SEED_PREFIX)
+        seeded_tags = Tag.objects.filter(slug__startswith=SEED_PREFIX)
+        seeded_categories = Category.objects.filter(
+            slug__startswith=SEED_PREFIX)
+        through = Post.tag.through
+        posts = 0
+
+        while True:
+            batch = list(seeded.order_by('pk').values_list(
+                'pk', flat=True)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                # the other posts listing these as related
+                Post.objects.filter(
+                    related_posts__related_id__in=batch,
+                ).exclude(pk__in=batch).update(related_stale=True)
+                for queryset in (
+                    RelatedPost.objects.filter(
+                        Q(post_id__in=batch) | Q(related_id__in=batch)),
+                    PostSearchTerm.objects.filter(post_id__in=batch),
+                    through.objects.filter(post_id__in=batch),
+                    Post.objects.filter(pk__in=batch),
+                ):
+                    queryset._raw_delete(queryset.db)
+            posts += len(batch)
+            if self.verbosity > 1:
+                self.stdout.write(f'{posts} posts deleted')
+
+        with transaction.atomic():
+            # what the signals and the SET_NULLs did for the posts left
+            Post.objects.filter(
+                Q(tag__in=seeded_tags) | Q(category__in=seeded_categories),
+            ).update(related_stale=True)
+            Post.objects.filter(category__in=seeded_categories).update(
+                category=None)
+            links = through.objects.filter(tag__in=seeded_tags)
+            links._raw_delete(links.db)
+            tag_slugs = list(seeded_tags.values_list('slug', flat=True))
+            category_slugs = list(
+                seeded_categories.values_list('slug', flat=True))
+            seeded_tags._raw_delete(seeded_tags.db)
+            seeded_categories._raw_delete(seeded_categories.db)
+            # few rows, with their own signals and relations
+            Page.objects.filter(slug__startswith=SEED_PREFIX).delete()
+            User.objects.filter(username__startswith=SEED_PREFIX).delete()
+        forget_slugs(Tag, *tag_slugs)
+        forget_slugs(Category, *category_slugs)
+        self.stdout.write(f'Deleted {posts} seeded posts')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        if options['clear']:
+            self.clear(options['batch_size'])
+            page_cache.flush()
+            bump_version()
+            return
+
+        self.random = random.Random(options['seed'])
+        self.run = random_letters(4).lower()
+        batch_size = options['batch_size']
+        start = time.perf_counter()
+
+        # an unusable password: hashing a real one per user is slow on
+        # purpose
+        password = make_password(None)
+        users = self.bulk_create(User, [
+            User(username=f'{SEED_PREFIX}{self.run}{i}', password=password,
+                 first_name=self.random.choice(WORDS).capitalize(),
+                 last_name=self.random.choice(WORDS).capitalize())
+            for i in range(options['users'])
+        ], batch_size)
+
+        categories = []
+        for i in range(options['categories']):
+            name = self.sentence(1, 2)
+            categories.append(Category(name=name, slug=self.slug(name, i)))
+        categories = self.bulk_create(Category, categories, batch_size)
+
+        tags = []
+        for i in range(options['tags']):
+            name = self.sentence(1, 2)
+            tags.append(Tag(name=name, slug=self.slug(name, i)))
+        tags = self.bulk_create(Tag, tags, batch_size)
+
+        pages = []
+        for i in range(options['pages']):
+            title = self.sentence(1, 4)[:65]
+            pages.append(Page(
+                title=title, slug=self.slug(title, i), is_published=True,
+                content=self.content()))
+        self.bulk_create(Page, pages, batch_size)
+
+        self.stdout.write(
+            f'{len(users)} users, {len(categories)} categories, '
+            f'{len(tags)} tags, {len(pages)} pages')
+
+        # posts and their tag links in the same batches, so memory stays
+        # flat with any --posts
+        through = Post.tag.through
+        search = None if options['no_index'] else get_search_backend()
+        unpublished = options['unpublished']
+        max_tags = min(options['tags_per_post'], len(tags))
+        created = links = 0
+
+        for batch_start in range(0, options['posts'], batch_size):
+            posts = []
+            for i in range(batch_start,
+                           min(batch_start + batch_size, options['posts'])):
+                title = self.sentence(3, 9)[:65]
+                author = self.random.choice(users) if users else None
+                posts.append(Post(
+                    title=title,
+                    slug=self.slug(title, i),
+                    excerpt=self.sentence(10, 20)[:150],
+                    content=self.content(),
+                    is_published=self.random.random() >= unpublished,
+                    created_by=author,
+                    updated_by=author,
+                    category=(self.random.choice(categories)
+                              if categories else None),
+                ))
+
+            with transaction.atomic():
+                posts = Post.objects.bulk_create(posts)
+                post_tags = [
+                    through(post_id=post.pk, tag_id=tag.pk)
+                    for post in posts
+                    for tag in self.random.sample(
+                        tags, self.random.randint(0, max_tags))
+                ]
+                through.objects.bulk_create(post_tags)
+                if search:
+                    search.index_posts(posts)
+
+            created += len(posts)
+            links += len(post_tags)
+            if self.verbosity > 1:
+                self.stdout.write(f'{created} posts, {links} tag links')
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'{created} posts and {links} tag links created in '
+            f'{elapsed:.1f}s ({created / elapsed if elapsed else 0:.0f} '
+            'posts/s)')
+
+        # bulk_create sends no signals: nothing was invalidated, and the
+        # posts are left with related_stale for `update_related_posts`
+        page_cache.flush()
+        bump_version()
+
+        if not options['no_render']:
+            call_command('render_posts', stdout=self.stdout,
+                         stderr=self.stderr)
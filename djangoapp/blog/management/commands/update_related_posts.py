@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.models import Post
+from blog.related import update_related_posts
+
+
+class Command(BaseCommand):
+    help = ('Computes the related posts of the posts whose tags, category or '
+            'publication changed since the last run (see blog/related.py).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Computes every post again, so the lists also follow the '
+                 'changes of the other posts.')
+        parser.add_argument('--batch-size', type=int, default=1_000)
+        parser.add_argument(
+            '--sleep', type=float,
+            help='Keeps running (the relatedworker service), computing the '
+                 'stale posts again every SLEEP seconds.')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            Post.objects.update(related_stale=True)
+
+        def progress(posts):
+            if options['verbosity'] > 1:
+                self.stderr.write(f'{posts} posts')
+
+        while True:
+            start = time.perf_counter()
+            count = update_related_posts(
+                max(1, options['batch_size']), on_batch=progress)
+            elapsed = time.perf_counter() - start
+            if count or options['sleep'] is None:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Related posts of {count} posts computed in '
+                    f'{elapsed:.1f}s.'))
+            if options['sleep'] is None:
+                return
+            time.sleep(options['sleep'])
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.15 on 2026-10-18 17:25
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# GIN indexes only exist on PostgreSQL, so the index is created here instead
+# of in Post.Meta.indexes (SQLite keeps working with the simple backend).
+def create_search_vector_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS blog_post_search_vector_gin '
+            'ON blog_post USING gin (search_vector)')
+
+
+def drop_search_vector_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'DROP INDEX IF EXISTS blog_post_search_vector_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_postattachment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='PostSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.FloatField(default=0)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='blog.post')),
+            ],
+            options={
+                'verbose_name': 'Post Search Term',
+                'verbose_name_plural': 'Post Search Terms',
+                'constraints': [models.UniqueConstraint(fields=('term', 'post'), name='unique_post_search_term')],
+            },
+        ),
+        migrations.RunPython(
+            create_search_vector_index, drop_search_vector_index),
+    ]
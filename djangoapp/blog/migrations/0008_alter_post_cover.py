@@ -0,0 +1,19 @@
+# Generated by Django 5.1.15 on 2026-10-18 17:28
+
+import images.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_post_search'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='cover',
+            field=images.fields.RenditionImageField(blank=True, default='', upload_to='posts/%Y/%m/'),
+        ),
+    ]
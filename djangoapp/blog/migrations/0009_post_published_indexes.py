@@ -0,0 +1,37 @@
+# Generated by Django 5.1.15 on 2026-10-18 17:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Post.tag uses the auto-created through table, which has no Meta to declare
+# indexes on. (tag_id, post_id) lets the tag listing walk a tag's posts
+# without visiting the table (Django only creates (post_id, tag_id) and
+# tag_id).
+CREATE_TAG_POSTS_INDEX = (
+    'CREATE INDEX IF NOT EXISTS blog_post_tag_tag_post_idx '
+    'ON blog_post_tag (tag_id, post_id)')
+DROP_TAG_POSTS_INDEX = 'DROP INDEX IF EXISTS blog_post_tag_tag_post_idx'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_alter_post_cover'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-id'], name='post_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['created_by', '-id'], name='post_published_author_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['category', '-id'], name='post_published_category_idx'),
+        ),
+        migrations.RunSQL(CREATE_TAG_POSTS_INDEX, DROP_TAG_POSTS_INDEX),
+    ]
@@ -0,0 +1,51 @@
+from django.db import migrations
+
+from blog.search import SimpleSearchBackend, get_search_backend
+
+
+# blog.search.PostgresSearchBackend.config: the portuguese configuration with
+# unaccent before the stemmer, as tokenize() strips the accents for the
+# simple backend
+def create_search_config(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+        schema_editor.execute(
+            'DO $$ BEGIN '
+            'IF NOT EXISTS (SELECT 1 FROM pg_ts_config '
+            "WHERE cfgname = 'portuguese_unaccent') THEN "
+            'CREATE TEXT SEARCH CONFIGURATION portuguese_unaccent '
+            '(COPY = portuguese); '
+            'ALTER TEXT SEARCH CONFIGURATION portuguese_unaccent '
+            'ALTER MAPPING FOR hword, hword_part, word '
+            'WITH unaccent, portuguese_stem; '
+            'END IF; END $$')
+
+
+def drop_search_config(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'DROP TEXT SEARCH CONFIGURATION IF EXISTS portuguese_unaccent')
+
+
+# posts saved before 0007 were never indexed, and the vectors of the
+# postgres backend change with the configuration
+def backfill_search_index(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    backend = get_search_backend()
+    posts = Post.objects.only('pk', 'title', 'excerpt', 'content')
+    if isinstance(backend, SimpleSearchBackend):
+        posts = posts.filter(search_terms=None)
+    backend.rebuild(posts.order_by('pk'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0011_post_related'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_config, drop_search_config),
+        migrations.RunPython(
+            backfill_search_index, migrations.RunPython.noop, elidable=True),
+    ]
@@ -1,9 +1,12 @@
 from django.db import models
 from utils.rands import new_slugfy
 from django.contrib.auth.models import User
-from utils.images import resize_image
+from images.jobs import enqueue_renditions, enqueue_resize
+from images.fields import RenditionImageField
 from django_summernote.models import AbstractAttachment
 from django.urls import reverse
+from django.contrib.postgres.search import SearchVectorField
+from blog.rendering import RENDERED_FIELDS, render_post
 
 
 class PostAttachment(AbstractAttachment):
@@ -12,6 +15,7 @@ class PostAttachment(AbstractAttachment):
             self.name = self.file.name
 
         current_cover_name = str(self.file.name)
+        super().save(*args, **kwargs)
 
         cover_changed = False
 
@@ -19,9 +23,8 @@ class PostAttachment(AbstractAttachment):
             cover_changed = current_cover_name != self.file.name
 
         if cover_changed:
-            print('file changed')
-            resize_image(self.file, 900, quality=70)
-        super().save(*args, **kwargs)
+            enqueue_resize(self.file, 900, quality=70)
+            enqueue_renditions(self.file)
 
 
 class Tag(models.Model):
@@ -95,6 +98,25 @@ class Post(models.Model):
     class Meta:
         verbose_name = 'Post'
         verbose_name_plural = 'Posts'
+        # partial indexes for Post.objects.get_published() and the listings
+        # filtered by author/category (see `manage.py explain_views`)
+        indexes = [
+            models.Index(
+                fields=['-id'], condition=models.Q(is_published=True),
+                name='post_published_idx'),
+            models.Index(
+                fields=['created_by', '-id'],
+                condition=models.Q(is_published=True),
+                name='post_published_author_idx'),
+            models.Index(
+                fields=['category', '-id'],
+                condition=models.Q(is_published=True),
+                name='post_published_category_idx'),
+            # the queue of `manage.py update_related_posts`
+            models.Index(
+                fields=['id'], condition=models.Q(related_stale=True),
+                name='post_related_stale_idx'),
+        ]
 
     objects = PostManger()
 
@@ -109,7 +131,8 @@ class Post(models.Model):
                    'marcado para o post ser exibido publicamente.')
     )
     content = models.TextField()
-    cover = models.ImageField(upload_to='posts/%Y/%m/', blank=True, default='')
+    cover = RenditionImageField(
+        upload_to='posts/%Y/%m/', blank=True, default='')
     cover_in_post_content = models.BooleanField(
         default=True,
         help_text=(
@@ -138,6 +161,16 @@ class Post(models.Model):
         Tag,
         blank=True, default=''
     )
+    # maintained by blog.search.PostgresSearchBackend on save
+    search_vector = SearchVectorField(null=True, editable=False)
+    # content as blog.rendering turned it into, on save
+    rendered_content = models.TextField(blank=True, default='', editable=False)
+    rendered_toc = models.JSONField(blank=True, default=list, editable=False)
+    # blog.rendering.RENDER_VERSION of rendered_content, 0 if never rendered
+    render_version = models.PositiveSmallIntegerField(
+        default=0, editable=False)
+    # RelatedPost rows out of date, see blog.related
+    related_stale = models.BooleanField(default=True, editable=False)
 
     def get_absolute_url(self):
         if not self.is_published:
@@ -148,6 +181,15 @@ class Post(models.Model):
         if not self.slug:
             self.slug = new_slugfy(self.title, 5)
 
+        update_fields = kwargs.get('update_fields')
+        # saved from the admin changelist, without its content loaded
+        content_deferred = 'content' in self.get_deferred_fields()
+        if not content_deferred and (
+                update_fields is None or 'content' in update_fields):
+            render_post(self)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *RENDERED_FIELDS}
+
         current_cover_name = str(self.cover.name)
         super_save = super().save(*args, **kwargs)
 
@@ -157,10 +199,53 @@ class Post(models.Model):
             cover_changed = current_cover_name != self.cover.name
 
         if cover_changed:
-            print('cover changed')
-            resize_image(self.cover, 900, quality=70)
+            enqueue_resize(self.cover, 900, quality=70)
+            enqueue_renditions(self.cover)
 
         return super_save
 
     def __str__(self) -> str:
         return self.title
+
+
+class PostSearchTerm(models.Model):
+    """Inverted index used by blog.search.SimpleSearchBackend."""
+
+    class Meta:
+        verbose_name = 'Post Search Term'
+        verbose_name_plural = 'Post Search Terms'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['term', 'post'], name='unique_post_search_term'),
+        ]
+
+    term = models.CharField(max_length=64)
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name='search_terms')
+    weight = models.FloatField(default=0)
+
+    def __str__(self) -> str:
+        return self.term
+
+
+class RelatedPost(models.Model):
+    """Most similar posts of a post, computed by blog.related."""
+
+    class Meta:
+        verbose_name = 'Related Post'
+        verbose_name_plural = 'Related Posts'
+        # also the index of the post page query (blog.cards.related_cards)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'rank'], name='unique_related_post_rank'),
+        ]
+
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name='related_posts')
+    related = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name='related_to')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    def __str__(self) -> str:
+        return f'{self.post_id} -> {self.related_id}'
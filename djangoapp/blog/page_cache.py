@@ -0,0 +1,323 @@
+import atexit
+import threading
+import time
+from collections import Counter
+from hashlib import md5
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+
+from site_setup.cache import get_version as get_site_version
+from utils.instrumentation import record_cache
+from utils.versions import new_version, version_time
+
+PAGE_KEY = 'page_cache:page:{site_version}:{digest}'
+TAG_KEY = 'page_cache:tag:{tag}'
+STATS_KEY = 'page_cache:stats:{view}:{event}'
+
+# every cached page depends on this tag, so bumping it flushes everything
+ALL_TAG = 'all'
+
+# names of the views using CachedPageMixin, used by the page_cache command
+cached_views: set[str] = set()
+
+# (view, event) counts of this process not yet added to the shared counters:
+# a write to the cache per request would cost the hits what the cache saves
+_pending_stats: Counter = Counter()
+_stats_lock = threading.Lock()
+_stats_flushed_at = time.monotonic()
+
+
+def is_enabled() -> bool:
+    return getattr(settings, 'BLOG_PAGE_CACHE_ENABLED', True)
+
+
+def is_cacheable(request: HttpRequest) -> bool:
+    return (
+        is_enabled()
+        and request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+    )
+
+
+def uses_conditional_get(request: HttpRequest) -> bool:
+    return (
+        getattr(settings, 'BLOG_CONDITIONAL_GET', True)
+        and request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+    )
+
+
+def page_key(request: HttpRequest) -> str:
+    # the query string (?page=2, ?search=...) and the host, which the feeds
+    # and sitemaps have in their links
+    digest = md5(request.build_absolute_uri().encode()).hexdigest()
+    return PAGE_KEY.format(site_version=get_site_version(), digest=digest)
+
+
+def get_tag_versions(tags: list[str]) -> dict[str, str]:
+    keys = {TAG_KEY.format(tag=tag): tag for tag in tags}
+    versions = cache.get_many(keys)
+
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, new_version(), None)
+        versions.update(cache.get_many(missing))
+
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def bump_tags(*tags: str) -> None:
+    # A page is only served while every tag it was stored with still has the
+    # same version, so forgetting a tag version invalidates those pages.
+    cache.delete_many([TAG_KEY.format(tag=tag) for tag in set(tags)])
+
+
+def flush() -> None:
+    bump_tags(ALL_TAG)
+
+
+def page_validators(key: str, versions: dict[str, str]) -> tuple[str, int]:
+    """
+    ETag and Last-Modified of the page stored under key (which has the site
+    version in it) while its tags have these versions.
+    """
+    digest = md5(
+        f'{key}:{sorted(versions.items())}'.encode()).hexdigest()
+    site_version = key.split(':')[2]
+    # versions without a time (stored before they had one) count as now
+    last_modified = max(
+        version_time(version) or int(time.time())
+        for version in [site_version, *versions.values()])
+    return f'W/"{digest}"', last_modified
+
+
+def set_validators(response: HttpResponse, etag: str,
+                   last_modified: int) -> None:
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # no heuristic freshness: browsers ask every time and mostly get a 304
+    patch_cache_control(response, no_cache=True)
+
+
+def not_modified(request: HttpRequest,
+                 response: HttpResponse) -> HttpResponse | None:
+    """A 304 if the client has the version of response, else None."""
+    if 'ETag' not in response:
+        return None
+    result = get_conditional_response(
+        request, etag=response['ETag'],
+        last_modified=parse_http_date_safe(response['Last-Modified']),
+        response=response)
+    return None if result is response else result
+
+
+def get_page(key: str) -> HttpResponse | None:
+    entry = cache.get(key)
+    if entry is None:
+        record_cache(hit=False)
+        return None
+
+    tag_keys = [TAG_KEY.format(tag=tag) for tag in entry['tags']]
+    current = cache.get_many(tag_keys)
+    for tag_key, version in zip(tag_keys, entry['tags'].values()):
+        if current.get(tag_key) != version:
+            record_cache(hit=False)
+            return None
+
+    record_cache(hit=True)
+
+    response = HttpResponse(
+        entry['content'], content_type=entry['content_type'])
+    response['X-Page-Cache'] = 'HIT'
+    set_validators(response, *page_validators(key, entry['tags']))
+    return response
+
+
+def store_page(key: str, response: HttpResponse,
+               versions: dict[str, str]) -> None:
+    entry = {
+        'content': response.content,
+        'content_type': response['Content-Type'],
+        'tags': versions,
+    }
+    timeout = getattr(settings, 'BLOG_PAGE_CACHE_TIMEOUT', 600)
+    cache.set(key, entry, timeout)
+
+
+def record(view: str, event: str) -> None:
+    global _stats_flushed_at
+    interval = getattr(settings, 'BLOG_PAGE_CACHE_STATS_INTERVAL', 10)
+    now = time.monotonic()
+    with _stats_lock:
+        _pending_stats[(view, event)] += 1
+        if now - _stats_flushed_at < interval:
+            return
+        _stats_flushed_at = now
+    flush_stats()
+
+
+def flush_stats() -> None:
+    """Adds the counts of this process to the shared counters."""
+    with _stats_lock:
+        pending = dict(_pending_stats)
+        _pending_stats.clear()
+    for (view, event), count in pending.items():
+        key = STATS_KEY.format(view=view, event=event)
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            if not cache.add(key, count, None):
+                cache.incr(key, count)
+
+
+# what the last interval counted, when a worker exits or is recycled
+atexit.register(flush_stats)
+
+
+def get_stats() -> dict[str, dict[str, int]]:
+    """
+    The shared counters, with the counts of this process. The other
+    processes add theirs every BLOG_PAGE_CACHE_STATS_INTERVAL seconds.
+    """
+    flush_stats()
+    keys = {
+        STATS_KEY.format(view=view, event=event): (view, event)
+        for view in cached_views
+        for event in ('hits', 'misses')
+    }
+    values = cache.get_many(keys)
+
+    stats = {view: {'hits': 0, 'misses': 0} for view in cached_views}
+    for key, value in values.items():
+        view, event = keys[key]
+        stats[view][event] = value
+    return stats
+
+
+def reset_stats() -> None:
+    with _stats_lock:
+        _pending_stats.clear()
+    cache.delete_many([
+        STATS_KEY.format(view=view, event=event)
+        for view in cached_views
+        for event in ('hits', 'misses')
+    ])
+
+
+class CachedPageMixin:
+    """
+    Serves anonymous GETs from the cache. Views describe what the page depends
+    on with get_cache_tags(); the signals in blog.signals bump those tags when
+    the content changes.
+
+    The versions of those tags are also the ETag/Last-Modified of the page.
+    For a request with If-None-Match/If-Modified-Since that misses the cache,
+    get_validator_tags() finds the tags from the URL, so a 304 doesn't load
+    or render anything.
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cached_views.add(cls.__name__)
+
+    def get_cache_tags(self) -> list[str] | None:
+        # None means "do not cache this response"
+        return []
+
+    def get_validator_tags(self) -> list[str] | None:
+        # get_cache_tags() before the view runs, with one query at most.
+        # None: the page is rendered to find out.
+        return None
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.view_is_async:  # type: ignore
+            return self._adispatch(request, *args, **kwargs)
+        if not (is_cacheable(request) or uses_conditional_get(request)):
+            return super().dispatch(request, *args, **kwargs)  # type: ignore
+
+        key, response = self._lookup(request)
+        if response is not None:
+            return response
+
+        response = super().dispatch(request, *args, **kwargs)  # type: ignore
+        if self._should_store(request, response):
+            if getattr(response, 'is_rendered', True):
+                self._store_page(key, response)
+            else:
+                response.add_post_render_callback(
+                    lambda r: self._store_page(key, r))
+        return response
+
+    async def _adispatch(self, request, *args, **kwargs):
+        # the cache calls are sync (like most cache backends): one thread hop
+        # for the lookup, and the store runs with the template rendering,
+        # which django also does in a thread
+        if not (is_cacheable(request) or uses_conditional_get(request)):
+            return await super().dispatch(  # type: ignore
+                request, *args, **kwargs)
+
+        key, response = await sync_to_async(self._lookup)(request)
+        if response is not None:
+            return response
+
+        response = await super().dispatch(  # type: ignore
+            request, *args, **kwargs)
+        if self._should_store(request, response):
+            if getattr(response, 'is_rendered', True):
+                await sync_to_async(self._store_page)(key, response)
+            else:
+                response.add_post_render_callback(
+                    lambda r: self._store_page(key, r))
+        return response
+
+    def _lookup(self, request) -> tuple[str, HttpResponse | None]:
+        key = page_key(request)
+        conditional = uses_conditional_get(request)
+
+        if is_cacheable(request):
+            response = get_page(key)
+            record(type(self).__name__,
+                   'misses' if response is None else 'hits')
+            if response is not None and conditional:
+                return key, not_modified(request, response) or response
+            if response is not None:
+                return key, response
+
+        if conditional and (request.headers.get('If-None-Match')
+                            or request.headers.get('If-Modified-Since')):
+            tags = self.get_validator_tags()
+            if tags is not None:
+                validators = HttpResponse()
+                set_validators(validators, *page_validators(
+                    key, get_tag_versions([ALL_TAG, *tags])))
+                return key, not_modified(request, validators)
+        return key, None
+
+    def _should_store(self, request, response) -> bool:
+        return response.status_code == 200
+
+    def _store_page(self, key: str, response: HttpResponse) -> None:
+        # runs once the page is rendered. Also adds the validators, which
+        # don't need the page cache on.
+        if response.streaming or response.cookies:
+            return
+
+        tags = self.get_cache_tags()
+        if tags is None:
+            return
+
+        request = self.request  # type: ignore
+        versions = get_tag_versions([ALL_TAG, *tags])
+        if uses_conditional_get(request):
+            set_validators(response, *page_validators(key, versions))
+        if request.method != 'GET' or not is_cacheable(request):
+            return
+
+        store_page(key, response, versions)
+        response['X-Page-Cache'] = 'MISS'
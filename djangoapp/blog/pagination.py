@@ -0,0 +1,180 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as Base64Error
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import InvalidPage, Paginator
+from django.db import connections
+from django.db.models.query import QuerySet
+from django.utils.functional import cached_property
+
+COUNT_KEY = 'cursor_paginator:count:{digest}'
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+def encode_cursor(direction: str, pk: int) -> str:
+    return urlsafe_b64encode(f'{direction}{pk}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        value = urlsafe_b64decode(cursor + padding).decode()
+        direction, pk = value[0], int(value[1:])
+    except (Base64Error, UnicodeDecodeError, ValueError, IndexError):
+        raise InvalidCursor('Invalid cursor')
+
+    if direction not in ('n', 'p'):
+        raise InvalidCursor('Invalid cursor')
+    return direction, pk
+
+
+class CursorPage:
+    # lets _pagination.html tell this apart from a django Page
+    is_cursor_page = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return ''
+        return encode_cursor('n', self.object_list[-1].pk)
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return ''
+        return encode_cursor('p', self.object_list[0].pk)
+
+
+class CursorPaginator:
+    """
+    Keyset pagination on -id (the order of Post.objects.get_published()).
+    Going deeper into the archive costs the same as reading the first page:
+    there is no OFFSET and no COUNT(*) per request.
+    """
+
+    def __init__(self, object_list: QuerySet, per_page: int):
+        self.object_list = object_list
+        self.per_page = per_page
+
+    def _count_key(self) -> str:
+        digest = md5(str(self.object_list.query).encode()).hexdigest()
+        return COUNT_KEY.format(digest=digest)
+
+    @cached_property
+    def count(self) -> int:
+        # only shown as "N posts", so a count a few minutes old is fine
+        return cache.get_or_set(
+            self._count_key(),
+            self.object_list.count,
+            getattr(settings, 'BLOG_CURSOR_COUNT_TIMEOUT', 300),
+        )
+
+    async def acount(self) -> int:
+        """count, loaded with the async ORM (and kept for the template)."""
+        if 'count' not in self.__dict__:
+            key = self._count_key()
+            count = await cache.aget(key)
+            if count is None:
+                count = await self.object_list.acount()
+                await cache.aset(
+                    key, count,
+                    getattr(settings, 'BLOG_CURSOR_COUNT_TIMEOUT', 300))
+            self.count = count
+        return self.count
+
+    def _query(self, cursor: str | None) -> tuple[QuerySet, str]:
+        qs = self.object_list
+        size = self.per_page
+
+        if not cursor:
+            return qs.order_by('-id')[:size + 1], ''
+
+        direction, pk = decode_cursor(cursor)
+        if direction == 'n':
+            return qs.filter(id__lt=pk).order_by('-id')[:size + 1], direction
+        return qs.filter(id__gt=pk).order_by('id')[:size + 1], direction
+
+    def _page(self, items: list, direction: str) -> CursorPage:
+        size = self.per_page
+        if not direction:
+            return CursorPage(items[:size], self, len(items) > size, False)
+        if direction == 'n':
+            return CursorPage(items[:size], self, len(items) > size, True)
+        has_previous = len(items) > size
+        return CursorPage(items[:size][::-1], self, True, has_previous)
+
+    def page(self, cursor: str | None) -> CursorPage:
+        qs, direction = self._query(cursor)
+        return self._page(list(qs), direction)
+
+    async def apage(self, cursor: str | None) -> CursorPage:
+        qs, direction = self._query(cursor)
+        return self._page([item async for item in qs], direction)
+
+
+def estimated_count(queryset: QuerySet) -> int | None:
+    """
+    Rows of the table of queryset according to the PostgreSQL statistics
+    (pg_class.reltuples, kept up to date by autovacuum/ANALYZE), None on
+    other databases or before the table was ever analyzed.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+            [connection.ops.quote_name(queryset.model._meta.db_table)])
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    For the admin changelists: the unfiltered count of a table with more
+    than BLOG_ADMIN_ESTIMATED_COUNT_THRESHOLD rows is the planner estimate
+    instead of a COUNT(*) reading the whole table. The last page may end up
+    short or empty.
+    """
+
+    @cached_property
+    def count(self) -> int:
+        queryset = self.object_list
+        threshold = getattr(
+            settings, 'BLOG_ADMIN_ESTIMATED_COUNT_THRESHOLD', 100_000)
+        if isinstance(queryset, QuerySet) and not queryset.query.where:
+            estimate = estimated_count(queryset)
+            if estimate is not None and estimate > threshold:
+                return estimate
+        return super().count
@@ -0,0 +1,145 @@
+"""
+Related posts by tag and category similarity, precomputed into RelatedPost
+by `manage.py update_related_posts` so the post page reads them with one
+indexed query (blog.cards.related_cards).
+
+Each published post is a sparse vector over the tags and categories, every
+one weighted by how rare it is (idf) and the vector normalized, so the
+product of two vectors is their cosine similarity. The most similar posts of
+a chunk of posts come out of one sparse matrix product, with chunks small
+enough that its scores stay within SCORE_CELLS whatever the number of
+posts.
+
+blog.signals sets Post.related_stale when the tags, the category or the
+publication of a post change, and only those posts are computed again. The
+lists of the other posts don't notice that a changed post got closer or
+further: `update_related_posts --all` recomputes everything.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from scipy import sparse
+
+from blog.models import Post, RelatedPost
+from blog.page_cache import bump_tags
+
+# scores (chunk rows x published posts) of one product, ~80 MB with their
+# indices when every post shares a tag or the category with every other
+SCORE_CELLS = 5_000_000
+
+
+def _pairs(queryset) -> tuple[np.ndarray, np.ndarray]:
+    rows = np.array(list(queryset), dtype=np.int64).reshape(-1, 2)
+    return rows[:, 0], rows[:, 1]
+
+
+def build_matrix() -> tuple[np.ndarray, sparse.csr_matrix]:
+    """
+    Ids of the published posts (sorted) and their normalized idf vectors,
+    one row per id.
+    """
+    published = Post.objects.filter(is_published=True)
+    ids = np.fromiter(
+        published.order_by('pk').values_list('pk', flat=True),
+        dtype=np.int64)
+
+    tag_posts, tags = _pairs(Post.tag.through.objects.filter(
+        post__is_published=True).values_list('post_id', 'tag_id'))
+    category_posts, categories = _pairs(published.exclude(
+        category=None).values_list('pk', 'category_id'))
+
+    # tags and categories share the columns: ids mapped to 0..n
+    tag_ids, tag_columns = np.unique(tags, return_inverse=True)
+    _, category_columns = np.unique(categories, return_inverse=True)
+    rows = np.searchsorted(ids, np.concatenate([tag_posts, category_posts]))
+    columns = np.concatenate([tag_columns, category_columns + len(tag_ids)])
+    shape = (len(ids), int(columns.max(initial=-1)) + 1)
+
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, columns)), shape=shape)
+    # the same tag linked twice counts once
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+
+    posts_with = np.bincount(matrix.indices, minlength=shape[1])
+    idf = np.log1p(len(ids) / np.maximum(posts_with, 1))
+    matrix = matrix @ sparse.diags(idf)
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return ids, (sparse.diags(1 / norms) @ matrix).tocsr()
+
+
+def top_related(ids: np.ndarray, matrix: sparse.csr_matrix,
+                rows: np.ndarray, count: int):
+    """
+    (row, related rows, scores) for each of rows: the count posts with the
+    highest similarity, ties going to the newest.
+    """
+    step = max(1, SCORE_CELLS // max(len(ids), 1))
+    for chunk in range(0, len(rows), step):
+        yield from _top_related(ids, matrix, rows[chunk:chunk + step], count)
+
+
+def _top_related(ids, matrix, rows, count):
+    scores = (matrix[rows] @ matrix.T).tocsr()
+    for position, row in enumerate(rows):
+        start, end = scores.indptr[position], scores.indptr[position + 1]
+        columns = scores.indices[start:end]
+        values = scores.data[start:end]
+        keep = columns != row
+        columns, values = columns[keep], values[keep]
+        if len(values) > count:
+            # only sort the candidates (ties included)
+            keep = values >= np.partition(values, -count)[-count]
+            columns, values = columns[keep], values[keep]
+        # by score, then by id, both descending
+        order = np.lexsort((-ids[columns], -values))[:count]
+        yield row, columns[order], values[order]
+
+
+def update_related_posts(batch_size: int = 1000, on_batch=None) -> int:
+    """
+    Computes the RelatedPost rows of the stale posts, batch_size posts per
+    matrix product and transaction. Returns the number of posts.
+    """
+    stale = list(Post.objects.filter(related_stale=True).order_by(
+        'pk').values_list('pk', flat=True))
+    if not stale:
+        return 0
+    batches = [stale[i:i + batch_size]
+               for i in range(0, len(stale), batch_size)]
+    # cleared before reading the tags: a post changed while this runs is
+    # marked again and picked up by the next run
+    for batch in batches:
+        Post.objects.filter(pk__in=batch).update(related_stale=False)
+
+    count = getattr(settings, 'BLOG_RELATED_POSTS', 5)
+    finished = 0
+    try:
+        ids, matrix = build_matrix()
+        for batch in batches:
+            batch_ids = np.array(batch, dtype=np.int64)
+            # unpublished posts have no row, and no related posts
+            rows = np.searchsorted(ids, batch_ids[np.isin(batch_ids, ids)])
+            related = [
+                RelatedPost(post_id=int(ids[row]),
+                            related_id=int(ids[column]),
+                            rank=rank, score=float(score))
+                for row, columns, scores in top_related(
+                    ids, matrix, rows, count)
+                for rank, (column, score) in enumerate(zip(columns, scores))
+            ]
+
+            with transaction.atomic():
+                RelatedPost.objects.filter(post_id__in=batch).delete()
+                RelatedPost.objects.bulk_create(related)
+            bump_tags(*(f'post:{post_id}' for post_id in batch))
+            finished += 1
+            if on_batch:
+                on_batch(sum(map(len, batches[:finished])))
+    except BaseException:
+        for batch in batches[finished:]:
+            Post.objects.filter(pk__in=batch).update(related_stale=True)
+        raise
+    return len(stale)
@@ -0,0 +1,273 @@
+"""
+Turns the Summernote HTML of a post into what post.html shows, once per
+save instead of on every view (Post.rendered_content):
+
+- sanitizes it with an allowlist of tags, attributes and CSS properties,
+- lazy loads the images, with their dimensions and, for the uploaded ones,
+  a <picture> of their renditions,
+- gives the h2/h3 an id and lists them in Post.rendered_toc,
+- highlights the <pre> blocks with Pygments, so the page doesn't need
+  CodeMirror.
+
+Bump RENDER_VERSION when the output changes and run
+`manage.py render_posts` to render the stored posts again.
+"""
+import posixpath
+import re
+from functools import partial
+from html import unescape
+from typing import NamedTuple
+from urllib.parse import unquote, urlsplit
+
+from bleach.css_sanitizer import CSSSanitizer
+from bleach.html5lib_shim import Filter
+from bleach.sanitizer import Cleaner
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.utils.text import slugify
+from PIL import Image
+from pygments import highlight
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import TextLexer, get_lexer_by_name
+from pygments.util import ClassNotFound
+
+from images.renditions import get_renditions, split_formats
+
+RENDER_VERSION = 1
+RENDERED_FIELDS = ('rendered_content', 'rendered_toc', 'render_version')
+
+ALLOWED_TAGS = {
+    'a', 'b', 'blockquote', 'br', 'code', 'div', 'em', 'font', 'h1', 'h2',
+    'h3', 'h4', 'h5', 'h6', 'hr', 'i', 'img', 'li', 'ol', 'p', 'pre', 's',
+    'span', 'strike', 'strong', 'sub', 'sup', 'table', 'tbody', 'td', 'th',
+    'thead', 'tr', 'u', 'ul',
+}
+ALLOWED_ATTRIBUTES = {
+    '*': ['style'],
+    'a': ['href', 'title', 'target'],
+    'font': ['color'],
+    'img': ['src', 'alt', 'title', 'width', 'height'],
+    'pre': ['data-language'],
+    'td': ['colspan', 'rowspan'],
+    'th': ['colspan', 'rowspan'],
+}
+# what the Summernote toolbar of SUMMERNOTE_CONFIG can produce
+ALLOWED_CSS_PROPERTIES = {
+    'background-color', 'color', 'float', 'font-size', 'font-style',
+    'font-weight', 'height', 'line-height', 'margin', 'margin-left',
+    'text-align', 'text-decoration', 'width',
+}
+TOC_LEVELS = {'h2': 2, 'h3': 3}
+IMAGE_SIZES = '(max-width: 900px) 100vw, 900px'
+# CodeMirror modes (the data-language of the old posts) Pygments calls
+# something else
+LANGUAGE_ALIASES = {'htmlmixed': 'html', 'shell': 'bash'}
+
+_PLACEHOLDER_RE = re.compile(r'<pre data-block="(\d+)"></pre>')
+
+
+class Rendered(NamedTuple):
+    html: str
+    toc: list[dict]
+
+
+def token_text(tokens) -> str:
+    parts = []
+    for token in tokens:
+        if token['type'] in ('Characters', 'SpaceCharacters'):
+            parts.append(token['data'])
+        elif token['type'] == 'Entity':
+            parts.append(unescape(f'&{token["name"]};'))
+        elif token['type'] == 'EmptyTag' and token['name'] == 'br':
+            parts.append('\n')
+    return ''.join(parts)
+
+
+def media_name(src: str) -> str | None:
+    """
+    Storage name of a MEDIA_URL address, None for other images and for
+    names outside MEDIA_ROOT (/media/../settings.py).
+    """
+    prefix = urlsplit(settings.MEDIA_URL).path
+    path = urlsplit(src).path
+    if not prefix or not path.startswith(prefix):
+        return None
+    name = unquote(path[len(prefix):])
+    if not name:
+        return None
+    name = posixpath.normpath(name)
+    if name.startswith(('/', '../')) or name in ('.', '..'):
+        return None
+    return name
+
+
+def image_size(name: str) -> tuple[int, int] | None:
+    # only reads the header of the file
+    try:
+        with default_storage.open(name) as file:
+            return Image.open(file).size
+    except (OSError, ValueError, Image.DecompressionBombError,
+            SuspiciousFileOperation):
+        return None
+
+
+def srcset(renditions) -> str:
+    return ', '.join(f'{r.url} {r.width}w' for r in renditions)
+
+
+def _attrs(**attributes) -> dict:
+    return {(None, name): str(value) for name, value in attributes.items()}
+
+
+class ImageFilter(Filter):
+    def __iter__(self):
+        for token in super().__iter__():
+            if token['type'] == 'EmptyTag' and token['name'] == 'img':
+                yield from self.image(token)
+            else:
+                yield token
+
+    def image(self, token):
+        attributes = token['data']
+        attributes[(None, 'loading')] = 'lazy'
+        attributes[(None, 'decoding')] = 'async'
+        name = media_name(attributes.get((None, 'src'), ''))
+        renditions = get_renditions(name) if name else []
+
+        if not renditions:
+            size = image_size(name) if name else None
+            if size and (None, 'width') not in attributes:
+                attributes.update(_attrs(width=size[0], height=size[1]))
+            yield token
+            return
+
+        fallback, groups = split_formats(renditions)
+        largest = fallback[-1]
+        attributes.update(_attrs(
+            src=largest.url, srcset=srcset(fallback), sizes=IMAGE_SIZES,
+            width=largest.width, height=largest.height))
+
+        yield {'type': 'StartTag', 'name': 'picture', 'data': {}}
+        for group in groups:
+            yield {'type': 'EmptyTag', 'name': 'source', 'data': _attrs(
+                type=group[0].mime_type, srcset=srcset(group),
+                sizes=IMAGE_SIZES)}
+        yield token
+        yield {'type': 'EndTag', 'name': 'picture', 'data': {}}
+
+
+class _BlockFilter(Filter):
+    """Buffers the tokens of each `tag` element and passes them to block()."""
+
+    tags: set[str] = set()
+
+    def __iter__(self):
+        buffered, depth = [], 0
+        for token in super().__iter__():
+            if depth == 0:
+                if (token['type'] == 'StartTag'
+                        and token['name'] in self.tags):
+                    buffered, depth = [token], 1
+                else:
+                    yield token
+                continue
+
+            buffered.append(token)
+            if token.get('name') == buffered[0]['name']:
+                if token['type'] == 'StartTag':
+                    depth += 1
+                elif token['type'] == 'EndTag':
+                    depth -= 1
+            if depth == 0:
+                yield from self.block(buffered)
+        # an unclosed element at the end of the content
+        if depth:
+            yield from self.block(buffered)
+
+
+class HeadingFilter(_BlockFilter):
+    tags = set(TOC_LEVELS)
+
+    def __init__(self, source, toc: list[dict]):
+        super().__init__(source)
+        self.toc = toc
+        self.ids: set[str] = set()
+
+    def block(self, tokens):
+        start = tokens[0]
+        title = ' '.join(token_text(tokens[1:]).split())
+        if not title:
+            yield from tokens
+            return
+
+        base = slugify(title)[:50] or 'secao'
+        anchor, number = base, 1
+        while anchor in self.ids:
+            number += 1
+            anchor = f'{base}-{number}'
+        self.ids.add(anchor)
+
+        start['data'][(None, 'id')] = anchor
+        self.toc.append({
+            'level': TOC_LEVELS[start['name']], 'id': anchor, 'title': title,
+        })
+        yield from tokens
+
+
+class CodeFilter(_BlockFilter):
+    """
+    Leaves an empty <pre data-block="N"> where each code block was:
+    render() puts the Pygments output there after the serialization.
+    """
+
+    tags = {'pre'}
+
+    def __init__(self, source, blocks: list[str]):
+        super().__init__(source)
+        self.blocks = blocks
+
+    def block(self, tokens):
+        language = tokens[0]['data'].get((None, 'data-language'), '')
+        code = token_text(tokens[1:]).strip('\n')
+        self.blocks.append(highlight_code(code, language))
+        yield {'type': 'StartTag', 'name': 'pre',
+               'data': _attrs(**{'data-block': len(self.blocks) - 1})}
+        yield {'type': 'EndTag', 'name': 'pre', 'data': {}}
+
+
+def highlight_code(code: str, language: str) -> str:
+    language = language.strip().lower()
+    try:
+        lexer = get_lexer_by_name(LANGUAGE_ALIASES.get(language, language))
+    except ClassNotFound:
+        lexer = TextLexer()
+    return highlight(code, lexer, HtmlFormatter(wrapcode=True))
+
+
+def render(content: str) -> Rendered:
+    toc: list[dict] = []
+    blocks: list[str] = []
+    cleaner = Cleaner(
+        tags=ALLOWED_TAGS,
+        attributes=ALLOWED_ATTRIBUTES,
+        strip=True,
+        css_sanitizer=CSSSanitizer(
+            allowed_css_properties=ALLOWED_CSS_PROPERTIES),
+        filters=[
+            ImageFilter,
+            partial(HeadingFilter, toc=toc),
+            partial(CodeFilter, blocks=blocks),
+        ],
+    )
+    html = cleaner.clean(content)
+    html = _PLACEHOLDER_RE.sub(lambda match: blocks[int(match[1])], html)
+    return Rendered(html, toc)
+
+
+def render_post(post) -> None:
+    """Fills the RENDERED_FIELDS of post from its content."""
+    rendered = render(post.content)
+    post.rendered_content = rendered.html
+    post.rendered_toc = rendered.toc
+    post.render_version = RENDER_VERSION
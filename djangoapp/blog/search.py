@@ -0,0 +1,171 @@
+import re
+import unicodedata
+from collections import defaultdict
+from html import unescape
+from itertools import islice
+from typing import Iterable
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, F, Sum, TextField, Value
+from django.db.models.query import QuerySet
+from django.utils.html import strip_tags
+from django.utils.module_loading import import_string
+
+WORD_RE = re.compile(r'\w+')
+
+# same weights for both backends: title (A), excerpt (B), content (D)
+WEIGHTS = {'title': 1.0, 'excerpt': 0.4, 'content': 0.1}
+
+STOPWORDS = frozenset((
+    'a', 'o', 'as', 'os', 'e', 'de', 'da', 'do', 'das', 'dos', 'em', 'no',
+    'na', 'nos', 'nas', 'um', 'uma', 'uns', 'umas', 'para', 'por', 'com',
+    'que', 'se', 'ao', 'aos', 'ou', 'the', 'of', 'and', 'to', 'in',
+))
+
+# (suffix, replacement) for a light portuguese plural stemmer, checked
+# in this order after the accents are removed
+SUFFIXES = (
+    ('oes', 'ao'), ('aes', 'ao'), ('ais', 'al'), ('eis', 'el'),
+    ('ns', 'm'), ('s', ''),
+)
+
+
+def html_to_text(html: str) -> str:
+    return unescape(strip_tags(html or ''))
+
+
+def stem(word: str) -> str:
+    if len(word) <= 3:
+        return word
+    for suffix, replacement in SUFFIXES:
+        if word.endswith(suffix):
+            return word[:-len(suffix)] + replacement
+    return word
+
+
+def tokenize(text: str) -> list[str]:
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return [
+        stem(word)[:64] for word in WORD_RE.findall(text)
+        if word not in STOPWORDS
+    ]
+
+
+class BaseSearchBackend:
+    def search(self, queryset: QuerySet, query: str) -> QuerySet:
+        """Filters queryset by query, ordered by relevance."""
+        raise NotImplementedError
+
+    def index_posts(self, posts: Iterable) -> None:
+        """Indexes posts (title, excerpt and content loaded) in bulk."""
+        raise NotImplementedError
+
+    def index_post(self, post) -> None:
+        self.index_posts([post])
+
+    def rebuild(self, queryset: QuerySet, batch_size: int = 500) -> int:
+        count = 0
+        posts = queryset.iterator(chunk_size=batch_size)
+        while batch := list(islice(posts, batch_size)):
+            self.index_posts(batch)
+            count += len(batch)
+        return count
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    Weighted tsvector stored in Post.search_vector (GIN indexed), kept up to
+    date on save with the HTML already stripped from the content.
+    """
+
+    # portuguese with unaccent before the stemmer (migration 0012), so
+    # "configuracao" finds "configuração" like tokenize() does
+    config = 'portuguese_unaccent'
+
+    def search(self, queryset, query):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        search_query = SearchQuery(
+            query, config=self.config, search_type='websearch')
+        return queryset.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query),
+        ).order_by('-rank', '-id')
+
+    def index_posts(self, posts):
+        from django.contrib.postgres.search import SearchVector
+
+        def vector(text, weight):
+            return SearchVector(
+                Value(text, output_field=TextField()),
+                weight=weight, config=self.config)
+
+        # type(post): also the historical model of a migration. Stand-ins
+        # with only the vector, written by one bulk_update (no post_save)
+        vectors = [
+            type(post)(pk=post.pk, search_vector=(
+                vector(post.title, 'A') +
+                vector(post.excerpt, 'B') +
+                vector(html_to_text(post.content), 'D')
+            ))
+            for post in posts
+        ]
+        if vectors:
+            type(vectors[0])._default_manager.bulk_update(
+                vectors, ['search_vector'])
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    """
+    Inverted index built in python and stored in PostSearchTerm. Works on any
+    database, so it is what runs under SQLite and in the tests.
+    """
+
+    def search(self, queryset, query):
+        terms = set(tokenize(query))
+        if not terms:
+            return queryset.none()
+
+        # every term must match, like websearch_to_tsquery does
+        return queryset.filter(search_terms__term__in=terms).annotate(
+            rank=Sum('search_terms__weight'),
+            matched=Count('search_terms__term', distinct=True),
+        ).filter(matched=len(terms)).order_by('-rank', '-id')
+
+    def index_posts(self, posts):
+        posts = list(posts)
+        if not posts:
+            return
+        PostSearchTerm = posts[0].search_terms.model
+
+        rows = []
+        for post in posts:
+            weights: dict[str, float] = defaultdict(float)
+            for field, text in (
+                ('title', post.title),
+                ('excerpt', post.excerpt),
+                ('content', html_to_text(post.content)),
+            ):
+                for term in tokenize(text):
+                    weights[term] += WEIGHTS[field]
+            rows.extend(
+                PostSearchTerm(post_id=post.pk, term=term, weight=weight)
+                for term, weight in weights.items())
+
+        PostSearchTerm.objects.filter(
+            post_id__in=[post.pk for post in posts]).delete()
+        PostSearchTerm.objects.bulk_create(rows)
+
+
+BACKENDS = {
+    'postgres': 'blog.search.PostgresSearchBackend',
+    'simple': 'blog.search.SimpleSearchBackend',
+}
+
+
+def get_search_backend() -> BaseSearchBackend:
+    name = getattr(settings, 'BLOG_SEARCH_BACKEND', 'auto')
+    if name == 'auto':
+        name = 'postgres' if connection.vendor == 'postgresql' else 'simple'
+    return import_string(BACKENDS.get(name, name))()
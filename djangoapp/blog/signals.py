@@ -0,0 +1,195 @@
+from django.core.files.storage import default_storage
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from blog.models import Category, Page, Post, RelatedPost, Tag
+from blog.page_cache import bump_tags
+from blog.rendering import RENDERED_FIELDS, render_post
+from blog.search import get_search_backend
+from blog.sitemaps import chunk_of
+from blog.slugs import forget_slugs
+from images.signals import renditions_generated
+
+INDEXED_FIELDS = {'title', 'excerpt', 'content'}
+
+
+def post_cache_tags(post_id, category_id, created_by_id, tag_ids):
+    """Every cached page a post shows up in."""
+    tags = [f'post:{post_id}', 'index', 'search', 'sitemap',
+            f'sitemap:{chunk_of(post_id)}']
+    if category_id:
+        tags.append(f'category:{category_id}')
+    if created_by_id:
+        tags.append(f'author:{created_by_id}')
+    tags.extend(f'tag:{tag_id}' for tag_id in tag_ids)
+    return tags
+
+
+def _stored_post_cache_tags(post_id):
+    row = Post.objects.filter(pk=post_id).values_list(
+        'category_id', 'created_by_id').first()
+    if row is None:
+        return []
+    tag_ids = Post.tag.through.objects.filter(
+        post_id=post_id).values_list('tag_id', flat=True)
+    # the pages listing it among their related posts
+    related_to = RelatedPost.objects.filter(
+        related_id=post_id).values_list('post_id', flat=True)
+    return [*post_cache_tags(post_id, *row, tag_ids),
+            *(f'post:{pk}' for pk in related_to)]
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_cache_tags(sender, instance, **kwargs):
+    # the post may be leaving its old category/author listings
+    instance._previous_cache_tags = (
+        _stored_post_cache_tags(instance.pk) if instance.pk else [])
+
+
+@receiver(pre_save, sender=Post)
+def mark_related_stale(sender, instance, **kwargs):
+    # the category is part of the similarity (blog.related), and only
+    # published posts have related posts
+    if instance.pk is None:
+        return
+    stored = Post.objects.filter(pk=instance.pk).values_list(
+        'category_id', 'is_published').first()
+    if stored != (instance.category_id, instance.is_published):
+        instance.related_stale = True
+
+
+@receiver(post_save, sender=Post)
+def invalidate_post(sender, instance, **kwargs):
+    bump_tags(
+        *getattr(instance, '_previous_cache_tags', []),
+        *_stored_post_cache_tags(instance.pk),
+    )
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, update_fields=None, **kwargs):
+    # e.g. is_published from the admin changelist, without the content
+    if update_fields is not None and not INDEXED_FIELDS & update_fields:
+        return
+    get_search_backend().index_post(instance)
+
+
+@receiver(pre_delete, sender=Post)
+def remember_deleted_post_cache_tags(sender, instance, **kwargs):
+    # the tag links are gone by the time post_delete runs
+    instance._previous_cache_tags = _stored_post_cache_tags(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post(sender, instance, **kwargs):
+    bump_tags(*getattr(instance, '_previous_cache_tags', []))
+
+
+@receiver(m2m_changed, sender=Post.tag.through)
+def invalidate_post_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        if reverse:
+            instance._cleared_ids = set(
+                instance.post_set.values_list('pk', flat=True))
+        else:
+            instance._cleared_ids = set(
+                instance.tag.values_list('pk', flat=True))
+        return
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if action == 'post_clear':
+        pk_set = getattr(instance, '_cleared_ids', set())
+
+    post_ids, tag_ids = (pk_set, [instance.pk]) if reverse else (
+        [instance.pk], pk_set)
+    bump_tags(
+        *(f'post:{post_id}' for post_id in post_ids),
+        *(f'tag:{tag_id}' for tag_id in tag_ids),
+    )
+
+
+@receiver(m2m_changed, sender=Post.tag.through)
+def mark_related_stale_tags(sender, instance, action, reverse, pk_set,
+                            **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        post_ids = [instance.pk]
+    elif action == 'post_clear':
+        # set on pre_clear by invalidate_post_tags
+        post_ids = getattr(instance, '_cleared_ids', set())
+    else:
+        post_ids = pk_set
+    Post.objects.filter(pk__in=post_ids).update(related_stale=True)
+
+
+@receiver(pre_delete, sender=Category)
+@receiver(pre_delete, sender=Tag)
+def mark_related_stale_deleted(sender, instance, **kwargs):
+    # the tag links are deleted by the cascade and the category set to NULL
+    # in one UPDATE: neither sends m2m_changed or saves the posts
+    field = 'category' if sender is Category else 'tag'
+    Post.objects.filter(**{field: instance}).update(related_stale=True)
+
+
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=Tag)
+def remember_slug(sender, instance, **kwargs):
+    # the old slug must stop resolving if it changes
+    instance._previous_slug = None
+    if instance.pk:
+        instance._previous_slug = sender.objects.filter(
+            pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category(sender, instance, **kwargs):
+    forget_slugs(Category, instance.slug,
+                 getattr(instance, '_previous_slug', None))
+    bump_tags(f'category:{instance.pk}', f'category-name:{instance.pk}')
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tag(sender, instance, **kwargs):
+    forget_slugs(Tag, instance.slug,
+                 getattr(instance, '_previous_slug', None))
+    bump_tags(f'tag:{instance.pk}', f'tag-name:{instance.pk}')
+
+
+@receiver(post_save, sender=Page)
+@receiver(post_delete, sender=Page)
+def invalidate_page(sender, instance, **kwargs):
+    bump_tags(f'page:{instance.pk}', 'pages')
+
+
+@receiver(renditions_generated)
+def render_posts_with_image(sender, file_name, **kwargs):
+    # posts saved before the renditions of their images existed show the
+    # plain <img>: render them again with the <picture>
+    posts = list(Post.objects.filter(
+        content__contains=default_storage.url(file_name),
+    ).only('pk', 'content'))
+    for post in posts:
+        render_post(post)
+    Post.objects.bulk_update(posts, RENDERED_FIELDS)
+    bump_tags(*(f'post:{post.pk}' for post in posts))
+
+
+@receiver(renditions_generated)
+def refresh_posts_with_cover(sender, file_name, **kwargs):
+    # the cached pages of these posts show the plain <img> of the cover (the
+    # card fragments follow blog.cards.COVER_VERSION)
+    post_ids = list(Post.objects.filter(cover=file_name).values_list(
+        'pk', flat=True))
+    if not post_ids:
+        return
+    bump_tags(*(
+        tag for post_id in post_ids
+        for tag in _stored_post_cache_tags(post_id)
+    ))
@@ -0,0 +1,87 @@
+"""
+XML sitemaps, so crawlers find every post without paging through the
+listings: sitemap.xml is an index of sitemap-pages.xml (the home and the
+pages) and one sitemap-posts-N.xml per range of BLOG_SITEMAP_CHUNK_SIZE post
+ids.
+
+The chunks are cached by CachedPageMixin under the tag 'sitemap:N', so saving
+a post only regenerates its chunk (and the index, for its lastmod).
+"""
+from datetime import datetime
+from io import StringIO
+
+from django.conf import settings
+from django.db.models import F, Max
+from django.http import HttpRequest
+from django.urls import reverse
+from django.utils.xmlutils import SimplerXMLGenerator
+
+from blog.models import Page, Post
+
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def chunk_size() -> int:
+    return max(1, getattr(settings, 'BLOG_SITEMAP_CHUNK_SIZE', 5000))
+
+
+def chunk_of(post_id: int) -> int:
+    return (post_id - 1) // chunk_size()
+
+
+def chunk_lastmods() -> list[tuple[int, datetime]]:
+    """(chunk, last updated_at) of the chunks with published posts."""
+    # one aggregate over the published posts: integer division groups the
+    # ids of a chunk
+    return list(
+        Post.objects.get_published().order_by()
+        .annotate(chunk=(F('pk') - 1) / chunk_size())
+        .values('chunk').annotate(lastmod=Max('updated_at'))
+        .order_by('chunk').values_list('chunk', 'lastmod')
+    )
+
+
+def chunk_urls(chunk: int) -> list[tuple[str, datetime]]:
+    size = chunk_size()
+    posts = Post.objects.get_published().filter(
+        pk__gt=chunk * size, pk__lte=(chunk + 1) * size,
+    ).order_by('pk').values_list('slug', 'updated_at')
+    return [(reverse('blog:post', args=(slug,)), updated_at)
+            for slug, updated_at in posts]
+
+
+def page_urls() -> list[tuple[str, datetime | None]]:
+    pages = Page.objects.filter(is_published=True).order_by(
+        'pk').values_list('slug', flat=True)
+    return [(reverse('blog:index'), None)] + [
+        (reverse('blog:page', args=(slug,)), None) for slug in pages]
+
+
+def _write(request: HttpRequest, root: str, element: str,
+           urls: list[tuple[str, datetime | None]]) -> str:
+    output = StringIO()
+    xml = SimplerXMLGenerator(output, 'utf-8')
+    xml.startDocument()
+    xml.startElement(root, {'xmlns': SITEMAP_NS})
+    for path, lastmod in urls:
+        xml.startElement(element, {})
+        xml.addQuickElement('loc', request.build_absolute_uri(path))
+        if lastmod is not None:
+            xml.addQuickElement('lastmod', lastmod.isoformat())
+        xml.endElement(element)
+    xml.endElement(root)
+    xml.endDocument()
+    return output.getvalue()
+
+
+def render_index(request: HttpRequest) -> str:
+    sitemaps = [(reverse('blog:sitemap_pages'), None)] + [
+        (reverse('blog:sitemap_posts', args=(chunk,)), lastmod)
+        for chunk, lastmod in chunk_lastmods()
+    ]
+    return _write(request, 'sitemapindex', 'sitemap', sitemaps)
+
+
+def render_urlset(request: HttpRequest,
+                  urls: list[tuple[str, datetime | None]]) -> str:
+    return _write(request, 'urlset', 'url', urls)
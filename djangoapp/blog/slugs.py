@@ -0,0 +1,57 @@
+"""
+The Category/Tag of the listing URLs, found by slug in the cache, so the
+listings filter the posts by id and show the name without a query.
+
+blog.signals forgets the slugs of a category/tag when it is saved or deleted.
+Unknown slugs are remembered for a minute, so a crawler requesting made up
+ones doesn't query the database each time.
+"""
+from hashlib import sha1
+from typing import NamedTuple
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import models
+
+from utils.instrumentation import record_cache
+
+CACHE_KEY = 'slugs:{model}:{digest}'
+MISSING_TIMEOUT = 60
+# cached for unknown slugs: None is a cache miss
+_MISSING = ()
+
+
+class SlugTarget(NamedTuple):
+    id: int
+    name: str
+
+
+def _cache_key(model: type[models.Model], slug: str) -> str:
+    return CACHE_KEY.format(
+        model=model._meta.label_lower,
+        digest=sha1(slug.encode()).hexdigest())
+
+
+def get_by_slug(model: type[models.Model], slug: str) -> SlugTarget | None:
+    """Id and name of the model (Category or Tag) with this slug."""
+    key = _cache_key(model, slug)
+    cached = cache.get(key)
+    record_cache(hit=cached is not None)
+    if cached is None:
+        row = model.objects.filter(slug=slug).values_list(
+            'pk', 'name').first()
+        if row is None:
+            cache.set(key, _MISSING, MISSING_TIMEOUT)
+            return None
+        cached = SlugTarget(*row)
+        cache.set(key, cached, None)
+    return cached or None
+
+
+async def aget_by_slug(model: type[models.Model],
+                       slug: str) -> SlugTarget | None:
+    return await sync_to_async(get_by_slug)(model, slug)
+
+
+def forget_slugs(model: type[models.Model], *slugs: str | None) -> None:
+    cache.delete_many([_cache_key(model, slug) for slug in slugs if slug])
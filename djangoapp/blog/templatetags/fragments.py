@@ -0,0 +1,85 @@
+"""
+{% fragment %}: renders a block once per process for each key.
+
+    {% load fragments %}
+    {% fragment 'post_card' post.id post.updated_at %}...{% endfragment %}
+
+The key has to change with whatever the block shows (the SiteSetup version,
+the post's updated_at and cover renditions), so nothing is ever invalidated:
+old keys fall out of an LRU of BLOG_FRAGMENT_CACHE_SIZE entries. It is kept
+in the process instead of django's cache, where reading a fragment from
+memcached/redis costs about as much as rendering it.
+"""
+import threading
+from collections import OrderedDict
+
+from django import template
+from django.conf import settings
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+
+class FragmentCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[tuple, str] = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, key: tuple) -> str | None:
+        with self.lock:
+            html = self.entries.get(key)
+            if html is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            return html
+
+    def set(self, key: tuple, html: str, size: int) -> None:
+        with self.lock:
+            self.entries[key] = html
+            self.entries.move_to_end(key)
+            while len(self.entries) > size:
+                self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+
+fragments = FragmentCache()
+
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        size = getattr(settings, 'BLOG_FRAGMENT_CACHE_SIZE', 0)
+        if size <= 0:
+            return self.nodelist.render(context)
+
+        key = (self.name.resolve(context), *(
+            str(var.resolve(context)) for var in self.vary_on))
+        html = fragments.get(key)
+        if html is None:
+            html = self.nodelist.render(context)
+            fragments.set(key, html, size)
+        return mark_safe(html)
+
+
+@register.tag
+def fragment(parser, token):
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]} takes a fragment name and the values of its key.')
+    nodelist = parser.parse(('endfragment',))
+    parser.delete_first_token()
+    return FragmentNode(
+        nodelist, parser.compile_filter(bits[1]),
+        [parser.compile_filter(bit) for bit in bits[2:]])
@@ -1,3 +1,1028 @@
-from django.test import TestCase
+import json
+from contextlib import ExitStack
+from io import StringIO
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete
+from django.http import Http404
+from django.test import (AsyncRequestFactory, RequestFactory, TestCase,
+                         TransactionTestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.template import engines
+from django.template.loaders.cached import Loader as CachedLoader
+from django.urls import reverse
+
+from blog import async_views, page_cache, views
+from blog.models import Category, Page, Post, RelatedPost, Tag
+from blog.pagination import (CursorPaginator, EstimatedCountPaginator,
+                             estimated_count)
+from blog.rendering import RENDER_VERSION, image_size, media_name
+from blog.search import (SimpleSearchBackend, get_search_backend,
+                         tokenize)
+from blog.templatetags.fragments import fragments
+from images.models import ImageJob, ImageRendition
+from images.signals import renditions_generated
+from site_setup.cache import get_snapshot
+from site_setup.models import SiteSetup
+from utils.instrumentation import Registry, RequestMetrics, registry
+from utils.replicas import (LAST_WRITE_KEY, PIN_COOKIE, ReplicaRouter,
+                            choose_replica)
+
+
+# the replica connections can't see the data of TestCase's transaction:
+# ReplicaRoutingTests covers the replicas
+@override_settings(DATABASE_REPLICAS=[])
+class BlogTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        fragments.clear()
+        self.user = User.objects.create_user('autor', password='senha')
+        self.category = Category.objects.create(name='Python')
+        self.tag = Tag.objects.create(name='Django')
+        self.post = self.make_post('Primeiro post')
+        SiteSetup.objects.create(title='Blog', description='Descrição')
+
+    def make_post(self, title, **kwargs):
+        kwargs.setdefault('category', self.category)
+        kwargs.setdefault('content', '<p>Texto</p>')
+        kwargs.setdefault('created_by', self.user)
+        post = Post.objects.create(
+            title=title, excerpt=f'Resumo de {title}', is_published=True,
+            **kwargs)
+        post.tag.add(self.tag)
+        return post
+
+
+class PageCacheTests(BlogTestCase):
+    def test_anonymous_pages_are_served_from_cache(self):
+        url = reverse('blog:post', args=(self.post.slug,))
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'MISS')
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        self.assertContains(response, 'Primeiro post')
+
+    def test_saving_a_post_purges_only_affected_pages(self):
+        other_category = Category.objects.create(name='Outros')
+        other = self.make_post('Outro post', category=other_category)
+        urls = {
+            'index': reverse('blog:index'),
+            'post': reverse('blog:post', args=(self.post.slug,)),
+            'category': reverse('blog:category', args=(self.category.slug,)),
+            'tag': reverse('blog:tag', args=(self.tag.slug,)),
+            'author': reverse('blog:created_by', args=(self.user.pk,)),
+            'other_post': reverse('blog:post', args=(other.slug,)),
+            'other_category': reverse(
+                'blog:category', args=(other_category.slug,)),
+        }
+        for url in urls.values():
+            self.client.get(url)
+
+        self.post.title = 'Título novo'
+        self.post.save()
+
+        for name, url in urls.items():
+            expected = 'HIT' if name.startswith('other') else None
+            self.assertEqual(
+                self.client.get(url).get('X-Page-Cache'),
+                expected or 'MISS', name)
+
+    def test_logged_in_users_bypass_the_cache(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('blog:index'))
+        self.assertNotIn('X-Page-Cache', response)
+
+    def test_hit_counts_are_written_in_batches(self):
+        page_cache.reset_stats()
+        url = reverse('blog:post', args=(self.post.slug,))
+        with mock.patch.object(cache, 'incr') as incr, \
+                mock.patch.object(cache, 'add', wraps=cache.add) as add:
+            for _ in range(3):
+                self.client.get(url)
+        incr.assert_not_called()
+        # only the tag versions
+        self.assertFalse([call for call in add.call_args_list
+                          if call.args[0].startswith('page_cache:stats')])
+
+        stats = page_cache.get_stats()['PostDetailView']
+        self.assertEqual(stats, {'hits': 2, 'misses': 1})
+
+
+class CursorPaginationTests(BlogTestCase):
+    def test_walks_forward_and_back_in_id_order(self):
+        for i in range(20):
+            self.make_post(f'Post {i}')
+        qs = Post.objects.get_published()
+        ids = list(qs.values_list('id', flat=True))
+        paginator = CursorPaginator(qs, 9)
+
+        first = paginator.page(None)
+        second = paginator.page(first.next_cursor)
+        third = paginator.page(second.next_cursor)
+        self.assertEqual([p.id for p in first], ids[:9])
+        self.assertEqual([p.id for p in second], ids[9:18])
+        self.assertEqual([p.id for p in third], ids[18:])
+        self.assertFalse(third.has_next())
+
+        back = paginator.page(third.previous_cursor)
+        self.assertEqual([p.id for p in back], ids[9:18])
+        self.assertTrue(back.has_previous())
+        self.assertFalse(paginator.page(back.previous_cursor).has_previous())
+        self.assertEqual(paginator.count, 21)
+
+    @override_settings(BLOG_CURSOR_PAGINATION=True)
+    def test_listing_uses_cursor_links(self):
+        for i in range(10):
+            self.make_post(f'Post {i}')
+        response = self.client.get(reverse('blog:index'))
+        self.assertContains(response, '?cursor=')
+        self.assertContains(response, '11 posts')
+
+        next_cursor = response.context['page_obj'].next_cursor
+        response = self.client.get(
+            reverse('blog:index'), {'cursor': next_cursor})
+        self.assertEqual(len(response.context['posts']), 2)
+
+        response = self.client.get(reverse('blog:index'), {'cursor': 'x!'})
+        self.assertEqual(response.status_code, 404)
+
+
+class ConditionalGetTests(BlogTestCase):
+    def test_repeat_visits_get_a_304(self):
+        url = reverse('blog:post', args=(self.post.slug,))
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        # from the page cache
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # without it: one query for the tags of the post, no rendering
+        with override_settings(BLOG_PAGE_CACHE_ENABLED=False):
+            with self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            response = self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+            self.assertEqual(response.status_code, 304)
+
+    def test_changes_invalidate_the_validators(self):
+        urls = (
+            reverse('blog:index'),
+            reverse('blog:post', args=(self.post.slug,)),
+            reverse('blog:category', args=(self.category.slug,)),
+            reverse('blog:tag', args=(self.tag.slug,)),
+        )
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+
+        self.tag.name = 'Django ORM'
+        self.tag.save()
+        self.post.title = 'Título novo'
+        self.post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etags[url])
+
+    def test_logged_in_users_get_no_validators(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('blog:index'))
+        self.assertNotIn('ETag', response)
+
+
+class FeedSitemapTests(BlogTestCase):
+    def test_feeds_list_the_posts_of_their_listing(self):
+        other = self.make_post('Outro post', category=Category.objects.create(
+            name='Outros'), created_by=None)
+        urls = {
+            reverse('blog:feed'): {self.post, other},
+            reverse('blog:feed_atom'): {self.post, other},
+            reverse('blog:category_feed', args=(self.category.slug,)):
+                {self.post},
+            reverse('blog:tag_feed_atom', args=(self.tag.slug,)):
+                {self.post, other},
+            reverse('blog:created_by_feed', args=(self.user.pk,)):
+                {self.post},
+        }
+        get_snapshot()
+        for url, posts in urls.items():
+            with self.subTest(url=url):
+                # the slug/author and the projection at most
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertLessEqual(len(queries), 2)
+                self.assertIn('xml', response['Content-Type'])
+                for post in (self.post, other):
+                    link = f'http://testserver/post/{post.slug}/'
+                    if post in posts:
+                        self.assertContains(response, link)
+                    else:
+                        self.assertNotContains(response, link)
+
+        response = self.client.get(
+            reverse('blog:tag_feed', args=('nao-existe',)))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(BLOG_SITEMAP_CHUNK_SIZE=1)
+    def test_saving_a_post_regenerates_only_its_sitemap_chunk(self):
+        other = self.make_post('Outro post')
+        chunks = {
+            post: reverse('blog:sitemap_posts', args=(post.pk - 1,))
+            for post in (self.post, other)
+        }
+        index = self.client.get(reverse('blog:sitemap'))
+        for url in chunks.values():
+            self.assertContains(index, f'http://testserver{url}')
+            self.client.get(url)
+
+        self.post.title = 'Título novo'
+        self.post.save()
+        self.assertEqual(
+            self.client.get(chunks[self.post])['X-Page-Cache'], 'MISS')
+        self.assertEqual(self.client.get(chunks[other])['X-Page-Cache'], 'HIT')
+        self.assertEqual(
+            self.client.get(reverse('blog:sitemap'))['X-Page-Cache'], 'MISS')
+
+        self.post.is_published = False
+        self.post.save()
+        self.assertEqual(self.client.get(chunks[self.post]).status_code, 404)
+
+    def test_sitemaps_answer_conditional_gets_without_queries(self):
+        Page.objects.create(title='Sobre', slug='sobre', is_published=True,
+                            content='<p>Sobre</p>')
+        url = reverse('blog:sitemap_pages')
+        response = self.client.get(url)
+        self.assertContains(response, 'http://testserver/page/sobre/')
+
+        with override_settings(BLOG_PAGE_CACHE_ENABLED=False):
+            with self.assertNumQueries(0):
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+class StaticAssetTests(BlogTestCase):
+    def test_post_page_loads_no_cross_origin_assets(self):
+        url = reverse('blog:post', args=(self.post.slug,))
+        response = self.client.get(url)
+        self.assertNotContains(response, 'cdnjs')
+        self.assertContains(response, '/static/blog/css/highlight.css')
+        self.assertNotContains(response, 'codemirror.min.js')
+        self.assertContains(
+            response, '/static/fontawesomefree/css/solid.min.css')
+
+        # posts not rendered yet still highlight their code in the browser
+        Post.objects.update(render_version=0)
+        cache.clear()
+        self.assertContains(
+            self.client.get(url),
+            '/static/blog/vendor/codemirror/codemirror.min.js')
+
+
+class RenderingTests(BlogTestCase):
+    content = (
+        '<h2>Instalação &amp; uso</h2>'
+        '<p onclick="x()" style="color: red; position: fixed">Oi'
+        '<script>alert(1)</script></p>'
+        '<h2>Instalação &amp; uso</h2>'
+        '<pre data-language="python">def f():<br>    return 1 &lt; 2</pre>'
+        '<img src="/media/posts/foto.jpg">'
+        '<a href="javascript:alert(1)">link</a>'
+    )
+
+    def test_content_is_rendered_on_save(self):
+        post = self.make_post('Renderizado', content=self.content)
+        html = post.rendered_content
+
+        self.assertEqual(post.render_version, RENDER_VERSION)
+        self.assertNotIn('<script>', html)
+        self.assertNotIn('onclick', html)
+        self.assertNotIn('position', html)
+        self.assertNotIn('javascript:', html)
+        self.assertIn('style="color: red;"', html)
+        self.assertIn('<h2 id="instalacao-uso-2">', html)
+        self.assertEqual(post.rendered_toc, [
+            {'level': 2, 'id': 'instalacao-uso', 'title': 'Instalação & uso'},
+            {'level': 2, 'id': 'instalacao-uso-2',
+             'title': 'Instalação & uso'},
+        ])
+        self.assertIn('<div class="highlight">', html)
+        self.assertIn('<span class="k">return</span>', html)
+        self.assertIn('<span class="o">&lt;</span>', html)
+        self.assertIn('loading="lazy"', html)
+
+        response = self.client.get(post.get_absolute_url())
+        self.assertContains(response, 'href="#instalacao-uso-2"')
+
+    def test_images_switch_to_their_renditions(self):
+        post = self.make_post('Com foto', content=self.content)
+        self.assertNotIn('<picture>', post.rendered_content)
+
+        for width in (320, 640):
+            for fmt, ext in (('JPEG', 'jpg'), ('WEBP', 'webp')):
+                ImageRendition.objects.create(
+                    source_name='posts/foto.jpg', width=width,
+                    height=width // 2, format=fmt, size=1,
+                    file_name=f'renditions/posts/foto-{width}w.{ext}')
+        # what generate_renditions() does after writing them
+        cache.clear()
+        renditions_generated.send(ImageJob, file_name='posts/foto.jpg')
+
+        post.refresh_from_db()
+        html = post.rendered_content
+        self.assertIn('<picture><source type="image/webp"', html)
+        self.assertIn('src="/media/renditions/posts/foto-640w.jpg"', html)
+        self.assertIn('width="640" height="320"', html)
+
+    def test_images_outside_the_media_root_are_left_alone(self):
+        post = self.make_post('Fora', content=(
+            '<img src="/media/../../etc/passwd">'
+            '<img src="/media/posts/%2E%2E/%2E%2E/settings.py">'))
+        self.assertEqual(post.rendered_content.count('loading="lazy"'), 2)
+        self.assertNotIn('width=', post.rendered_content)
+
+        self.assertIsNone(media_name('/media/../../etc/passwd'))
+        self.assertEqual(media_name('/media/posts/./foto.jpg'),
+                         'posts/foto.jpg')
+        self.assertIsNone(image_size('../../etc/passwd'))
+
+    def test_render_posts_renders_outdated_posts(self):
+        self.make_post('Código', content=self.content)
+        Post.objects.update(rendered_content='', render_version=0)
+
+        call_command('render_posts', processes=1, batch_size=1,
+                     stdout=StringIO(), stderr=StringIO())
+        for post in Post.objects.all():
+            self.assertEqual(post.render_version, RENDER_VERSION)
+            self.assertTrue(post.rendered_content)
+
+
+@override_settings(BLOG_FRAGMENT_CACHE_SIZE=100, BLOG_PAGE_CACHE_ENABLED=False)
+class FragmentCacheTests(BlogTestCase):
+    def test_cards_and_layout_are_rendered_once(self):
+        self.make_post('Segundo post')
+        self.client.get(reverse('blog:index'))
+        # header, menu, footer and the two cards
+        self.assertEqual((fragments.hits, fragments.misses), (0, 5))
+
+        self.client.get(reverse('blog:index'))
+        self.assertEqual((fragments.hits, fragments.misses), (5, 5))
+
+    def test_changes_render_new_fragments(self):
+        self.client.get(reverse('blog:index'))
+
+        self.post.title = 'Título novo'
+        self.post.save()
+        setup = SiteSetup.objects.get()
+        setup.title = 'Outro blog'
+        setup.save()
+
+        response = self.client.get(reverse('blog:index'))
+        self.assertContains(response, 'Título novo')
+        # title, feed links, header and footer
+        self.assertContains(response, 'Outro blog', count=5)
+
+    def test_cover_renditions_render_a_new_card(self):
+        Post.objects.filter(pk=self.post.pk).update(cover='posts/capa.jpg')
+        updated_at = Post.objects.get(pk=self.post.pk).updated_at
+        response = self.client.get(reverse('blog:index'))
+        self.assertNotContains(response, '<picture>')
+
+        ImageRendition.objects.create(
+            source_name='posts/capa.jpg', width=320, height=160,
+            format='WEBP', size=1, file_name='renditions/posts/capa.webp')
+        # what generate_renditions() does after writing them
+        cache.clear()
+        renditions_generated.send(ImageJob, file_name='posts/capa.jpg')
+
+        response = self.client.get(reverse('blog:index'))
+        self.assertContains(response, 'renditions/posts/capa.webp')
+        # the feeds and sitemaps keep their dates
+        self.assertEqual(
+            Post.objects.get(pk=self.post.pk).updated_at, updated_at)
+
+    def test_least_recently_used_fragments_are_dropped(self):
+        with override_settings(BLOG_FRAGMENT_CACHE_SIZE=2):
+            self.client.get(reverse('blog:index'))
+        self.assertEqual(len(fragments.entries), 2)
+
+    def test_templates_use_the_cached_loader(self):
+        loader = engines['django'].engine.template_loaders[0]
+        self.assertIsInstance(loader, CachedLoader)
+
+
+class AdminChangeListTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser('admin', password='senha')
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:blog_post_changelist')
+
+    def changelist_queries(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in queries]
+
+    def test_queries_do_not_grow_with_the_rows(self):
+        self.changelist_queries()
+        _, before = self.changelist_queries()
+        for i in range(10):
+            author = User.objects.create_user(f'autor{i}')
+            self.make_post(f'Post {i}', created_by=author)
+        _, after = self.changelist_queries()
+        self.assertEqual(len(before), len(after), '\n'.join(after))
+        # the paginator's count only, no total count of the table
+        self.assertEqual(
+            sum('COUNT(' in sql and 'blog_post' in sql for sql in after), 1)
+        self.assertFalse(any('"content"' in sql for sql in after))
+
+    def test_list_editable_saves_without_the_content(self):
+        data = {
+            'form-TOTAL_FORMS': 1, 'form-INITIAL_FORMS': 1,
+            'form-0-id': self.post.pk, '_save': 'Save',
+        }
+        with mock.patch('blog.models.render_post') as render_post, \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 302)
+        render_post.assert_not_called()
+        self.assertFalse(any('"content"' in query['sql']
+                             for query in queries))
+        self.post.refresh_from_db()
+        self.assertFalse(self.post.is_published)
+        self.assertEqual(self.post.rendered_content, '<p>Texto</p>')
+
+    def test_search_uses_the_search_backend(self):
+        self.make_post('Configurando o Django', content='<p>Nginx</p>')
+        for term, expected in (('configurando', 'Configurando o Django'),
+                               ('nginx', 'Configurando o Django'),
+                               (str(self.post.pk), 'Primeiro post'),
+                               (self.post.slug, 'Primeiro post')):
+            with self.subTest(term=term):
+                response, queries = self.changelist_queries(q=term)
+                results = response.context['cl'].result_list
+                self.assertEqual([post.title for post in results], [expected])
+                self.assertFalse(any('"content" LIKE' in sql
+                                     for sql in queries))
+
+    def test_estimated_count_falls_back_to_count(self):
+        # no table statistics outside PostgreSQL
+        paginator = EstimatedCountPaginator(Post.objects.order_by('id'), 10)
+        self.assertIsNone(estimated_count(Post.objects.all()))
+        self.assertEqual(paginator.count, 1)
+
+
+class QueryBudgetTests(BlogTestCase):
+    """
+    Number of queries each public view may run to render a page, with a warm
+    SiteSetup snapshot and a cold page cache. A change that adds queries per
+    post/tag/author makes these fail.
+    """
+
+    budgets = {
+        'blog:index': ((), 2),
+        'blog:post': (('slug',), 3),
+        'blog:page': (('page_slug',), 1),
+        'blog:created_by': (('author_id',), 3),
+        'blog:category': (('category_slug',), 3),
+        'blog:tag': (('tag_slug',), 3),
+        'blog:search': ((), 2),
+    }
+
+    def setUp(self):
+        super().setUp()
+        other_tag = Tag.objects.create(name='ORM')
+        for i in range(12):
+            self.make_post(f'Post {i}').tag.add(other_tag)
+        self.post.tag.add(other_tag)
+        self.page = Page.objects.create(
+            title='Sobre', content='<p>Sobre</p>', is_published=True)
+
+    def get_url(self, name, arg_names):
+        values = {
+            'slug': self.post.slug,
+            'page_slug': self.page.slug,
+            'author_id': self.user.pk,
+            'category_slug': self.category.slug,
+            'tag_slug': self.tag.slug,
+        }
+        url = reverse(name, args=[values[arg] for arg in arg_names])
+        if name == 'blog:search':
+            url += '?search=post'
+        return url
+
+    def test_query_budget_per_view(self):
+        for name, (arg_names, budget) in self.budgets.items():
+            url = self.get_url(name, arg_names)
+            with self.subTest(view=name):
+                cache.clear()
+                get_snapshot()
+                with self.assertNumQueries(budget):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_listings_do_not_scan_the_post_table(self):
+        out = StringIO()
+        call_command('explain_views', stdout=out)
+        for name in ('index', 'created_by', 'category', 'tag', 'page'):
+            self.assertIn(f'{name} /', out.getvalue())
+        self.assertIn('0 queries with full table scans', out.getvalue())
+
+
+class RelatedPostTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.python, self.orm = (
+            Tag.objects.create(name='Python'), Tag.objects.create(name='ORM'))
+        self.first = self.make_post('Primeiro', category=None)
+        self.close = self.make_post('Parecido', category=None)
+        self.far = self.make_post('Distante', category=None)
+        self.first.tag.add(self.python, self.orm)
+        self.close.tag.add(self.python, self.orm)
+        self.far.tag.add(self.python)
+
+    def update(self, **options):
+        call_command('update_related_posts', stdout=StringIO(), **options)
+
+    def related(self, post):
+        return list(RelatedPost.objects.filter(post=post).order_by(
+            'rank').values_list('related_id', flat=True))
+
+    def test_most_similar_posts_come_first(self):
+        self.update()
+        self.assertEqual(self.related(self.first)[:2],
+                         [self.close.pk, self.far.pk])
+        self.assertFalse(Post.objects.filter(related_stale=True).exists())
+
+        # the same lists with one post per product
+        expected = list(RelatedPost.objects.values_list(
+            'post', 'related', 'rank'))
+        with mock.patch('blog.related.SCORE_CELLS', 1):
+            self.update(all=True)
+        self.assertCountEqual(RelatedPost.objects.values_list(
+            'post', 'related', 'rank'), expected)
+
+        url = reverse('blog:post', args=(self.first.slug,))
+        response = self.client.get(url)
+        self.assertContains(response, 'Posts relacionados')
+        self.assertContains(response, f'href="/post/{self.close.slug}/"')
+
+        # the page of a listed post is purged when it changes
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'HIT')
+        self.close.is_published = False
+        self.close.save()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertNotContains(response, f'/post/{self.close.slug}/')
+
+    def test_only_changed_posts_are_computed_again(self):
+        self.update()
+        self.first.title = 'Outro título'
+        self.first.save()
+        self.first.tag.remove(self.orm)
+        self.orm.post_set.add(self.far)
+        self.post.category = None
+        self.post.save()
+
+        stale = set(Post.objects.filter(
+            related_stale=True).values_list('pk', flat=True))
+        self.assertEqual(stale, {self.first.pk, self.far.pk, self.post.pk})
+        self.update()
+        self.assertEqual(self.related(self.first)[0], self.far.pk)
+
+    def test_deleting_a_tag_or_category_marks_its_posts_stale(self):
+        self.post.tag.add(self.python)
+        self.update()
+        self.orm.delete()
+        self.assertEqual(set(Post.objects.filter(
+            related_stale=True).values_list('pk', flat=True)),
+            {self.first.pk, self.close.pk})
+
+        self.update()
+        self.category.delete()
+        self.assertEqual(list(Post.objects.filter(
+            related_stale=True).values_list('pk', flat=True)),
+            [self.post.pk])
+
+
+class SlugListingTests(BlogTestCase):
+    def test_listings_resolve_the_slug_once(self):
+        for name, instance in (('blog:category', self.category),
+                               ('blog:tag', self.tag)):
+            url = reverse(name, args=(instance.slug,))
+            self.client.get(url)
+            with self.subTest(view=name):
+                # the slug comes from the cache: count and page
+                with override_settings(BLOG_PAGE_CACHE_ENABLED=False):
+                    with self.assertNumQueries(2):
+                        response = self.client.get(url)
+                self.assertContains(response, f'- {instance.name} -')
+
+    def test_titles_name_the_requested_tag(self):
+        other = Tag.objects.create(name='Aaa')
+        self.post.tag.add(other)
+        response = self.client.get(reverse('blog:tag', args=(self.tag.slug,)))
+        self.assertEqual(
+            response.context['page_title'], 'Tag - Django - ')
+
+    def test_unknown_and_empty_listings(self):
+        for name in ('blog:category', 'blog:tag'):
+            with self.subTest(view=name):
+                response = self.client.get(reverse(name, args=('nada',)))
+                self.assertEqual(response.status_code, 404)
+
+        empty_tag = Tag.objects.create(name='Vazia')
+        empty_category = Category.objects.create(name='Vazia')
+        response = self.client.get(reverse('blog:tag', args=(empty_tag.slug,)))
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            reverse('blog:category', args=(empty_category.slug,)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_changed_slugs_stop_resolving(self):
+        old_url = reverse('blog:category', args=(self.category.slug,))
+        self.assertEqual(self.client.get(old_url).status_code, 200)
+
+        self.category.slug = 'linguagens'
+        self.category.save()
+        self.assertEqual(self.client.get(old_url).status_code, 404)
+        response = self.client.get(reverse('blog:category',
+                                           args=('linguagens',)))
+        self.assertEqual(response.status_code, 200)
+
+
+class SimpleSearchBackendTests(BlogTestCase):
+    def test_tokenize_strips_accents_stopwords_and_plurals(self):
+        self.assertEqual(
+            tokenize('As Configurações do Django'),
+            ['configuracao', 'django'])
+
+    def test_ranks_title_matches_first_and_paginates(self):
+        in_content = Post.objects.create(
+            title='Outro', excerpt='Resumo', is_published=True,
+            content='<p>fala de <b>migrações</b></p>')
+        in_title = self.make_post('Migrações no Django')
+        for i in range(10):
+            self.make_post(f'Migração {i}')
+
+        results = list(SimpleSearchBackend().search(
+            Post.objects.get_published(), 'migracao'))
+        self.assertEqual(len(results), 12)
+        self.assertEqual(results[-1], in_content)
+        self.assertIn(in_title, results[:11])
+
+        response = self.client.get(
+            reverse('blog:search'), {'search': 'migração', 'page': 2})
+        self.assertEqual(len(response.context['posts']), 3)
+        self.assertContains(response, '&amp;search=migra%C3%A7%C3%A3o')
+
+
+class PostCardTests(BlogTestCase):
+    def test_listings_never_select_the_post_content(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('blog:index'))
+
+        card = response.context['posts'][0]
+        self.assertEqual(card.url, self.post.get_absolute_url())
+        self.assertContains(response, f'href="{card.url}"', count=2)
+        for query in queries:
+            self.assertNotIn('"content"', query['sql'])
+
+
+class PostTransferTests(BlogTestCase):
+    def export(self, **options):
+        with NamedTemporaryFile('r', suffix='.ndjson') as file:
+            call_command('export_posts', output=file.name, stderr=StringIO(),
+                         **options)
+            return [json.loads(line) for line in file]
+
+    def import_records(self, records, **options):
+        with NamedTemporaryFile('w', suffix='.ndjson') as file:
+            file.writelines(json.dumps(record) + '\n' for record in records)
+            file.flush()
+            call_command('import_posts', file.name, stdout=StringIO(),
+                         stderr=StringIO(), **options)
+
+    def test_round_trip_recreates_posts_tags_and_categories(self):
+        other = self.make_post('Com capa', content='<h2>Seção</h2>')
+        Post.objects.filter(pk=other.pk).update(cover='posts/capa.jpg')
+        created_at = Post.objects.get(pk=other.pk).created_at
+        records = self.export(batch_size=1)
+        self.assertEqual([r['slug'] for r in records],
+                         [self.post.slug, other.slug])
+
+        Post.objects.all().delete()
+        Tag.objects.all().delete()
+        Category.objects.all().delete()
+        self.import_records(records, batch_size=1)
+
+        post = Post.objects.get(slug=other.slug)
+        self.assertEqual(post.created_at, created_at)
+        self.assertEqual(post.created_by, self.user)
+        self.assertEqual(post.category.slug, self.category.slug)
+        self.assertEqual(
+            list(post.tag.values_list('slug', flat=True)), [self.tag.slug])
+        self.assertEqual(post.render_version, RENDER_VERSION)
+        self.assertEqual(post.rendered_toc[0]['title'], 'Seção')
+        self.assertEqual(list(get_search_backend().search(
+            Post.objects.all(), 'secao')), [post])
+        # the cover is left to run_image_jobs
+        self.assertEqual(
+            set(ImageJob.objects.filter(file_name='posts/capa.jpg')
+                .values_list('kind', 'status')),
+            {(ImageJob.Kind.RESIZE, ImageJob.Status.PENDING),
+             (ImageJob.Kind.RENDITIONS, ImageJob.Status.PENDING)})
+
+    def test_import_upserts_by_slug_and_replaces_the_tags(self):
+        record, = self.export()
+        record.update(title='Título novo', tags=[{'name': 'Nova tag'}])
+        new = dict(record, slug='', title='Post novo', created_by='ninguem')
+        self.import_records([record, new], no_render=True)
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.title, 'Título novo')
+        self.assertEqual(self.post.render_version, 0)
+        self.assertEqual(
+            list(self.post.tag.values_list('slug', flat=True)), ['nova-tag'])
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertIsNone(Post.objects.get(title='Post novo').created_by)
+
+    def test_import_queries_do_not_grow_with_the_batch(self):
+        records = self.export()
+        for i in range(20):
+            records.append(dict(records[0], slug=f'post-{i}'))
+        with CaptureQueriesContext(connection) as one:
+            self.import_records(records[:1], no_render=True)
+        with CaptureQueriesContext(connection) as many:
+            self.import_records(records, no_render=True)
+        self.assertEqual(len(one), len(many))
+
+
+@override_settings(DATABASE_REPLICAS=[])
+class BenchmarkCommandTests(TestCase):
+    def test_seed_blog_and_bench_views(self):
+        call_command(
+            'seed_blog', posts=30, users=3, categories=2, tags=5, pages=1,
+            seed=1, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertTrue(Post.tag.through.objects.exists())
+        # what Post.save does, in bulk
+        self.assertFalse(Post.objects.exclude(
+            render_version=RENDER_VERSION).exists())
+        self.assertFalse(Post.objects.filter(search_terms=None).exists())
+        SiteSetup.objects.create(title='Blog', description='Descrição')
+
+        out = StringIO()
+        call_command(
+            'bench_views', requests=3, warmup=1, mode=['client', 'asgi'],
+            stdout=out, stderr=StringIO())
+        report = json.loads(out.getvalue())
+        views = {(row['view'], row['mode']): row for row in report['views']}
+        self.assertEqual(views['index', 'client']['errors'], 0)
+        self.assertEqual(
+            views['index', 'client']['queries'],
+            views['index', 'asgi']['queries'])
+        self.assertIn(('tag', 'asgi'), views)
+
+        out = StringIO()
+        call_command('bench_render', repeat=2, warmup=0, stdout=out,
+                     stderr=StringIO())
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['meta']['cards'], 9)
+        self.assertEqual(len(report['results']), 3)
+
+        other = Post.objects.create(title='Fora do seed', content='Texto')
+        other.tag.add(Tag.objects.first())
+        RelatedPost.objects.create(
+            post=other, related=Post.objects.first(), rank=0, score=1)
+        Post.objects.update(related_stale=False)
+
+        # one DELETE per batch of posts and no per-row signals
+        deleted = mock.Mock()
+        for model in (Post, Tag, Category):
+            post_delete.connect(deleted, sender=model)
+            self.addCleanup(post_delete.disconnect, deleted, sender=model)
+        with CaptureQueriesContext(connection) as queries:
+            call_command('seed_blog', clear=True, batch_size=10,
+                         stdout=StringIO())
+        deleted.assert_not_called()
+        self.assertEqual(len([
+            query for query in queries
+            if query['sql'].startswith('DELETE FROM "blog_post" ')]), 3)
+        self.assertEqual(list(Post.objects.all()), [other])
+        self.assertFalse(Tag.objects.exists())
+        self.assertFalse(Category.objects.exists())
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(RelatedPost.objects.exists())
+        self.assertTrue(Post.objects.get().related_stale)
+
+
+@override_settings(PERF_SAMPLE_RATE=1, PERF_SERVER_TIMING=True)
+class InstrumentationTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+
+    def test_sampled_requests_report_queries_and_cache(self):
+        url = reverse('blog:post', args=(self.post.slug,))
+        with self.assertLogs('perf') as logs:
+            first = self.client.get(url)
+            second = self.client.get(url)
+            metrics = self.client.get(reverse('metrics')).content.decode()
+
+        self.assertIn('tpl;dur=', first['Server-Timing'])
+        self.assertRegex(first['Server-Timing'], r'desc="[1-9]\d* queries')
+        self.assertIn('desc="0 queries', second['Server-Timing'])
+        self.assertIn('1 hits', second['Server-Timing'])
+        self.assertIn('"view": "blog:post"', logs.output[0])
+        self.assertIn(
+            'django_requests_total{view="blog:post",status="200"} 2', metrics)
+
+    def test_new_connections_are_counted(self):
+        # the test case keeps its connection open: simulate a reconnect
+        connection_created.send(
+            sender=connection.__class__, connection=connection)
+        with self.assertLogs('perf') as logs:
+            metrics = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('"db_connections": 0', logs.output[0])
+        self.assertIn(
+            'django_db_connections_created_total{alias="default"} 1', metrics)
+
+    def test_metrics_add_up_the_workers_of_the_metrics_dir(self):
+        other = Registry()
+        other.add(RequestMetrics(view='blog:index', status=200, queries=3))
+        other.connection_created('default')
+        with TemporaryDirectory() as directory, \
+                self.settings(PERF_METRICS_DIR=directory):
+            # a worker recycled before this request
+            with open(f'{directory}/1-1.json', 'w') as file:
+                json.dump(other.snapshot(), file)
+            with self.assertLogs('perf'):
+                self.client.get(reverse('blog:index'))
+                metrics = self.client.get(
+                    reverse('metrics')).content.decode()
+
+        self.assertIn(
+            'django_requests_total{view="blog:index",status="200"} 2',
+            metrics)
+        self.assertIn(
+            'django_db_connections_created_total{alias="default"} 1',
+            metrics)
+
+    @override_settings(PERF_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_measured(self):
+        response = self.client.get(reverse('blog:index'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(registry.views, {})
+
+    @override_settings(INTERNAL_IPS=[])
+    def test_metrics_are_not_public(self):
+        with self.assertLogs('perf'):
+            response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(BLOG_PAGE_CACHE_ENABLED=False)
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {'default', *settings.DATABASE_REPLICAS}
+
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_superuser('admin', password='senha')
+        SiteSetup.objects.create(title='Blog', description='Descrição')
+        Post.objects.create(
+            title='Primeiro post', content='<p>Texto</p>', is_published=True,
+            created_by=self.staff)
+        # setUp wrote to the primary
+        cache.delete(LAST_WRITE_KEY)
+
+    def queries_per_database(self, url, **kwargs):
+        with ExitStack() as stack:
+            captured = {
+                alias: stack.enter_context(
+                    CaptureQueriesContext(connections[alias]))
+                for alias in self.databases
+            }
+            response = self.client.get(url, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        return response, {
+            alias: len(queries) for alias, queries in captured.items()}
+
+    @skipUnless(settings.DATABASE_REPLICAS,
+                'needs POSTGRES_REPLICA_HOSTS or POSTGRES_REPLICA_DBS')
+    def test_public_pages_read_from_a_replica(self):
+        _, queries = self.queries_per_database(reverse('blog:index'))
+        self.assertEqual(queries['default'], 0)
+        self.assertGreater(sum(queries.values()), 0)
+
+    @skipUnless(settings.DATABASE_REPLICAS,
+                'needs POSTGRES_REPLICA_HOSTS or POSTGRES_REPLICA_DBS')
+    def test_writers_are_pinned_to_the_primary(self):
+        self.client.force_login(self.staff)
+        response = self.client.post(
+            reverse('admin:blog_tag_add'), {'name': 'Nova'})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        _, queries = self.queries_per_database(reverse('blog:index'))
+        self.assertEqual(sum(queries.values()), queries['default'])
+
+    @override_settings(DATABASE_REPLICAS=['default'])
+    def test_write_pins_even_without_real_replicas(self):
+        response = self.client.post(reverse('admin:login'), {
+            'username': 'admin', 'password': 'senha',
+            'next': reverse('admin:index'),
+        })
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertIsNotNone(cache.get(LAST_WRITE_KEY))
+        self.assertEqual(choose_replica(), 'default')
+
+    def test_admin_and_writes_use_the_primary(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Post))
+        self.assertEqual(router.db_for_write(Post), 'default')
+        for alias in settings.DATABASE_REPLICAS:
+            self.assertFalse(router.allow_migrate(alias, 'blog'))
+
+
+@override_settings(BLOG_PAGE_CACHE_ENABLED=False)
+class AsyncViewTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(10):
+            self.make_post(f'Post {i}')
+        self.page = Page.objects.create(
+            title='Sobre', content='<p>Sobre</p>', is_published=True)
+
+    def render_sync(self, view, path, **kwargs):
+        request = RequestFactory().get(path)
+        request.user = AnonymousUser()
+        return view.as_view()(request, **kwargs).render()
+
+    def render_async(self, view, path, **kwargs):
+        request = AsyncRequestFactory().get(path)
+        request.user = AnonymousUser()
+        response = async_to_sync(view.as_view())(request, **kwargs)
+        return response.render()
+
+    def test_async_views_render_the_same_pages(self):
+        cases = (
+            ('PostListView', '/', {}),
+            ('PostListView', '/?page=2', {}),
+            ('PostDetailView', '/', {'slug': self.post.slug}),
+            ('PageDetailView', '/', {'slug': self.page.slug}),
+            ('CreatedByListView', '/', {'author_id': self.user.pk}),
+            ('CategoryListView', '/', {'slug': self.category.slug}),
+            ('TagListView', '/', {'slug': self.tag.slug}),
+            ('SearchListView', '/?search=post', {}),
+        )
+        for name, path, kwargs in cases:
+            with self.subTest(view=name, path=path):
+                expected = self.render_sync(
+                    getattr(views, name), path, **kwargs)
+                response = self.render_async(
+                    getattr(async_views, name), path, **kwargs)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, expected.content)
+
+    def test_async_views_raise_404(self):
+        cases = (
+            ('CategoryListView', '/', {'slug': 'nao-existe'}),
+            ('TagListView', '/', {'slug': 'nao-existe'}),
+            ('CreatedByListView', '/', {'author_id': 999}),
+            ('PostDetailView', '/', {'slug': 'nao-existe'}),
+            ('PostListView', '/?page=99', {}),
+        )
+        for name, path, kwargs in cases:
+            with self.subTest(view=name), self.assertRaises(Http404):
+                self.render_async(getattr(async_views, name), path, **kwargs)
+
+    def test_async_views_query_before_rendering(self):
+        request = AsyncRequestFactory().get('/')
+        request.user = AnonymousUser()
+        get_snapshot()
+        response = async_to_sync(async_views.PostListView.as_view())(request)
+        with self.assertNumQueries(0):
+            response.render()
+
+        # the cursor pages count the posts before rendering too
+        cache.clear()
+        with self.settings(BLOG_CURSOR_PAGINATION=True):
+            response = async_to_sync(
+                async_views.PostListView.as_view())(request)
+            with self.assertNumQueries(0):
+                response.render()
+        self.assertContains(response, '1 posts')
@@ -0,0 +1,218 @@
+"""
+Posts as NDJSON (`manage.py export_posts` / `import_posts`): one post per
+line, with its category, tags and authors by slug/username so the file can be
+loaded into another database.
+
+Both directions work in batches and hold one batch in memory at a time. The
+import writes each batch with a few bulk queries instead of a Post.save per
+post: posts, categories and tags are upserted by slug and the tag links of
+the batch are replaced, and the posts of the batch are indexed by the search
+backend in bulk. The rest of what save() does is left to commands: the
+content is rendered by `manage.py render_posts` and the covers are queued
+for `manage.py run_image_jobs`.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+from django.contrib.auth.models import User
+from django.db import models, transaction
+from django.utils.dateparse import parse_datetime
+from django.utils.text import slugify
+
+from blog.models import Category, Post, Tag
+from blog.search import get_search_backend
+from blog.slugs import forget_slugs
+from images.jobs import enqueue_many
+from images.models import ImageJob
+
+POST_FIELDS = (
+    'slug', 'title', 'excerpt', 'content', 'is_published', 'cover',
+    'cover_in_post_content',
+)
+# updated on the posts already in the database; the render fields so they
+# are rendered again, related_stale for `manage.py update_related_posts`
+UPSERT_FIELDS = (
+    'title', 'excerpt', 'content', 'is_published', 'cover',
+    'cover_in_post_content', 'created_by', 'updated_by', 'category',
+    'rendered_content', 'rendered_toc', 'render_version', 'related_stale',
+)
+
+
+@dataclass
+class ImportStats:
+    posts: int = 0
+    created: int = 0
+    tag_links: int = 0
+    covers: int = 0
+    unknown_users: int = 0
+
+
+def export_posts(queryset: models.QuerySet,
+                 batch_size: int = 1000) -> Iterator[dict]:
+    """The posts of queryset as NDJSON records, in pk order."""
+    rows = queryset.order_by('pk').values_list(
+        'pk', *POST_FIELDS, 'created_at', 'updated_at',
+        'created_by__username', 'updated_by__username',
+        'category__slug', 'category__name')
+    through = Post.tag.through
+    last_pk = 0
+
+    while True:
+        # keyset pagination: each batch is an index range scan
+        batch = list(rows.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return
+        last_pk = batch[-1][0]
+
+        tags = defaultdict(list)
+        for post_id, slug, name in through.objects.filter(
+                post_id__in=[row[0] for row in batch]).order_by(
+                'pk').values_list('post_id', 'tag__slug', 'tag__name'):
+            tags[post_id].append({'slug': slug, 'name': name})
+
+        for row in batch:
+            (pk, *values, created_at, updated_at, created_by, updated_by,
+             category_slug, category_name) = row
+            record = dict(zip(POST_FIELDS, values))
+            record.update(
+                created_at=created_at.isoformat(),
+                updated_at=updated_at.isoformat(),
+                created_by=created_by,
+                updated_by=updated_by,
+                category=({'slug': category_slug, 'name': category_name}
+                          if category_slug else None),
+                tags=tags[pk],
+            )
+            yield record
+
+
+def _upsert_by_slug(model: type[models.Model], names: dict[str, str],
+                    batch_size: int | None) -> dict[str, int]:
+    """Creates or renames the rows of model by slug; returns their ids."""
+    if not names:
+        return {}
+    model.objects.bulk_create(
+        [model(slug=slug, name=name) for slug, name in names.items()],
+        update_conflicts=True, unique_fields=['slug'],
+        update_fields=['name'], batch_size=batch_size)
+    forget_slugs(model, *names)
+    # bulk_create doesn't set the pks of upserted rows on every database
+    return dict(model.objects.filter(
+        slug__in=names).values_list('slug', 'pk'))
+
+
+def _slug_names(values: Iterable[dict | None]) -> dict[str, str]:
+    names = {}
+    for value in values:
+        if not value or not value.get('name'):
+            continue
+        names[value.get('slug') or slugify(value['name'])] = value['name']
+    return names
+
+
+def _related_slug(value: dict | None) -> str | None:
+    if not value or not value.get('name'):
+        return None
+    return value.get('slug') or slugify(value['name'])
+
+
+def import_batch(records: list[dict], stats: ImportStats,
+                 batch_size: int | None, index: bool = True) -> None:
+    # the last line wins when a slug repeats: an upsert can't update the
+    # same row twice in one query
+    records = list({record['slug']: record for record in records}.values())
+    slugs = [record['slug'] for record in records]
+
+    with transaction.atomic():
+        categories = _upsert_by_slug(
+            Category, _slug_names(record.get('category')
+                                  for record in records), batch_size)
+        tags = _upsert_by_slug(Tag, _slug_names(
+            tag for record in records for tag in record.get('tags') or ()),
+            batch_size)
+        usernames = {
+            record.get(field) for record in records
+            for field in ('created_by', 'updated_by')} - {None}
+        users = dict(User.objects.filter(
+            username__in=usernames).values_list('username', 'pk'))
+        stats.unknown_users += len(usernames - set(users))
+        existing = set(Post.objects.filter(
+            slug__in=slugs).values_list('slug', flat=True))
+
+        posts = [
+            Post(
+                **{field: record[field] for field in POST_FIELDS
+                   if field in record},
+                created_by_id=users.get(record.get('created_by')),
+                updated_by_id=users.get(record.get('updated_by')),
+                category_id=categories.get(
+                    _related_slug(record.get('category'))),
+            )
+            for record in records
+        ]
+        Post.objects.bulk_create(
+            posts, update_conflicts=True, unique_fields=['slug'],
+            update_fields=UPSERT_FIELDS, batch_size=batch_size)
+
+        ids = dict(Post.objects.filter(
+            slug__in=slugs).values_list('slug', 'pk'))
+        # bulk_create set the auto_now(_add) fields to now: bulk_update
+        # writes the exported ones as they are
+        dated = []
+        for post, record in zip(posts, records):
+            post.pk = ids[post.slug]
+            created_at = parse_datetime(record.get('created_at') or '')
+            updated_at = parse_datetime(record.get('updated_at') or '')
+            if created_at and updated_at:
+                post.created_at, post.updated_at = created_at, updated_at
+                dated.append(post)
+        Post.objects.bulk_update(
+            dated, ['created_at', 'updated_at'], batch_size=batch_size)
+
+        through = Post.tag.through
+        through.objects.filter(post_id__in=ids.values()).delete()
+        links = through.objects.bulk_create([
+            through(post_id=ids[record['slug']], tag_id=tags[slug])
+            for record in records
+            for slug in {_related_slug(tag)
+                         for tag in record.get('tags') or ()} - {None}
+        ], batch_size=batch_size)
+
+        if index:
+            # the posts hold what was just written, with their pks
+            get_search_backend().index_posts(posts)
+
+        covers = [post.cover.name for post in posts if post.cover]
+        enqueue_many(ImageJob.Kind.RESIZE, covers, 900, quality=70)
+        enqueue_many(ImageJob.Kind.RENDITIONS, covers, quality=70)
+
+    stats.posts += len(records)
+    stats.created += len(set(slugs) - existing)
+    stats.tag_links += len(links)
+    stats.covers += len(covers)
+
+
+def import_posts(records: Iterable[dict], batch_size: int = 1000,
+                 write_batch_size: int | None = None,
+                 on_batch=None, index: bool = True) -> ImportStats:
+    """
+    Upserts the records of export_posts(), batch_size per transaction.
+    write_batch_size caps the rows of each INSERT/UPDATE (None: as many as
+    the database accepts). index=False leaves the search index to
+    `manage.py rebuild_search_index`.
+    """
+    stats = ImportStats()
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            import_batch(batch, stats, write_batch_size, index)
+            batch = []
+            if on_batch:
+                on_batch(stats)
+    if batch:
+        import_batch(batch, stats, write_batch_size, index)
+        if on_batch:
+            on_batch(stats)
+    return stats
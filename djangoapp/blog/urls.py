@@ -1,7 +1,20 @@
+from django.conf import settings
 from django.urls import path
+
+if getattr(settings, 'BLOG_ASYNC_VIEWS', False):
+    from .async_views import (
+        PostListView, PostDetailView, PageDetailView, CreatedByListView,
+        CategoryListView, TagListView, SearchListView
+    )
+else:
+    from .views import (
+        PostListView, PostDetailView, PageDetailView, CreatedByListView,
+        CategoryListView, TagListView, SearchListView
+    )
+
 from .views import (
-    PostListView, PostDetailView, PageDetailView, CreatedByListView,
-    CategoryListView, TagListView, SearchListView
+    PostFeedView, CreatedByFeedView, CategoryFeedView, TagFeedView,
+    SitemapIndexView, PagesSitemapView, PostsSitemapView
 )
 
 app_name = 'blog'
@@ -15,4 +28,28 @@ urlpatterns = [
     path('category/<slug:slug>/', CategoryListView.as_view(), name='category'),
     path('tag/<slug:slug>/', TagListView.as_view(), name='tag'),
     path('search/', SearchListView.as_view(), name='search'),
+
+    # feeds: RSS, and Atom under atom/
+    path('feed/', PostFeedView.as_view(), name='feed'),
+    path('feed/atom/', PostFeedView.as_view(feed_type='atom'),
+         name='feed_atom'),
+    path('created_by/<int:author_id>/feed/',
+         CreatedByFeedView.as_view(), name='created_by_feed'),
+    path('created_by/<int:author_id>/feed/atom/',
+         CreatedByFeedView.as_view(feed_type='atom'),
+         name='created_by_feed_atom'),
+    path('category/<slug:slug>/feed/',
+         CategoryFeedView.as_view(), name='category_feed'),
+    path('category/<slug:slug>/feed/atom/',
+         CategoryFeedView.as_view(feed_type='atom'),
+         name='category_feed_atom'),
+    path('tag/<slug:slug>/feed/', TagFeedView.as_view(), name='tag_feed'),
+    path('tag/<slug:slug>/feed/atom/',
+         TagFeedView.as_view(feed_type='atom'), name='tag_feed_atom'),
+
+    path('sitemap.xml', SitemapIndexView.as_view(), name='sitemap'),
+    path('sitemap-pages.xml', PagesSitemapView.as_view(),
+         name='sitemap_pages'),
+    path('sitemap-posts-<int:chunk>.xml', PostsSitemapView.as_view(),
+         name='sitemap_posts'),
 ]
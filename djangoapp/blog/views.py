@@ -1,20 +1,60 @@
 from typing import Any
 from django.db.models.query import QuerySet
 from django.shortcuts import redirect
-from blog.models import Post, Page
-from django.db.models import Q
+from blog.models import Category, Post, Page, Tag
+from blog.cards import as_cards, related_cards
+from blog.feeds import build_feed, feed_items
+from blog.page_cache import CachedPageMixin
+from blog.pagination import CursorPaginator, InvalidCursor
+from blog.search import get_search_backend
+from blog.sitemaps import (chunk_urls, page_urls, render_index,
+                           render_urlset)
+from blog.slugs import SlugTarget, get_by_slug
+from urllib.parse import urlencode
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.http import Http404, HttpRequest, HttpResponse
-from django.views.generic import ListView, DetailView
+from django.urls import reverse
+from django.utils.functional import cached_property
+from django.views.generic import ListView, DetailView, View
 
 PER_PAGE = 9
 
 
-class PostListView(ListView):
+class PostListView(CachedPageMixin, ListView):
     template_name = 'blog/pages/index.html'
     context_object_name = 'posts'
     paginate_by = PER_PAGE
     queryset = Post.objects.get_published()  # type: ignore
+    # None follows settings.BLOG_CURSOR_PAGINATION
+    cursor_pagination: bool | None = None
+
+    def uses_cursor_pagination(self) -> bool:
+        if self.cursor_pagination is None:
+            return getattr(settings, 'BLOG_CURSOR_PAGINATION', False)
+        return self.cursor_pagination
+
+    def get(self, request, *args, **kwargs):
+        self.object_list = self.get_queryset()
+        # ListView runs an exists() query first for allow_empty = False:
+        # paginate_queryset() finds the empty listings instead
+        return self.render_to_response(self.get_context_data())
+
+    def paginate_queryset(self, queryset, page_size):
+        # the cards only need a few columns, never the post content
+        queryset = as_cards(queryset)
+
+        if not self.uses_cursor_pagination():
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = CursorPaginator(queryset, page_size)
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404('Página inválida')
+        if not self.get_allow_empty() and not page.object_list:
+            raise Http404('Nenhum post encontrado')
+        return paginator, page, page.object_list, page.has_other_pages()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(kwargs=kwargs)
@@ -22,6 +62,12 @@ class PostListView(ListView):
         context.update({'page_title': 'Início - '})
         return context
 
+    def get_cache_tags(self):
+        return ['index']
+
+    def get_validator_tags(self):
+        return self.get_cache_tags()
+
 
 class CreatedByListView(PostListView):
     def __init__(self, **kwargs: Any) -> None:
@@ -40,6 +86,12 @@ class CreatedByListView(PostListView):
         })
         return ctx
 
+    def get_cache_tags(self):
+        return [f'author:{self._temp_context["author_id"]}']
+
+    def get_validator_tags(self):
+        return [f'author:{self.kwargs.get("author_id")}']
+
     def get_queryset(self):
         qs = super().get_queryset()
         qs = qs.filter(created_by__id=self._temp_context['user'].id)
@@ -57,38 +109,60 @@ class CreatedByListView(PostListView):
         return super().get(request, *args, **kwargs)
 
 
-class CategoryListView(PostListView):
-    # instead of going to the "nothing found" area, redirect to a 404 page.
-    allow_empty = False
+class SlugListMixin:
+    """
+    The posts of the Category/Tag (slug_model) with the slug of the URL,
+    found once per request in the cache (blog.slugs) and filtered by id.
+    """
 
-    def get_queryset(self) -> QuerySet[Any]:
-        qs = super().get_queryset().filter(
-            category__slug=self.kwargs.get('slug'))
-        return qs
-
-    def get_context_data(self, **kwargs):
-        ctx = super().get_context_data(**kwargs)
-        category = self.object_list[0].category.name  # type: ignore
-
-        page_title = f'Categoria - {category} - '
-        ctx.update({'page_title': page_title})
-        return ctx
+    slug_model: type[Category] | type[Tag]
+    # Post field filtered by the id and cache tag of the listing
+    filter_field = ''
+    title_prefix = ''
 
+    @cached_property
+    def target(self) -> SlugTarget:
+        target = get_by_slug(self.slug_model, self.kwargs.get('slug'))
+        if target is None:
+            raise Http404()
+        return target
 
-class TagListView(PostListView):
     def get_queryset(self):
-        qs = super().get_queryset().filter(tag__slug=self.kwargs.get('slug'))
-        return qs
+        return super().get_queryset().filter(  # type: ignore
+            **{self.filter_field: self.target.id})
 
     def get_context_data(self, **kwargs):
-        ctx = super().get_context_data(**kwargs)
-        tag_obj = self.object_list[0].tag.first().name  # type: ignore
-        page_title = f'Tag - {tag_obj} - '
-        ctx.update({'page_title': page_title})
+        ctx = super().get_context_data(**kwargs)  # type: ignore
+        ctx.update({
+            'page_title': f'{self.title_prefix} - {self.target.name} - ',
+        })
         return ctx
 
+    def get_cache_tags(self):
+        return [f'{self.filter_field}:{self.target.id}']
+
+    def get_validator_tags(self):
+        return self.get_cache_tags()
+
+
+class CategoryListView(SlugListMixin, PostListView):
+    # instead of going to the "nothing found" area, redirect to a 404 page.
+    allow_empty = False
+    slug_model = Category
+    filter_field = 'category'
+    title_prefix = 'Categoria'
+
+
+class TagListView(SlugListMixin, PostListView):
+    slug_model = Tag
+    filter_field = 'tag'
+    title_prefix = 'Tag'
+
 
 class SearchListView(PostListView):
+    # the results are ordered by relevance, not by id
+    cursor_pagination = False
+
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
         self._search_value = ''
@@ -98,15 +172,8 @@ class SearchListView(PostListView):
         return super().setup(request, *args, **kwargs)
 
     def get_queryset(self) -> QuerySet[Any]:
-        search_value = self._search_value
-
-        qs = super().get_queryset().filter(
-            Q(title__icontains=search_value) |
-            Q(excerpt__icontains=search_value) |
-            Q(content__icontains=search_value)
-        )[0:PER_PAGE]
-
-        return qs
+        return get_search_backend().search(
+            super().get_queryset(), self._search_value)
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
@@ -114,16 +181,25 @@ class SearchListView(PostListView):
 
         ctx.update({'page_title': page_title})
         ctx.update({'search_value': self._search_value})
+        ctx.update({
+            'search_url': '&' + urlencode({'search': self._search_value}),
+        })
 
         return ctx
 
+    def get_cache_tags(self):
+        return ['search']
+
+    def get_validator_tags(self):
+        return self.get_cache_tags()
+
     def get(self, request, *args, **kwargs) -> HttpResponse:
         if self._search_value == '':
             return redirect('blog:index')
         return super().get(request, *args, **kwargs)
 
 
-class PageDetailView(DetailView):
+class PageDetailView(CachedPageMixin, DetailView):
     template_name = 'blog/pages/page.html'
     model = Page
     slug_field = 'slug'
@@ -131,16 +207,27 @@ class PageDetailView(DetailView):
 
     def get_context_data(self, **kwargs: Any) -> dict[str, Any]:
         ctx = super().get_context_data(**kwargs)
-        page = self.get_object()
+        page = self.object
         page_title = f'{page.title} - '  # type: ignore
         ctx.update({'page_title': page_title})
         return ctx
 
+    def get_cache_tags(self):
+        return [f'page:{self.object.pk}']
+
+    def get_validator_tags(self):
+        page_id = self.get_queryset().filter(
+            slug=self.kwargs.get(self.slug_url_kwarg)).values_list(
+            'pk', flat=True).first()
+        if page_id is None:
+            return None
+        return [f'page:{page_id}']
+
     def get_queryset(self) -> QuerySet[Any]:
         return super().get_queryset().filter(is_published=True)
 
 
-class PostDetailView(DetailView):
+class PostDetailView(CachedPageMixin, DetailView):
     template_name = 'blog/pages/post.html'
     model = Post
     slug_field = 'slug'
@@ -148,10 +235,160 @@ class PostDetailView(DetailView):
 
     def get_context_data(self, **kwargs: Any) -> dict[str, Any]:
         ctx = super().get_context_data(**kwargs)
-        post = self.get_object()
+        post = self.object
         page_title = f'Post - {post.title} - '  # type: ignore
-        ctx.update({'page_title': page_title})
+        ctx.update({
+            'page_title': page_title,
+            'related_posts': self.related_posts,
+        })
         return ctx
 
+    @cached_property
+    def related_posts(self) -> list:
+        return list(related_cards(self.object.pk))
+
+    def get_cache_tags(self):
+        # *-name tags: the page shows the category and tag names, but it
+        # must not be purged when other posts of the same listings change.
+        post = self.object
+        tags = [f'post:{post.pk}']
+        if post.category_id:
+            tags.append(f'category-name:{post.category_id}')
+        tags.extend(f'tag-name:{tag.pk}' for tag in post.tag.all())
+        return tags
+
+    def get_validator_tags(self):
+        # one row per tag of the post
+        rows = Post.objects.filter(
+            is_published=True, slug=self.kwargs.get(self.slug_url_kwarg),
+        ).values_list('pk', 'category_id', 'tag')
+        tags = set()
+        for post_id, category_id, tag_id in rows:
+            tags.add(f'post:{post_id}')
+            if category_id:
+                tags.add(f'category-name:{category_id}')
+            if tag_id:
+                tags.add(f'tag-name:{tag_id}')
+        return list(tags) or None
+
     def get_queryset(self) -> QuerySet[Any]:
-        return super().get_queryset().filter(is_published=True)
+        # author, category and tags are all shown by post.html
+        return super().get_queryset().filter(
+            is_published=True,
+        ).select_related(
+            'created_by', 'category',
+        ).prefetch_related('tag')
+
+
+class PostFeedView(CachedPageMixin, View):
+    """RSS (or Atom, with feed_type='atom') of the latest published posts."""
+
+    feed_type = 'rss'
+
+    def get_queryset(self) -> QuerySet[Any]:
+        return Post.objects.get_published()  # type: ignore
+
+    def get_feed_title(self) -> str:
+        return ''
+
+    def get_feed_link(self) -> str:
+        return reverse('blog:index')
+
+    def get(self, request, *args, **kwargs):
+        feed = build_feed(
+            request, self.feed_type, self.get_feed_title(),
+            self.get_feed_link(), feed_items(self.get_queryset()))
+        response = HttpResponse(content_type=feed.content_type)
+        feed.write(response, 'utf-8')
+        return response
+
+    def get_cache_tags(self):
+        return ['index']
+
+    def get_validator_tags(self):
+        return self.get_cache_tags()
+
+
+class CreatedByFeedView(PostFeedView):
+    @cached_property
+    def author(self) -> User:
+        user = User.objects.filter(id=self.kwargs.get('author_id')).only(
+            'username', 'first_name', 'last_name').first()
+        if user is None:
+            raise Http404()
+        return user
+
+    def get_queryset(self):
+        return super().get_queryset().filter(created_by_id=self.author.pk)
+
+    def get_feed_title(self):
+        name = self.author.username
+        if self.author.first_name:
+            name = f'{self.author.first_name} {self.author.last_name}'
+        return f'Posts de {name}'
+
+    def get_feed_link(self):
+        return reverse('blog:created_by', args=(self.author.pk,))
+
+    def get_cache_tags(self):
+        return [f'author:{self.kwargs.get("author_id")}']
+
+
+class SlugFeedMixin(SlugListMixin):
+    def get_feed_title(self):
+        return f'{self.title_prefix} - {self.target.name}'
+
+    def get_feed_link(self):
+        return reverse(f'blog:{self.filter_field}',
+                       args=(self.kwargs.get('slug'),))
+
+
+class CategoryFeedView(SlugFeedMixin, PostFeedView):
+    slug_model = Category
+    filter_field = 'category'
+    title_prefix = 'Categoria'
+
+
+class TagFeedView(SlugFeedMixin, PostFeedView):
+    slug_model = Tag
+    filter_field = 'tag'
+    title_prefix = 'Tag'
+
+
+class SitemapView(CachedPageMixin, View):
+    def get_xml(self) -> str:
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(
+            self.get_xml(), content_type='application/xml; charset=utf-8')
+
+    def get_validator_tags(self):
+        return self.get_cache_tags()
+
+
+class SitemapIndexView(SitemapView):
+    def get_xml(self):
+        return render_index(self.request)
+
+    def get_cache_tags(self):
+        return ['sitemap']
+
+
+class PagesSitemapView(SitemapView):
+    def get_xml(self):
+        return render_urlset(self.request, page_urls())
+
+    def get_cache_tags(self):
+        return ['pages']
+
+
+class PostsSitemapView(SitemapView):
+    def get_xml(self):
+        urls = chunk_urls(self.kwargs['chunk'])
+        if not urls:
+            raise Http404()
+        return render_urlset(self.request, urls)
+
+    def get_cache_tags(self):
+        return [f'sitemap:{self.kwargs["chunk"]}']
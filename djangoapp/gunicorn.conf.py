@@ -0,0 +1,84 @@
+# Gunicorn settings for the production image (scripts/server.sh).
+# https://docs.gunicorn.org/en/stable/settings.html
+#
+# SERVER_MODE=wsgi runs project.wsgi on threaded workers, SERVER_MODE=asgi
+# runs project.asgi on uvicorn workers.
+#
+# Graceful reload: `kill -HUP <master pid>` restarts the workers after they
+# finish their requests. The app is preloaded in the master, so new code needs
+# a new master: `kill -USR2 <master pid>`, then `kill -QUIT <old master pid>`.
+import multiprocessing
+import os
+
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+
+# (2 x CPUs) + 1: while a worker waits on the database another one runs
+workers = int(os.getenv(
+    'GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+
+if SERVER_MODE == 'asgi':
+    wsgi_app = 'project.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'project.wsgi:application'
+    worker_class = 'gthread'
+    threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+# Django and the apps are imported once in the master and the workers share
+# those pages copy-on-write
+preload_app = True
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# recycles the workers now and then, so a leak can't grow forever; the jitter
+# keeps them from restarting all at once
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+
+# the heartbeat files live in memory instead of on the container's overlay fs
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+accesslog = os.getenv('GUNICORN_ACCESSLOG', '-') or None
+errorlog = '-'
+
+
+def on_starting(server):
+    # every invalidation (SiteSetup version, page cache tags, slugs,
+    # renditions...) is a cache write: with a per-process cache it would only
+    # reach the worker that made it
+    from django.conf import settings
+
+    backend = settings.CACHES['default']['BACKEND']
+    if server.cfg.workers > 1 and backend.endswith('.LocMemCache'):
+        raise RuntimeError(
+            f'{server.cfg.workers} workers with {backend}: set CACHE_BACKEND '
+            'to a shared cache (see dotenv_files/.env-example) or '
+            'GUNICORN_WORKERS=1')
+
+
+def when_ready(server):
+    # counters of a previous run would be added to the new workers' ones
+    from django.conf import settings
+
+    directory = settings.PERF_METRICS_DIR
+    if directory and os.path.isdir(directory):
+        for entry in os.scandir(directory):
+            os.remove(entry.path)
+
+
+def post_fork(server, worker):
+    # nothing may be shared with the master: each worker opens its own
+    # database and cache connections
+    from django.core.cache import caches
+    from django.db import connections
+
+    for connection in connections.all(initialized_only=True):
+        # a DB_POOL pool opened in the master must not be shared either
+        if hasattr(connection, 'close_pool'):
+            connection.close_pool()
+    connections.close_all()
+    caches.close_all()
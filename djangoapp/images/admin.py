@@ -0,0 +1,24 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from images.models import ImageJob
+
+
+@admin.register(ImageJob)
+class ImageJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'file_name', 'width', 'status', 'attempts',
+                    'updated_at',)
+    list_display_links = 'file_name',
+    list_filter = 'status',
+    search_fields = 'file_name', 'key',
+    list_per_page = 50
+    ordering = '-id',
+    readonly_fields = ('key', 'file_name', 'width', 'quality', 'attempts',
+                       'last_error', 'created_at', 'updated_at',)
+    actions = 'retry',
+
+    @admin.action(description='Processar novamente')
+    def retry(self, request, queryset):
+        queryset.update(
+            status=ImageJob.Status.PENDING, attempts=0,
+            run_after=timezone.now())
@@ -0,0 +1,16 @@
+from django.db.models.fields.files import ImageField, ImageFieldFile
+
+from images.renditions import get_renditions
+
+
+class RenditionImageFieldFile(ImageFieldFile):
+    @property
+    def renditions(self):
+        """Recorded renditions of this file (see images.renditions)."""
+        return get_renditions(self.name)
+
+
+class RenditionImageField(ImageField):
+    """ImageField whose files expose .renditions for srcset."""
+
+    attr_class = RenditionImageFieldFile
@@ -0,0 +1,152 @@
+from datetime import timedelta
+from hashlib import sha1
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import F, Q
+from django.utils import timezone
+
+from images.models import ImageJob
+from images.renditions import generate_renditions
+from images.signals import renditions_generated
+from utils.images import resize_image
+
+
+def file_version(file_name: str) -> str:
+    """
+    Size and modification time of file_name: a new upload that reuses the
+    name of a processed file gets jobs of its own.
+    """
+    try:
+        version = str(default_storage.size(file_name))
+    except OSError:
+        # not uploaded (yet): the job fails and is retried
+        return ''
+    try:
+        version += f':{default_storage.get_modified_time(file_name)}'
+    except (NotImplementedError, OSError):
+        pass
+    return version
+
+
+def job_key(kind: str, file_name: str, width: int, quality: int) -> str:
+    return sha1(
+        f'{kind}:{file_name}:{file_version(file_name)}:{width}:{quality}'
+        .encode()).hexdigest()
+
+
+def enqueue(kind: str, file_name: str, width: int = 0,
+            quality: int = 60) -> ImageJob:
+    """
+    Schedules work on an uploaded file instead of running it inside the
+    request. Processed by `manage.py run_image_jobs`.
+    """
+    job, _ = ImageJob.objects.get_or_create(
+        key=job_key(kind, file_name, width, quality),
+        defaults={
+            'kind': kind,
+            'file_name': file_name,
+            'width': width,
+            'quality': quality,
+        },
+    )
+
+    if not getattr(settings, 'IMAGE_JOBS_ASYNC', True):
+        if claim(job.pk):
+            job.refresh_from_db()
+            run_job(job)
+
+    return job
+
+
+def enqueue_many(kind: str, file_names, width: int = 0,
+                 quality: int = 60) -> None:
+    """
+    enqueue() for a batch of files in one query (and a stat of each file
+    for its key), always left to `manage.py run_image_jobs` (bulk imports).
+    """
+    ImageJob.objects.bulk_create([
+        ImageJob(
+            key=job_key(kind, file_name, width, quality), kind=kind,
+            file_name=file_name, width=width, quality=quality)
+        for file_name in file_names
+    ], ignore_conflicts=True)
+
+
+def enqueue_resize(image_django, width: int, quality: int = 60) -> ImageJob:
+    return enqueue(ImageJob.Kind.RESIZE, image_django.name, width, quality)
+
+
+def enqueue_renditions(image_django, quality: int = 70) -> ImageJob:
+    return enqueue(
+        ImageJob.Kind.RENDITIONS, image_django.name, quality=quality)
+
+
+def _claimable() -> Q:
+    now = timezone.now()
+    lock_timeout = getattr(settings, 'IMAGE_JOBS_LOCK_TIMEOUT', 600)
+    # RUNNING jobs that stopped updating belong to a worker that died
+    return (
+        Q(status=ImageJob.Status.PENDING, run_after__lte=now) |
+        Q(status=ImageJob.Status.RUNNING,
+          updated_at__lt=now - timedelta(seconds=lock_timeout))
+    )
+
+
+def claim(pk: int) -> bool:
+    # a conditional UPDATE is atomic on every database, so two workers can
+    # never claim the same job (no SELECT ... FOR UPDATE SKIP LOCKED needed)
+    return bool(ImageJob.objects.filter(_claimable(), pk=pk).update(
+        status=ImageJob.Status.RUNNING,
+        attempts=F('attempts') + 1,
+        updated_at=timezone.now(),
+    ))
+
+
+def claim_next() -> ImageJob | None:
+    candidates = ImageJob.objects.filter(_claimable()).order_by(
+        'run_after', 'id').values_list('pk', flat=True)[:20]
+
+    for pk in candidates:
+        if claim(pk):
+            return ImageJob.objects.get(pk=pk)
+    return None
+
+
+def process(job: ImageJob) -> None:
+    if job.kind == ImageJob.Kind.RENDITIONS:
+        generate_renditions(job.file_name, quality=job.quality)
+        renditions_generated.send(ImageJob, file_name=job.file_name)
+        return
+
+    resize_image(job.file_name, job.width, quality=job.quality)
+
+
+def run_job(job: ImageJob) -> None:
+    max_attempts = getattr(settings, 'IMAGE_JOBS_MAX_ATTEMPTS', 3)
+
+    try:
+        process(job)
+    except Exception as error:
+        job.last_error = repr(error)
+        if job.attempts >= max_attempts:
+            job.status = ImageJob.Status.FAILED
+        else:
+            job.status = ImageJob.Status.PENDING
+            job.run_after = timezone.now() + timedelta(
+                seconds=30 * 2 ** job.attempts)
+    else:
+        job.status = ImageJob.Status.DONE
+        job.last_error = ''
+
+    job.save(update_fields=[
+        'status', 'last_error', 'run_after', 'updated_at'])
+
+
+def get_status(file_name: str) -> str:
+    """Status of the latest job for file_name, for the admin."""
+    job = ImageJob.objects.filter(file_name=file_name).order_by(
+        '-id').first()
+    if job is None:
+        return '-'
+    return job.get_status_display()
@@ -0,0 +1,123 @@
+import json
+import multiprocessing
+import resource
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from utils.images import resize_image
+
+SIZES = ((1200, 800), (3000, 2000), (4000, 3000), (6000, 4000), (8000, 6000))
+FORMATS = ('JPEG', 'PNG')
+
+
+def legacy_resize_image(image_path, new_width=800, optimize=True, quality=60):
+    # utils.images.resize_image before the streaming rewrite, for comparison
+    image_pillow = Image.open(image_path)
+    original_width, original_height = image_pillow.size
+    if original_width <= new_width:
+        image_pillow.close()
+        return image_pillow
+    new_height = round(new_width * original_height / original_width)
+    new_image = image_pillow.resize(
+        (new_width, new_height), Image.Resampling.LANCZOS)
+    new_image.save(image_path, optimize=optimize, quality=quality)
+    return new_image
+
+
+def make_corpus(directory: Path) -> list[Path]:
+    paths = []
+    for width, height in SIZES:
+        # a gradient with noise: compresses like a photo, not like a flat
+        # color
+        image = Image.merge('RGB', (
+            Image.linear_gradient('L').resize((width, height)),
+            Image.effect_noise((width, height), 40),
+            Image.linear_gradient('L').rotate(90).resize((width, height)),
+        ))
+        for fmt in FORMATS:
+            path = directory / f'{width}x{height}.{fmt.lower()}'
+            image.save(path, fmt, quality=90)
+            paths.append(path)
+    return paths
+
+
+def measure(implementation: str, source: str, work_dir: str, width: int,
+            queue) -> None:
+    # runs in a fresh child process, so ru_maxrss only sees this resize
+    path = Path(work_dir) / Path(source).name
+    shutil.copy(source, path)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+
+    if implementation == 'legacy':
+        legacy_resize_image(path, width, quality=70)
+    else:
+        resize_image(path.name, width, quality=70,
+                     storage=FileSystemStorage(location=work_dir))
+
+    elapsed = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put({
+        'implementation': implementation,
+        'image': path.name,
+        'seconds': round(elapsed, 4),
+        'peak_rss_kb': after - before,
+    })
+
+
+class Command(BaseCommand):
+    help = ('Compares peak memory and time of resize_image against the '
+            'previous implementation on a corpus of image sizes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--width', type=int, default=900)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument(
+            '--json', action='store_true', help='Prints the raw results.')
+
+    def handle(self, *args, **options):
+        ctx = multiprocessing.get_context('fork')
+        results = []
+
+        with tempfile.TemporaryDirectory() as corpus_dir, \
+                tempfile.TemporaryDirectory() as work_dir:
+            # built in a child too: a forked process starts with the
+            # parent's peak RSS, which must stay small
+            with ctx.Pool(1) as pool:
+                corpus = pool.apply(make_corpus, (Path(corpus_dir),))
+
+            for source in corpus:
+                for implementation in ('legacy', 'streaming'):
+                    runs = []
+                    for _ in range(options['repeat']):
+                        queue = ctx.Queue()
+                        process = ctx.Process(target=measure, args=(
+                            implementation, str(source), work_dir,
+                            options['width'], queue))
+                        process.start()
+                        runs.append(queue.get())
+                        process.join()
+                    results.append({
+                        **runs[0],
+                        'seconds': min(run['seconds'] for run in runs),
+                        'peak_rss_kb': max(
+                            run['peak_rss_kb'] for run in runs),
+                    })
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(
+            f'{"image":<16} {"implementation":<10} '
+            f'{"seconds":>8} {"peak MB":>8}')
+        for row in results:
+            self.stdout.write(
+                f'{row["image"]:<16} {row["implementation"]:<10} '
+                f'{row["seconds"]:>8.3f} {row["peak_rss_kb"] / 1024:>8.1f}')
@@ -0,0 +1,50 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from images.jobs import claim_next, run_job
+
+
+def work(once: bool, sleep: float) -> int:
+    done = 0
+    while True:
+        job = claim_next()
+        if job is None:
+            if once:
+                return done
+            time.sleep(sleep)
+            continue
+        run_job(job)
+        done += 1
+
+
+class Command(BaseCommand):
+    help = 'Processes the image jobs (resizes) queued by the models.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=1,
+            help='Number of worker processes.')
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit when the queue is empty instead of polling.')
+        parser.add_argument(
+            '--sleep', type=float, default=2,
+            help='Seconds between polls when the queue is empty.')
+
+    def handle(self, *args, **options):
+        processes = max(1, options['processes'])
+        once, sleep = options['once'], options['sleep']
+
+        if processes == 1:
+            done = work(once, sleep)
+        else:
+            # children must not share the parent's database connection
+            connections.close_all()
+            ctx = multiprocessing.get_context('fork')
+            with ctx.Pool(processes) as pool:
+                done = sum(pool.starmap(work, [(once, sleep)] * processes))
+
+        self.stdout.write(self.style.SUCCESS(f'{done} image jobs processed.'))
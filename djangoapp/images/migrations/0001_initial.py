@@ -0,0 +1,36 @@
+# Generated by Django 5.1.15 on 2026-10-18 17:26
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('file_name', models.CharField(db_index=True, max_length=255)),
+                ('width', models.PositiveIntegerField()),
+                ('quality', models.PositiveSmallIntegerField(default=60)),
+                ('status', models.CharField(choices=[('pending', 'Pendente'), ('running', 'Processando'), ('done', 'Concluído'), ('failed', 'Falhou')], default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Image Job',
+                'verbose_name_plural': 'Image Jobs',
+                'indexes': [models.Index(fields=['status', 'run_after'], name='image_job_queue_idx')],
+            },
+        ),
+    ]
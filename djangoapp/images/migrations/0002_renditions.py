@@ -0,0 +1,41 @@
+# Generated by Django 5.1.15 on 2026-10-18 17:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagejob',
+            name='kind',
+            field=models.CharField(choices=[('resize', 'Redimensionar'), ('renditions', 'Gerar variações')], default='resize', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='imagejob',
+            name='width',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='ImageRendition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_name', models.CharField(max_length=255)),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('format', models.CharField(max_length=10)),
+                ('file_name', models.CharField(max_length=255)),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Image Rendition',
+                'verbose_name_plural': 'Image Renditions',
+                'constraints': [models.UniqueConstraint(fields=('source_name', 'width', 'format'), name='unique_image_rendition')],
+            },
+        ),
+    ]
@@ -0,0 +1,65 @@
+from django.db import models
+from django.utils import timezone
+
+
+class ImageJob(models.Model):
+    class Meta:
+        verbose_name = 'Image Job'
+        verbose_name_plural = 'Image Jobs'
+        indexes = [
+            models.Index(fields=['status', 'run_after'],
+                         name='image_job_queue_idx'),
+        ]
+
+    class Kind(models.TextChoices):
+        RESIZE = 'resize', 'Redimensionar'
+        RENDITIONS = 'renditions', 'Gerar variações'
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pendente'
+        RUNNING = 'running', 'Processando'
+        DONE = 'done', 'Concluído'
+        FAILED = 'failed', 'Falhou'
+
+    # one job per (kind, file and its size/mtime, width, quality): enqueueing
+    # the same upload twice is a no-op
+    key = models.CharField(max_length=64, unique=True)
+    kind = models.CharField(
+        max_length=10, choices=Kind.choices, default=Kind.RESIZE)
+    file_name = models.CharField(max_length=255, db_index=True)
+    width = models.PositiveIntegerField(default=0)
+    quality = models.PositiveSmallIntegerField(default=60)
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    run_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f'{self.file_name} ({self.width}px)'
+
+
+class ImageRendition(models.Model):
+    """A resized/re-encoded copy of an uploaded image, used in srcset."""
+
+    class Meta:
+        verbose_name = 'Image Rendition'
+        verbose_name_plural = 'Image Renditions'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['source_name', 'width', 'format'],
+                name='unique_image_rendition'),
+        ]
+
+    source_name = models.CharField(max_length=255)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    format = models.CharField(max_length=10)
+    file_name = models.CharField(max_length=255)
+    size = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return self.file_name
@@ -0,0 +1,149 @@
+from hashlib import sha1
+from pathlib import PurePosixPath
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from images.models import ImageRendition
+from utils.images import REDUCING_GAP, draft_within_cap, save_atomic
+
+CACHE_KEY = 'renditions:{digest}'
+# seconds an image without renditions stays cached as such
+MISSING_RENDITIONS_TIMEOUT = 60
+
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'AVIF': 'avif'}
+MIME_TYPES = {
+    'JPEG': 'image/jpeg', 'PNG': 'image/png',
+    'WEBP': 'image/webp', 'AVIF': 'image/avif',
+}
+
+
+class Rendition(NamedTuple):
+    width: int
+    height: int
+    format: str
+    file_name: str
+
+    @property
+    def url(self) -> str:
+        return default_storage.url(self.file_name)
+
+    @property
+    def mime_type(self) -> str:
+        return MIME_TYPES[self.format]
+
+
+def rendition_widths() -> tuple[int, ...]:
+    return tuple(getattr(settings, 'IMAGE_RENDITION_WIDTHS', (320, 640, 900)))
+
+
+def modern_formats() -> list[str]:
+    """AVIF and WebP, when this Pillow build can write them."""
+    Image.init()
+    return [fmt for fmt in ('AVIF', 'WEBP') if fmt in Image.SAVE]
+
+
+def rendition_name(source_name: str, width: int, fmt: str) -> str:
+    source = PurePosixPath(source_name)
+    return str(PurePosixPath('renditions') / source.parent /
+               f'{source.stem}-{width}w.{EXTENSIONS[fmt]}')
+
+
+def _cache_key(source_name: str) -> str:
+    return CACHE_KEY.format(digest=sha1(source_name.encode()).hexdigest())
+
+
+def _convert(image: Image.Image, fmt: str) -> Image.Image:
+    if fmt == 'JPEG' and image.mode != 'RGB':
+        return image.convert('RGB')
+    if image.mode not in ('RGB', 'RGBA', 'L'):
+        return image.convert('RGBA')
+    return image
+
+
+def generate_renditions(source_name: str,
+                        quality: int = 70) -> list[Rendition]:
+    """
+    Writes every width in IMAGE_RENDITION_WIDTHS (never upscaling) in the
+    source format plus the modern formats, and records them. Sources above
+    IMAGE_MAX_PIXELS (once JPEGs are drafted) raise ValueError.
+    """
+    with default_storage.open(source_name) as source_file:
+        image = Image.open(source_file)
+        source_format = 'PNG' if image.format == 'PNG' else 'JPEG'
+        original_width, original_height = image.size
+
+        widths = sorted({
+            min(width, original_width) for width in rendition_widths()
+        }, reverse=True)
+        # a JPEG is decoded at the biggest rendition's scale; the others
+        # must fit under the pixel cap
+        draft_within_cap(image, source_name, (
+            widths[0], round(widths[0] * original_height / original_width)))
+        image.load()
+
+    renditions = []
+    for width in widths:
+        height = round(width * original_height / original_width)
+        resized = image if image.width == width else image.resize(
+            (width, height), Image.Resampling.LANCZOS,
+            reducing_gap=REDUCING_GAP)
+
+        for fmt in (source_format, *modern_formats()):
+            file_name = rendition_name(source_name, width, fmt)
+            size = save_atomic(
+                default_storage, file_name, _convert(resized, fmt), fmt,
+                quality=quality, optimize=True)
+
+            ImageRendition.objects.update_or_create(
+                source_name=source_name, width=width, format=fmt,
+                defaults={
+                    'height': height,
+                    'file_name': file_name,
+                    'size': size,
+                },
+            )
+            renditions.append(Rendition(width, height, fmt, file_name))
+
+    cache.delete(_cache_key(source_name))
+    return renditions
+
+
+def get_renditions(source_name: str) -> list[Rendition]:
+    """Recorded renditions of source_name, smallest first."""
+    if not source_name:
+        return []
+
+    key = _cache_key(source_name)
+    renditions = cache.get(key)
+    if renditions is None:
+        renditions = [
+            Rendition(*row) for row in ImageRendition.objects.filter(
+                source_name=source_name,
+            ).order_by('width').values_list(
+                'width', 'height', 'format', 'file_name')
+        ]
+        # an image without renditions yet gets them from the image worker,
+        # which may not share this cache: only remember that briefly
+        cache.set(key, renditions,
+                  None if renditions else MISSING_RENDITIONS_TIMEOUT)
+    return renditions
+
+
+def split_formats(
+        renditions: list[Rendition]) -> tuple[list[Rendition], list[list]]:
+    """
+    The renditions in the source format (for the <img> srcset) and the groups
+    in the modern formats (for the <source>s), AVIF before WebP: the browser
+    picks the first source it supports.
+    """
+    by_format: dict[str, list[Rendition]] = {}
+    for rendition in renditions:
+        by_format.setdefault(rendition.format, []).append(rendition)
+
+    fallback_format = 'PNG' if 'PNG' in by_format else 'JPEG'
+    fallback = by_format.pop(fallback_format, renditions)
+    return fallback, [group for _, group in sorted(by_format.items())]
@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# sent by images.jobs once the renditions of file_name are written, so
+# whatever embeds the image can start using them
+renditions_generated = Signal()
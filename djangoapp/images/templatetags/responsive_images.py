@@ -0,0 +1,49 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from images.renditions import get_renditions, split_formats
+
+register = template.Library()
+
+DEFAULT_SIZES = '100vw'
+
+
+def _srcset(renditions):
+    return ', '.join(f'{r.url} {r.width}w' for r in renditions)
+
+
+@register.simple_tag
+def responsive_image(image, alt='', css_class='', sizes=DEFAULT_SIZES,
+                     loading='lazy'):
+    """
+    <picture> with an AVIF/WebP source and a srcset for every rendition of
+    image (an ImageField file or a storage name). Falls back to a plain <img>
+    while the renditions are not generated yet.
+
+        {% responsive_image post.cover alt=post.title sizes="33vw" %}
+    """
+    name = getattr(image, 'name', image) or ''
+    if not name:
+        return ''
+
+    renditions = get_renditions(name)
+    if not renditions:
+        return format_html(
+            '<img class="{}" loading="{}" src="{}" alt="{}">',
+            css_class, loading, default_storage.url(name), alt)
+
+    fallback, groups = split_formats(renditions)
+    largest = fallback[-1]
+
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((group[0].mime_type, _srcset(group), sizes) for group in groups),
+    )
+
+    return format_html(
+        '<picture>{}<img class="{}" loading="{}" src="{}" srcset="{}" '
+        'sizes="{}" width="{}" height="{}" alt="{}"></picture>',
+        sources, css_class, loading, largest.url, _srcset(fallback), sizes,
+        largest.width, largest.height, alt,
+    )
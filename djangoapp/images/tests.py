@@ -0,0 +1,220 @@
+import shutil
+import tempfile
+from pathlib import Path
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import Storage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image, ImageFile
+
+from blog.models import Post
+from images.jobs import claim_next, enqueue_resize, run_job
+from images.models import ImageJob, ImageRendition
+from images.renditions import (
+    MISSING_RENDITIONS_TIMEOUT, generate_renditions, get_renditions)
+from utils.images import resize_image
+
+
+def make_image(width=1200, height=800, format='JPEG'):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), (200, 30, 30)).save(buffer, format)
+    return SimpleUploadedFile('cover.jpg', buffer.getvalue())
+
+
+class RemoteStorage(Storage):
+    """A storage without local paths, like S3."""
+
+    def __init__(self):
+        self.files = {}
+
+    def _open(self, name, mode='rb'):
+        return ContentFile(self.files[name], name=name)
+
+    def _save(self, name, content):
+        self.files[name] = content.read()
+        return name
+
+    def delete(self, name):
+        self.files.pop(name, None)
+
+    def exists(self, name):
+        return name in self.files
+
+
+class MediaTestCase(TestCase):
+    def setUp(self):
+        media_root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+
+class ImageJobTests(MediaTestCase):
+    def test_saving_a_cover_queues_one_job_and_the_worker_resizes_it(self):
+        post = Post.objects.create(
+            title='Post', excerpt='Resumo', content='Texto',
+            cover=make_image())
+        job = ImageJob.objects.get(kind=ImageJob.Kind.RESIZE)
+        self.assertEqual(job.status, ImageJob.Status.PENDING)
+
+        # same file, same size: idempotent
+        self.assertEqual(enqueue_resize(post.cover, 900, quality=70), job)
+
+        call_command('run_image_jobs', '--once', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImageJob.Status.DONE)
+        with default_storage.open(post.cover.name) as f:
+            self.assertEqual(Image.open(f).size, (900, 600))
+
+    def test_a_new_file_under_a_processed_name_is_queued_again(self):
+        with self.settings(IMAGE_JOBS_ASYNC=False):
+            post = Post.objects.create(
+                title='Post', excerpt='Resumo', content='Texto',
+                cover=make_image())
+        done = ImageJob.objects.get(kind=ImageJob.Kind.RESIZE)
+        self.assertEqual(done.status, ImageJob.Status.DONE)
+
+        # the file is deleted and another upload gets its name
+        default_storage.delete(post.cover.name)
+        default_storage.save(post.cover.name, make_image(1600, 800))
+        job = enqueue_resize(post.cover, 900, quality=70)
+        self.assertNotEqual(job, done)
+        self.assertEqual(job.status, ImageJob.Status.PENDING)
+
+    def test_failed_jobs_are_retried_then_marked_failed(self):
+        job = ImageJob.objects.create(
+            key='missing', file_name='does/not/exist.jpg', width=900)
+
+        for attempt in range(3):
+            # skip the retry backoff
+            ImageJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+            claimed = claim_next()
+            self.assertEqual(claimed, job)
+            run_job(claimed)
+
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 3)
+        self.assertEqual(job.status, ImageJob.Status.FAILED)
+        self.assertIn('FileNotFoundError', job.last_error)
+        self.assertIsNone(claim_next())
+
+
+class RenditionTests(MediaTestCase):
+    def test_worker_generates_renditions_used_in_srcset(self):
+        post = Post.objects.create(
+            title='Post', excerpt='Resumo', content='Texto',
+            cover=make_image(1200, 600))
+        call_command('run_image_jobs', '--once', stdout=StringIO())
+
+        renditions = post.cover.renditions
+        self.assertEqual(
+            {(r.width, r.format) for r in renditions},
+            {(w, f) for w in (320, 640, 900) for f in ('JPEG', 'WEBP')})
+        self.assertEqual(ImageRendition.objects.count(), 6)
+        for rendition in renditions:
+            self.assertTrue(default_storage.exists(rendition.file_name))
+
+        html = Template(
+            '{% load responsive_images %}'
+            '{% responsive_image post.cover alt="Capa" sizes="50vw" %}'
+        ).render(Context({'post': post}))
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn('-320w.webp 320w', html)
+        self.assertIn('width="900" height="450"', html)
+
+    def test_missing_renditions_are_only_cached_briefly(self):
+        with self.settings(IMAGE_JOBS_ASYNC=False):
+            post = Post.objects.create(
+                title='Post', excerpt='Resumo', content='Texto')
+        post.cover.save('cover.jpg', make_image(400, 400), save=False)
+        name = post.cover.name
+
+        with mock.patch('images.renditions.cache.set') as cache_set:
+            self.assertEqual(get_renditions(name), [])
+        self.assertEqual(
+            cache_set.call_args.args[2], MISSING_RENDITIONS_TIMEOUT)
+
+        # a worker with another cache generates them: this process sees
+        # them once the short entry expires
+        with mock.patch('images.renditions.cache.delete'):
+            generate_renditions(name)
+        with mock.patch('images.renditions.cache.get', return_value=None):
+            self.assertEqual(len(get_renditions(name)), 4)
+
+    def test_backfill_skips_images_that_have_renditions(self):
+        with self.settings(IMAGE_JOBS_ASYNC=False):
+            Post.objects.create(
+                title='Post', excerpt='Resumo', content='Texto',
+                cover=make_image(400, 400))
+        self.assertEqual(ImageRendition.objects.count(), 4)
+
+        out = StringIO()
+        call_command('generate_renditions', stdout=out)
+        self.assertIn('0 images processed', out.getvalue())
+        call_command('generate_renditions', '--force', stdout=out)
+        self.assertIn('1 images processed', out.getvalue())
+
+    def test_renditions_are_replaced_in_place_under_the_pixel_cap(self):
+        name = default_storage.save(
+            'posts/big.png', make_image(2000, 1000, 'PNG'))
+        first = generate_renditions(name)
+        with mock.patch.object(default_storage, 'delete') as delete:
+            again = generate_renditions(name)
+        delete.assert_not_called()
+        self.assertEqual(again, first)
+        self.assertEqual(
+            sorted(default_storage.listdir('renditions/posts')[1]),
+            sorted(Path(r.file_name).name for r in first))
+        for rendition in ImageRendition.objects.all():
+            self.assertEqual(rendition.size,
+                             default_storage.size(rendition.file_name))
+
+        with self.settings(IMAGE_MAX_PIXELS=1_000_000), \
+                mock.patch.object(ImageFile.ImageFile, 'load') as load:
+            with self.assertRaises(ValueError):
+                generate_renditions(name)
+        load.assert_not_called()
+
+
+class ResizeImageTests(MediaTestCase):
+    def test_resizes_through_the_storage_in_place(self):
+        name = default_storage.save('posts/big.jpg', make_image(4000, 2000))
+        resize_image(name, 900, quality=70)
+
+        with default_storage.open(name) as f:
+            self.assertEqual(Image.open(f).size, (900, 450))
+        # the temporary file was renamed over the original
+        self.assertEqual(default_storage.listdir('posts')[1], ['big.jpg'])
+
+    def test_remote_storages_keep_the_name(self):
+        storage = RemoteStorage()
+        name = storage.save('posts/big.jpg', make_image(4000, 2000))
+        resize_image(name, 900, quality=70, storage=storage)
+        self.assertEqual(list(storage.files), ['posts/big.jpg'])
+        with storage.open(name) as f:
+            self.assertEqual(Image.open(f).size, (900, 450))
+
+        # a storage that overwrites replaces the object without a delete
+        with mock.patch.object(storage, 'get_available_name',
+                               side_effect=lambda name, **kwargs: name), \
+                mock.patch.object(storage, 'delete') as delete:
+            resize_image(name, 600, storage=storage)
+        delete.assert_not_called()
+
+        with mock.patch.object(storage, 'save', return_value='posts/x.jpg'):
+            with self.assertRaises(OSError):
+                resize_image(name, 300, storage=storage)
+
+    def test_refuses_images_above_the_pixel_cap(self):
+        name = default_storage.save(
+            'posts/big.png', make_image(2000, 2000, 'PNG'))
+        with self.settings(IMAGE_MAX_PIXELS=1_000_000):
+            with self.assertRaises(ValueError):
+                resize_image(name, 900)
@@ -0,0 +1,19 @@
+from django.contrib.staticfiles.apps import StaticFilesConfig as BaseConfig
+
+
+class StaticFilesConfig(BaseConfig):
+    ignore_patterns = [
+        *BaseConfig.ignore_patterns,
+        # fontawesomefree ships every format (svgs, js, sprites, ...) but the
+        # templates only use its css and webfonts
+        'fontawesomefree/*.md',
+        'fontawesomefree/assetTemplates/*',
+        'fontawesomefree/js/*',
+        'fontawesomefree/js-packages/*',
+        'fontawesomefree/less/*',
+        'fontawesomefree/metadata/*',
+        'fontawesomefree/otfs/*',
+        'fontawesomefree/scss/*',
+        'fontawesomefree/sprites/*',
+        'fontawesomefree/svgs/*',
+    ]
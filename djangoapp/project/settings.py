@@ -11,6 +11,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 from dotenv import load_dotenv
+from copy import deepcopy
+from itertools import zip_longest
 from pathlib import Path
 import os
 
@@ -51,29 +53,41 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
-    'django.contrib.staticfiles',
+    # django.contrib.staticfiles, collecting less of fontawesomefree
+    'project.apps.StaticFilesConfig',
 
     # My Apps
     'blog',
     'site_setup',
+    'images',
 
     # Summernote
     'django_summernote',
 
     'axes',
+
+    # Font Awesome served from STATIC_URL instead of a CDN
+    'fontawesomefree',
 ]
 
 MIDDLEWARE = [
+    # first, so its timings include every other middleware
+    'utils.instrumentation.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # serves STATIC_ROOT when the requests don't go through nginx
+    'utils.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    # inside SessionMiddleware: saving a session doesn't pin to the primary
+    'utils.replicas.ReplicaMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 
-    # Axes should be the last middleware in the MIDDLEWARE list
-    'axes.middleware.AxesMiddleware',
+    # Axes should be the last middleware in the MIDDLEWARE list. This is
+    # axes' middleware made async capable, see utils/middleware.py
+    'utils.middleware.AxesMiddleware',
 ]
 
 ROOT_URLCONF = 'project.urls'
@@ -82,8 +96,16 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # what django picks by default, spelled out so the templates are
+            # compiled once per process whatever DEBUG is (the cached loader
+            # still reloads edited templates under runserver)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -110,6 +132,71 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'change-me'),
         'HOST': os.getenv('POSTGRES_HOST', 'change-me'),
         'PORT': os.getenv('POSTGRES_PORT', 'change-me'),
+        # Seconds a connection is reused across requests (0 closes it after
+        # each request). Under ASGI each request has its own connection, so
+        # use the pool there instead.
+        'CONN_MAX_AGE': int(os.getenv(
+            'DB_CONN_MAX_AGE',
+            0 if os.getenv('SERVER_MODE') == 'asgi' else 60)),
+        # Checks a reused connection before the request that gets it
+        'CONN_HEALTH_CHECKS': bool(int(os.getenv('DB_CONN_HEALTH_CHECKS', 1))),
+        'OPTIONS': {},
+    }
+}
+
+# psycopg 3 connection pool (one per worker process: the database sees up to
+# workers x DB_POOL_MAX_SIZE connections). Replaces CONN_MAX_AGE.
+if bool(int(os.getenv('DB_POOL', 0))):
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 4)),
+        # seconds a request waits for a free connection before failing
+        'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+        'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', 600)),
+        'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', 3600)),
+    }
+
+# Read replicas for the public blog pages (see utils/replicas.py):
+# POSTGRES_REPLICA_HOSTS="host[:port],..." and/or POSTGRES_REPLICA_DBS (names,
+# or sqlite files). Each one becomes a replica_N alias with the primary's
+# other settings.
+DATABASE_REPLICAS = []
+for _i, (_host, _name) in enumerate(zip_longest(
+        filter(None, os.getenv('POSTGRES_REPLICA_HOSTS', '').split(',')),
+        filter(None, os.getenv('POSTGRES_REPLICA_DBS', '').split(','))), 1):
+    _replica = deepcopy(DATABASES['default'])
+    if _host:
+        _replica['HOST'], _, _port = _host.strip().partition(':')
+        _replica['PORT'] = _port or _replica['PORT']
+    if _name:
+        _replica['NAME'] = _name.strip()
+    # tests read the replicas from the test database of the primary
+    _replica['TEST'] = {'MIRROR': 'default'}
+    DATABASES[f'replica_{_i}'] = _replica
+    DATABASE_REPLICAS.append(f'replica_{_i}')
+
+DATABASE_ROUTERS = ['utils.replicas.ReplicaRouter']
+# a write pins the writer's browser to the primary for this long...
+DB_REPLICA_STICKY_SECONDS = int(os.getenv('DB_REPLICA_STICKY_SECONDS', 60))
+# ...and every reader, so the shared caches aren't refilled from a replica
+# that hasn't caught up yet
+DB_REPLICA_LAG_SECONDS = int(os.getenv('DB_REPLICA_LAG_SECONDS', 5))
+# a replica that fails to connect is skipped for this long
+DB_REPLICA_RETRY_SECONDS = int(os.getenv('DB_REPLICA_RETRY_SECONDS', 30))
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Use a shared backend (redis, memcached, database...) in production, so every
+# worker sees the same invalidation keys. The LocMemCache default is per
+# process: fine for runserver and the tests, refused by gunicorn.conf.py with
+# more than one worker.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
 
@@ -151,6 +238,19 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATIC_ROOT = DATA_DIR / 'static'
 
+# collectstatic writes content-hashed copies (style.3f2a1b9c0d4e.css), a
+# manifest the {% static %} tag reads, and .gz/.br versions of them
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'utils.storage.StaticFilesStorage',
+    },
+}
+# hashed files are sent with "Cache-Control: immutable" and a year of max-age
+WHITENOISE_MAX_AGE = int(os.getenv('WHITENOISE_MAX_AGE', 3600))
+
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = DATA_DIR / 'media'
@@ -197,3 +297,82 @@ AXES_ENABLED = True
 AXES_FAILURE_LIMIT = 6
 AXES_COOLOFF_TIME = 1  # 1 hour
 AXES_RESET_ON_SUCCESS = True
+# axes looks for its own middleware path, MIDDLEWARE has a subclass of it
+SILENCED_SYSTEM_CHECKS = ['axes.W002']
+
+# Blog
+# Full-page cache for anonymous readers (see blog/page_cache.py)
+BLOG_PAGE_CACHE_ENABLED = bool(int(os.getenv('BLOG_PAGE_CACHE', 1)))
+BLOG_PAGE_CACHE_TIMEOUT = int(os.getenv('BLOG_PAGE_CACHE_TIMEOUT', 600))
+# seconds each process counts its hits/misses before adding them to the
+# shared counters of `manage.py page_cache`
+BLOG_PAGE_CACHE_STATS_INTERVAL = int(
+    os.getenv('BLOG_PAGE_CACHE_STATS_INTERVAL', 10))
+# ETag/Last-Modified and 304s for anonymous readers (see blog/page_cache.py)
+BLOG_CONDITIONAL_GET = bool(int(os.getenv('BLOG_CONDITIONAL_GET', 1)))
+
+# Entries of the per-process {% fragment %} LRU (header, menu, footer and
+# post cards, see blog/templatetags/fragments.py). 0 disables it, the
+# default with DEBUG so edited templates show up.
+BLOG_FRAGMENT_CACHE_SIZE = int(os.getenv(
+    'BLOG_FRAGMENT_CACHE_SIZE', 0 if DEBUG else 2000))
+
+# Admin changelists count tables bigger than this from the PostgreSQL
+# statistics instead of a COUNT(*) (blog.pagination.EstimatedCountPaginator)
+BLOG_ADMIN_ESTIMATED_COUNT_THRESHOLD = int(os.getenv(
+    'BLOG_ADMIN_ESTIMATED_COUNT_THRESHOLD', 100_000))
+
+# Posts in the RSS/Atom feeds (see blog/feeds.py)
+BLOG_FEED_ITEMS = int(os.getenv('BLOG_FEED_ITEMS', 20))
+# Post ids per sitemap-posts-N.xml (see blog/sitemaps.py)
+BLOG_SITEMAP_CHUNK_SIZE = int(os.getenv('BLOG_SITEMAP_CHUNK_SIZE', 5000))
+# Related posts listed on each post page (see blog/related.py)
+BLOG_RELATED_POSTS = int(os.getenv('BLOG_RELATED_POSTS', 5))
+
+# Keyset (cursor) pagination for the post listings instead of ?page=N
+BLOG_CURSOR_PAGINATION = bool(int(os.getenv('BLOG_CURSOR_PAGINATION', 0)))
+BLOG_CURSOR_COUNT_TIMEOUT = int(os.getenv('BLOG_CURSOR_COUNT_TIMEOUT', 300))
+
+# blog.async_views instead of blog.views, for SERVER_MODE=asgi
+BLOG_ASYNC_VIEWS = bool(int(os.getenv('BLOG_ASYNC_VIEWS', 0)))
+
+# auto: postgres (tsvector) on PostgreSQL, simple (python inverted index)
+# anywhere else. Also accepts a dotted path to a BaseSearchBackend.
+BLOG_SEARCH_BACKEND = os.getenv('BLOG_SEARCH_BACKEND', 'auto')
+
+# Image resizes run in `manage.py run_image_jobs`. 0 runs them inline.
+IMAGE_JOBS_ASYNC = bool(int(os.getenv('IMAGE_JOBS_ASYNC', 1)))
+IMAGE_JOBS_MAX_ATTEMPTS = int(os.getenv('IMAGE_JOBS_MAX_ATTEMPTS', 3))
+IMAGE_JOBS_LOCK_TIMEOUT = int(os.getenv('IMAGE_JOBS_LOCK_TIMEOUT', 600))
+# widths of the srcset renditions generated for covers and attachments
+IMAGE_RENDITION_WIDTHS = (320, 640, 900)
+# resize_image refuses images that decode to more pixels than this
+IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', 50_000_000))
+
+# Instrumentation (utils/instrumentation.py)
+# Fraction of the requests measured (0 disables it, 1 measures everything).
+PERF_SAMPLE_RATE = float(os.getenv('PERF_SAMPLE_RATE', 0))
+PERF_SERVER_TIMING = bool(int(os.getenv('PERF_SERVER_TIMING', int(DEBUG))))
+# directory shared by the gunicorn workers, so /metrics/ adds them all up
+# (empty: each worker only reports its own requests)
+PERF_METRICS_DIR = os.getenv('PERF_METRICS_DIR', '')
+# /metrics/ is served to staff users and to these addresses
+INTERNAL_IPS = [
+    ip.strip() for ip in os.getenv('INTERNAL_IPS', '127.0.0.1').split(',')
+    if ip.strip()
+]
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'perf': {
+            'handlers': ['console'],
+            'level': os.getenv('PERF_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
@@ -3,11 +3,13 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from utils.instrumentation import metrics_view
 
 urlpatterns = [
     path('', include('blog.urls')),
     path('admin/', admin.site.urls),
     path('summernote/', include('django_summernote.urls')),
+    path('metrics/', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.http import HttpRequest
 from .models import MenuLink, SiteSetup
+from images.jobs import get_status
 
 
 class MenuLinkInline(admin.TabularInline):
@@ -12,6 +13,13 @@ class MenuLinkInline(admin.TabularInline):
 class SiteSetupAdmin(admin.ModelAdmin):
     list_display = 'title', 'description'
     inlines = MenuLinkInline,
+    readonly_fields = 'favicon_status',
+
+    @admin.display(description='Processamento do favicon')
+    def favicon_status(self, obj):
+        if not obj.favicon:
+            return '-'
+        return get_status(obj.favicon.name)
 
     def has_add_permission(self, request: HttpRequest) -> bool:
         # basically, if has some register in DB, the user is not allowed to add
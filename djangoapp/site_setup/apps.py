@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SiteSetupConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'site_setup'
+
+    def ready(self):
+        from site_setup import checks, signals  # noqa: F401
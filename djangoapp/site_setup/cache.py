@@ -0,0 +1,102 @@
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+from site_setup.models import SiteSetup
+from utils.instrumentation import record_cache
+from utils.versions import new_version
+
+VERSION_KEY = 'site_setup:version'
+SNAPSHOT_KEY = 'site_setup:snapshot:{version}'
+
+# (version, snapshot) of the last snapshot this process has seen. The version
+# lives in the default cache, so with a shared backend every worker notices
+# when the admin edits the setup without needing a restart (checked by
+# `manage.py check --deploy`, site_setup.checks).
+_local: tuple[str, 'SiteSetupSnapshot | None'] | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class MenuLinkSnapshot:
+    text: str
+    url_or_path: str
+    new_tab: bool
+
+
+@dataclass(frozen=True, slots=True)
+class SiteSetupSnapshot:
+    version: str
+    title: str
+    description: str
+    show_header: bool
+    show_search: bool
+    show_menu: bool
+    show_description: bool
+    show_pagination: bool
+    show_footer: bool
+    favicon_url: str
+    menu_links: tuple[MenuLinkSnapshot, ...]
+
+
+def get_version() -> str:
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, new_version(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version() -> None:
+    cache.set(VERSION_KEY, new_version(), None)
+
+
+def build_snapshot(version: str) -> SiteSetupSnapshot | None:
+    setup = SiteSetup.objects.order_by('-id').first()
+    if setup is None:
+        return None
+
+    menu_links = tuple(
+        MenuLinkSnapshot(text, url_or_path, new_tab)
+        for text, url_or_path, new_tab in setup.menulink_set.order_by(
+            'id').values_list('text', 'url_or_path', 'new_tab')
+    )
+
+    return SiteSetupSnapshot(
+        version=version,
+        title=setup.title,
+        description=setup.description,
+        show_header=setup.show_header,
+        show_search=setup.show_search,
+        show_menu=setup.show_menu,
+        show_description=setup.show_description,
+        show_pagination=setup.show_pagination,
+        show_footer=setup.show_footer,
+        favicon_url=setup.favicon.url if setup.favicon else '',
+        menu_links=menu_links,
+    )
+
+
+def get_snapshot() -> SiteSetupSnapshot | None:
+    global _local
+
+    version = get_version()
+    if _local is not None and _local[0] == version:
+        record_cache(hit=True)
+        return _local[1]
+
+    key = SNAPSHOT_KEY.format(version=version)
+    # wrapped in a tuple so "no SiteSetup yet" (None) can be cached too
+    cached = cache.get(key)
+    record_cache(hit=cached is not None)
+    if cached is None:
+        cached = (build_snapshot(version),)
+        cache.set(key, cached, None)
+
+    _local = (version, cached[0])
+    return cached[0]
+
+
+async def aget_snapshot() -> SiteSetupSnapshot | None:
+    # one thread hop for the version check and, on a miss, the queries
+    return await sync_to_async(get_snapshot)()
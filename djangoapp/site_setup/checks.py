@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    # the setup version is a cache key: a per-process cache only tells the
+    # process that saved the setup
+    backend = settings.CACHES['default']['BACKEND']
+    if not backend.endswith('.LocMemCache'):
+        return []
+    return [Error(
+        'The default cache is a per-process LocMemCache.',
+        hint='Admin edits to the SiteSetup would only reach the worker that '
+             'saved them: set CACHE_BACKEND to a shared cache (redis, '
+             'memcached, database...).',
+        id='site_setup.E001',
+    )]
@@ -1,4 +1,4 @@
-from site_setup.models import SiteSetup
+from site_setup.cache import get_snapshot
 
 
 def cont_processor_example(req):
@@ -6,8 +6,9 @@ def cont_processor_example(req):
 
 
 def site_setup(request):
-    setup = SiteSetup.objects.order_by('-id').first()
-
+    # async views load the snapshot before rendering (blog.async_views)
+    if hasattr(request, 'site_setup_snapshot'):
+        return {'site_setup': request.site_setup_snapshot}
     return {
-        'site_setup': setup
+        'site_setup': get_snapshot()
     }
@@ -1,3 +1,56 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
 
-# Create your tests here.
+from site_setup.cache import get_snapshot
+from site_setup.checks import check_shared_cache
+from site_setup.models import MenuLink, SiteSetup
+
+
+class SiteSetupSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.setup = SiteSetup.objects.create(
+            title='Blog', description='Descrição')
+        MenuLink.objects.create(
+            text='Home', url_or_path='https://example.com/',
+            site_setup=self.setup)
+
+    def test_snapshot_is_served_without_queries_once_warm(self):
+        snapshot = get_snapshot()
+        self.assertEqual(snapshot.title, 'Blog')
+        self.assertEqual(
+            [link.text for link in snapshot.menu_links], ['Home'])
+
+        with self.assertNumQueries(0):
+            self.assertIs(get_snapshot(), snapshot)
+
+    def test_saving_setup_or_links_invalidates_snapshot(self):
+        get_snapshot()
+
+        self.setup.title = 'Novo título'
+        self.setup.save()
+        self.assertEqual(get_snapshot().title, 'Novo título')
+
+        MenuLink.objects.create(
+            text='Sobre', url_or_path='https://example.com/sobre/',
+            site_setup=self.setup)
+        self.assertEqual(
+            [link.text for link in get_snapshot().menu_links],
+            ['Home', 'Sobre'])
+
+        self.setup.delete()
+        self.assertIsNone(get_snapshot())
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_per_process_cache_is_an_error(self):
+        errors = check_shared_cache(None)
+        self.assertEqual([error.id for error in errors], ['site_setup.E001'])
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379'}})
+    def test_shared_cache_passes(self):
+        self.assertEqual(check_shared_cache(None), [])
@@ -1,21 +1,106 @@
-from pathlib import Path
+import os
+import tempfile
+
 from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
 from PIL import Image
 
+# Decoded images above this are refused instead of blowing up the worker's
+# memory (a 50 MP RGB bitmap is ~150 MB).
+DEFAULT_MAX_PIXELS = 50_000_000
+# resize() first shrinks by an integer factor with reduce() (a cheap box
+# filter) down to this many times the target, then resamples with LANCZOS
+REDUCING_GAP = 3.0
+
+
+def draft_within_cap(image_pillow, name, size):
+    """
+    Lets the JPEG decoder skip what size doesn't need (draft() decodes at
+    1/2, 1/4 or 1/8 scale), then refuses image_pillow if what would be
+    decoded is still above IMAGE_MAX_PIXELS. Nothing is decoded yet.
+    """
+    max_pixels = getattr(settings, 'IMAGE_MAX_PIXELS', DEFAULT_MAX_PIXELS)
+    image_pillow.draft(None, size)
+    width, height = image_pillow.size
+    if width * height > max_pixels:
+        raise ValueError(
+            f'{name} is {width}x{height}, more than {max_pixels} pixels')
+
+
+def resize_image(image_django, new_width=800, optimize=True, quality=60,
+                 storage=None):
+    """
+    Shrinks an image in its storage to new_width, keeping the aspect ratio.
+
+    image_django is a FieldFile or a storage name. The image is read through
+    the storage (no MEDIA_ROOT paths). JPEGs are decoded straight at 1/2,
+    1/4 or 1/8 scale with draft(), so they never hold the full-resolution
+    bitmap. Other formats are refused above IMAGE_MAX_PIXELS and reduced by
+    an integer factor before the LANCZOS pass.
+    """
+    name = getattr(image_django, 'name', image_django)
+    storage = storage or getattr(image_django, 'storage', default_storage)
+
+    with storage.open(name, 'rb') as source:
+        with Image.open(source) as image_pillow:
+            image_format = image_pillow.format
+            original_width, original_height = image_pillow.size
 
-def resize_image(image_django, new_width=800, optimize=True, quality=60):
-    image_path = Path(settings.MEDIA_ROOT / image_django.name).resolve()
-    image_pillow = Image.open(image_path)
-    original_width, original_height = image_pillow.size
-    if original_width <= new_width:
-        image_pillow.close()
-        return image_pillow
-    new_height = round(new_width * original_height / original_width)
-    new_image = image_pillow.resize(
-        (new_width, new_height), Image.Resampling.LANCZOS)
-    new_image.save(
-        image_path,
-        optimize=optimize,
-        quality=quality,
-    )
+            if original_width <= new_width:
+                return None
+
+            new_height = round(
+                new_width * original_height / original_width)
+            draft_within_cap(image_pillow, name, (new_width, new_height))
+            new_image = image_pillow.resize(
+                (new_width, new_height), Image.Resampling.LANCZOS,
+                reducing_gap=REDUCING_GAP)
+
+    save_atomic(storage, name, new_image, image_format,
+                optimize=optimize, quality=quality)
     return new_image
+
+
+def save_atomic(storage, name, image, image_format, **params):
+    """
+    Writes image to name in storage, replacing the file there, and returns
+    its size in bytes. Readers never see a half-written file: on local
+    storage it is written next to the original and renamed over it, remote
+    storages that overwrite (S3 with file_overwrite...) replace the object
+    with one upload. The others would save next to an existing name, so the
+    original is deleted right before the upload.
+    """
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        path = None
+
+    if path is None or not os.path.exists(path):
+        # encoded before touching the original
+        with tempfile.SpooledTemporaryFile(max_size=10 * 1024 * 1024) as tmp:
+            image.save(tmp, image_format, **params)
+            size = tmp.tell()
+            tmp.seek(0)
+            if storage.get_available_name(name) != name:
+                storage.delete(name)
+            saved = storage.save(name, File(tmp, name=name))
+        if saved != name:
+            # another upload took the name in between: the posts still
+            # point at name
+            raise OSError(f'{name} was saved as {saved}')
+        return size
+
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            image.save(tmp, image_format, **params)
+            size = tmp.tell()
+        os.chmod(tmp_path, os.stat(path).st_mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return size
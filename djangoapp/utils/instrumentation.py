@@ -0,0 +1,435 @@
+"""
+Per-request performance metrics: SQL, template and cache timings of a
+sample of the requests, sent as a Server-Timing header, as log lines and
+aggregated for a Prometheus scrape at /metrics/.
+
+    PERF_SAMPLE_RATE = 0.05   # fraction of the requests measured
+    PERF_SERVER_TIMING = True # adds the Server-Timing header
+    PERF_METRICS_DIR = '/dev/shm/perf-metrics'
+
+Each process aggregates its own requests. With PERF_METRICS_DIR, every
+process also writes its aggregates there (at most once per second) and
+/metrics/ sums the files of all the gunicorn workers, the recycled ones
+included; gunicorn.conf.py empties the directory when the server starts.
+Without it /metrics/ only shows the worker that answered the scrape.
+"""
+import atexit
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.urls import resolve, Resolver404
+
+logger = logging.getLogger('perf')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+# (prometheus metric, Registry key)
+COUNTERS = (
+    ('django_sql_queries_total', 'queries'),
+    ('django_sql_duplicate_queries_total', 'duplicate_queries'),
+    ('django_sql_connections_total', 'connections'),
+    ('django_sql_seconds_total', 'sql_time'),
+    ('django_template_seconds_total', 'template_time'),
+    ('django_cache_hits_total', 'cache_hits'),
+    ('django_cache_misses_total', 'cache_misses'),
+    ('django_response_bytes_total', 'bytes'),
+)
+
+
+@dataclass(slots=True)
+class RequestMetrics:
+    view: str = ''
+    status: int = 0
+    duration: float = 0.0
+    queries: int = 0
+    sql_time: float = 0.0
+    # new database connections (pool checkouts with DB_POOL)
+    connections: int = 0
+    statements: Counter = field(default_factory=Counter)
+    template_time: float = 0.0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    size: int = 0
+
+    @property
+    def duplicate_queries(self) -> int:
+        return sum(count - 1 for count in self.statements.values())
+
+    def as_server_timing(self) -> str:
+        return ', '.join((
+            f'total;dur={self.duration * 1000:.1f}',
+            f'db;dur={self.sql_time * 1000:.1f};desc="{self.queries} '
+            f'queries, {self.duplicate_queries} duplicated, '
+            f'{self.connections} connections"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'cache;desc="{self.cache_hits} hits, {self.cache_misses} '
+            'misses"',
+        ))
+
+    def as_log(self) -> dict:
+        return {
+            'view': self.view,
+            'status': self.status,
+            'ms': round(self.duration * 1000, 2),
+            'queries': self.queries,
+            'sql_ms': round(self.sql_time * 1000, 2),
+            'duplicate_queries': self.duplicate_queries,
+            'db_connections': self.connections,
+            'template_ms': round(self.template_time * 1000, 2),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'bytes': self.size,
+        }
+
+
+# None outside of sampled requests: every hook below is a ContextVar lookup
+# when a request is not measured
+_current: ContextVar[RequestMetrics | None] = ContextVar(
+    'request_metrics', default=None)
+
+
+def record_cache(hit: bool) -> None:
+    metrics = _current.get()
+    if metrics is None:
+        return
+    if hit:
+        metrics.cache_hits += 1
+    else:
+        metrics.cache_misses += 1
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.sql_time += time.perf_counter() - start
+        metrics.queries += 1
+        metrics.statements[(sql, repr(params))] += 1
+
+
+def _install_execute_wrapper(connection):
+    # the wrapper looks the metrics up in a ContextVar instead of being
+    # added per request, so it also sees the queries of sync_to_async threads
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    _install_execute_wrapper(connection)
+    # counted for every request, sampled or not: shows whether
+    # CONN_MAX_AGE/DB_POOL actually reuse connections
+    registry.connection_created(connection.alias)
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.connections += 1
+
+
+connection_created.connect(_on_connection_created)
+for _connection in connections.all(initialized_only=True):
+    _install_execute_wrapper(_connection)
+
+
+def _new_view() -> dict:
+    return {
+        'requests': Counter(),
+        'buckets': [0] * len(DURATION_BUCKETS),
+        'duration': 0.0, 'sql_time': 0.0, 'template_time': 0.0,
+        'queries': 0, 'duplicate_queries': 0, 'connections': 0,
+        'cache_hits': 0, 'cache_misses': 0, 'bytes': 0,
+    }
+
+
+class Registry:
+    """Per-process aggregates of the sampled requests, per view."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views: dict[str, dict] = {}
+        self.connections: Counter = Counter()
+        # (pid, file name) of PERF_METRICS_DIR: a forked worker gets its own
+        self.file: tuple[int, str] | None = None
+        self.saved_at = 0.0
+        self.timer: threading.Timer | None = None
+
+    def connection_created(self, alias: str) -> None:
+        with self.lock:
+            self.connections[alias] += 1
+        self.save()
+
+    def add(self, metrics: RequestMetrics) -> None:
+        with self.lock:
+            view = self.views.setdefault(metrics.view, _new_view())
+            view['requests'][metrics.status] += 1
+            for i, bucket in enumerate(DURATION_BUCKETS):
+                if metrics.duration <= bucket:
+                    view['buckets'][i] += 1
+            view['duration'] += metrics.duration
+            view['sql_time'] += metrics.sql_time
+            view['template_time'] += metrics.template_time
+            view['queries'] += metrics.queries
+            view['duplicate_queries'] += metrics.duplicate_queries
+            view['connections'] += metrics.connections
+            view['cache_hits'] += metrics.cache_hits
+            view['cache_misses'] += metrics.cache_misses
+            view['bytes'] += metrics.size
+        self.save()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.views.clear()
+            self.connections.clear()
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                'views': {
+                    name: dict(view, requests=dict(view['requests']),
+                               buckets=list(view['buckets']))
+                    for name, view in self.views.items()
+                },
+                'connections': dict(self.connections),
+            }
+
+    def merge(self, snapshot: dict) -> None:
+        with self.lock:
+            for name, other in snapshot['views'].items():
+                view = self.views.setdefault(name, _new_view())
+                for status, count in other['requests'].items():
+                    view['requests'][int(status)] += count
+                view['buckets'] = [
+                    a + b for a, b in zip(view['buckets'], other['buckets'])]
+                for key, value in other.items():
+                    if key not in ('requests', 'buckets'):
+                        view[key] += value
+            self.connections.update(snapshot['connections'])
+
+    def save(self, force: bool = False) -> None:
+        """Writes this process' aggregates to PERF_METRICS_DIR."""
+        directory = getattr(settings, 'PERF_METRICS_DIR', '')
+        if not directory:
+            return
+        now = time.monotonic()
+        if not force and now - self.saved_at < 1:
+            # written once the second is over, even if no request follows
+            with self.lock:
+                if self.timer is None or not self.timer.is_alive():
+                    self.timer = threading.Timer(
+                        1 - (now - self.saved_at), self.save, (True,))
+                    self.timer.daemon = True
+                    self.timer.start()
+            return
+        self.saved_at = now
+
+        pid = os.getpid()
+        if self.file is None or self.file[0] != pid:
+            # the time tells a recycled worker from a new one with its pid
+            self.file = (pid, f'{pid}-{time.time_ns()}.json')
+        path = os.path.join(directory, self.file[1])
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(f'{path}.tmp', 'w') as file:
+                json.dump(self.snapshot(), file)
+            # readers never see a half-written file
+            os.replace(f'{path}.tmp', path)
+        except OSError:
+            logger.exception('Could not write %s', path)
+
+    def as_prometheus(self) -> str:
+        with self.lock:
+            views = sorted(
+                (name, dict(view, requests=Counter(view['requests']),
+                            buckets=list(view['buckets'])))
+                for name, view in self.views.items()
+            )
+            connections_created = sorted(self.connections.items())
+
+        lines = ['# TYPE django_requests_total counter']
+        for name, view in views:
+            for status, count in sorted(view['requests'].items()):
+                lines.append(
+                    f'django_requests_total{{view="{name}",status="{status}"}}'
+                    f' {count}')
+
+        lines.append('# TYPE django_request_duration_seconds histogram')
+        for name, view in views:
+            count = sum(view['requests'].values())
+            for bucket, value in zip(DURATION_BUCKETS, view['buckets']):
+                lines.append(
+                    'django_request_duration_seconds_bucket'
+                    f'{{view="{name}",le="{bucket}"}} {value}')
+            lines += [
+                'django_request_duration_seconds_bucket'
+                f'{{view="{name}",le="+Inf"}} {count}',
+                'django_request_duration_seconds_sum'
+                f'{{view="{name}"}} {view["duration"]:.6f}',
+                'django_request_duration_seconds_count'
+                f'{{view="{name}"}} {count}',
+            ]
+
+        for metric, key in COUNTERS:
+            lines.append(f'# TYPE {metric} counter')
+            for name, view in views:
+                lines.append(f'{metric}{{view="{name}"}} {view[key]:g}')
+
+        lines.append('# TYPE django_db_connections_created_total counter')
+        for alias, count in connections_created:
+            lines.append(
+                f'django_db_connections_created_total{{alias="{alias}"}} '
+                f'{count}')
+        lines += pool_metrics()
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+# what the last second added, when a worker exits or is recycled
+atexit.register(registry.save, force=True)
+
+
+def collect() -> Registry:
+    """The aggregates of every process of PERF_METRICS_DIR (or this one)."""
+    directory = getattr(settings, 'PERF_METRICS_DIR', '')
+    if not directory:
+        return registry
+    registry.save(force=True)
+
+    collected = Registry()
+    for entry in os.scandir(directory):
+        if not entry.name.endswith('.json'):
+            continue
+        try:
+            with open(entry.path) as file:
+                collected.merge(json.load(file))
+        except (OSError, ValueError):
+            # removed by a restart in the meantime
+            continue
+    return collected
+
+
+def pool_metrics() -> list[str]:
+    # psycopg_pool statistics of the DB_POOL pools opened by this process,
+    # the worker answering the scrape even with PERF_METRICS_DIR
+    lines = []
+    for connection in connections.all(initialized_only=True):
+        pool = getattr(connection, 'pool', None)
+        if pool is None or pool.closed:
+            continue
+        for stat, value in sorted(pool.get_stats().items()):
+            metric = f'django_db_{stat}'
+            lines += [
+                f'# TYPE {metric} gauge',
+                f'{metric}{{alias="{connection.alias}"}} {value}',
+            ]
+    return lines
+
+
+def is_sampled() -> bool:
+    rate = getattr(settings, 'PERF_SAMPLE_RATE', 0)
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+def view_name(request) -> str:
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return '<unresolved>'
+    return match.view_name
+
+
+class _TemplateTimer:
+    def __init__(self, metrics: RequestMetrics):
+        self.metrics = metrics
+        self.start = time.perf_counter()
+
+    def __call__(self, response):
+        self.metrics.template_time += time.perf_counter() - self.start
+
+
+def _finish(request, response, metrics: RequestMetrics, start: float):
+    metrics.duration = time.perf_counter() - start
+    metrics.view = view_name(request)
+    metrics.status = response.status_code
+    if not response.streaming:
+        metrics.size = len(response.content)
+
+    registry.add(metrics)
+    logger.info(json.dumps(metrics.as_log()))
+    if getattr(settings, 'PERF_SERVER_TIMING', settings.DEBUG):
+        response['Server-Timing'] = metrics.as_server_timing()
+    return response
+
+
+class PerformanceMiddleware:
+    """
+    Measures a sample of the requests (settings.PERF_SAMPLE_RATE). Put it
+    first in MIDDLEWARE so the timings include the other middlewares and the
+    template rendering of TemplateResponses.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not is_sampled():
+            return self.get_response(request)
+
+        metrics, start = RequestMetrics(), time.perf_counter()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return _finish(request, response, metrics, start)
+
+    async def __acall__(self, request):
+        if not is_sampled():
+            return await self.get_response(request)
+
+        metrics, start = RequestMetrics(), time.perf_counter()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return _finish(request, response, metrics, start)
+
+    def process_template_response(self, request, response):
+        metrics = _current.get()
+        if metrics is not None:
+            # runs right before render(): the callback sees the render time
+            response.add_post_render_callback(_TemplateTimer(metrics))
+        return response
+
+
+def metrics_view(request):
+    """Prometheus text exposition of the sampled requests (see collect)."""
+    remote_addr = request.META.get('REMOTE_ADDR')
+    if not (request.user.is_staff or remote_addr in settings.INTERNAL_IPS):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        collect().as_prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8')
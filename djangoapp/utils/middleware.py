@@ -0,0 +1,68 @@
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from axes.helpers import get_lockout_response
+from axes.middleware import AxesMiddleware as BaseAxesMiddleware
+from django.conf import settings
+from whitenoise.middleware import (
+    WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+)
+
+
+class AxesMiddleware(BaseAxesMiddleware):
+    """
+    axes.middleware.AxesMiddleware that also runs natively under ASGI. The
+    original is sync only, so django would run every async view in a thread
+    behind it.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+
+        if settings.AXES_ENABLED and getattr(
+                request, 'axes_locked_out', None):
+            credentials = getattr(request, 'axes_credentials', None)
+            response = await sync_to_async(get_lockout_response)(
+                request, credentials)
+        return response
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    """
+    whitenoise.middleware.WhiteNoiseMiddleware, async capable for the same
+    reason as AxesMiddleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
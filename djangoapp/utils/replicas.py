@@ -0,0 +1,150 @@
+"""
+Sends the reads of the public blog pages to the read replicas
+(settings.DATABASE_REPLICAS, from POSTGRES_REPLICA_HOSTS). The admin, every
+write and the management commands keep using the primary.
+
+ReplicaMiddleware marks the requests to READ_NAMESPACES and ReplicaRouter
+picks one replica per request for them. After a write:
+
+- the writer's browser reads from the primary for DB_REPLICA_STICKY_SECONDS
+  (a cookie, so anonymous pages don't need the session),
+- every reader does for DB_REPLICA_LAG_SECONDS, so the page cache and the
+  site_setup snapshot aren't refilled from a replica that is behind.
+
+A replica that fails to connect is skipped for DB_REPLICA_RETRY_SECONDS.
+"""
+import logging
+import random
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+READ_NAMESPACES = {'blog'}
+PIN_COOKIE = 'db_primary'
+LAST_WRITE_KEY = 'replicas:last_write'
+
+
+@dataclass(slots=True)
+class RequestState:
+    # the request may read from a replica
+    replica: bool = False
+    # database of the reads, chosen on the first one
+    alias: str | None = None
+    wrote: bool = False
+
+
+_state: ContextVar[RequestState | None] = ContextVar(
+    'replica_state', default=None)
+
+# replica alias: time.monotonic() until which it is skipped
+_down: dict[str, float] = {}
+
+
+def choose_replica() -> str:
+    if cache.get(LAST_WRITE_KEY) is not None:
+        return DEFAULT_DB_ALIAS
+
+    now = time.monotonic()
+    replicas = [
+        alias for alias in settings.DATABASE_REPLICAS
+        if _down.get(alias, 0) <= now
+    ]
+    random.shuffle(replicas)
+    for alias in replicas:
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError:
+            logger.warning('Replica %s unavailable', alias, exc_info=True)
+            _down[alias] = now + settings.DB_REPLICA_RETRY_SECONDS
+            continue
+        return alias
+    return DEFAULT_DB_ALIAS
+
+
+def mark_written() -> None:
+    state = _state.get()
+    if state is not None:
+        if state.wrote:
+            return
+        state.wrote = True
+        # read back what was just written
+        state.alias = DEFAULT_DB_ALIAS
+    if settings.DATABASE_REPLICAS:
+        cache.set(LAST_WRITE_KEY, True, settings.DB_REPLICA_LAG_SECONDS)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.replica:
+            return None
+        if state.alias is None:
+            state.alias = choose_replica()
+        return state.alias
+
+    def db_for_write(self, model, **hints):
+        mark_written()
+        # not None: an object read from a replica is saved to the primary
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas have the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get the schema through replication
+        return False if db in settings.DATABASE_REPLICAS else None
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RequestState()
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._finish(state, response)
+
+    async def __acall__(self, request):
+        state = RequestState()
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._finish(state, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _state.get()
+        if state is not None and not state.wrote:
+            state.replica = bool(
+                settings.DATABASE_REPLICAS
+                and request.method in ('GET', 'HEAD')
+                and request.resolver_match.namespace in READ_NAMESPACES
+                and PIN_COOKIE not in request.COOKIES
+            )
+
+    def _finish(self, state: RequestState, response):
+        if state.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.DB_REPLICA_STICKY_SECONDS,
+                httponly=True, samesite='Lax')
+        return response
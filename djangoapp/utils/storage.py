@@ -0,0 +1,17 @@
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class StaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """
+    Falls back to the plain name for files missing from the manifest (the
+    tests, or DEBUG=0 before collectstatic ran) instead of raising, so a
+    missing file is a 404 on that file rather than a 500 on the page.
+    """
+
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
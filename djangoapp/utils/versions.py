@@ -0,0 +1,15 @@
+import time
+from uuid import uuid4
+
+
+def new_version() -> str:
+    # starts with the creation time, which is the Last-Modified of the pages
+    # that depend on it
+    return f'{int(time.time())}-{uuid4().hex}'
+
+
+def version_time(version: str) -> int | None:
+    timestamp, _, rest = version.partition('-')
+    if not rest or not timestamp.isdigit():
+        return None
+    return int(timestamp)
@@ -1,2 +1,4 @@
 #!/bin/sh
+# copia os arquivos com o hash do conteúdo no nome e gera as versões .gz/.br
+# (STORAGES em project/settings.py)
 python manage.py collectstatic --noinput
\ No newline at end of file
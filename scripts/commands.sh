@@ -5,6 +5,5 @@ set -e
 
 wait_psql.sh
 collectstatic.sh
-makemigrations.sh
 migrate.sh
-runserver.sh
\ No newline at end of file
+server.sh
\ No newline at end of file
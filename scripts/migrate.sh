@@ -1,2 +1,5 @@
 #!/bin/sh
-python manage.py migrate --noinput
\ No newline at end of file
+python manage.py migrate --noinput
+# posts never rendered (migration 0010) or rendered by an older
+# blog/rendering.py are served unsanitized until they are rendered again
+python manage.py render_posts
@@ -0,0 +1,9 @@
+#!/bin/sh
+
+# SERVER_MODE: "wsgi" (padrão) ou "asgi" sobem o gunicorn com vários
+# workers (djangoapp/gunicorn.conf.py). "dev" usa o runserver do Django.
+if [ "$SERVER_MODE" = "dev" ]; then
+  exec runserver.sh
+fi
+
+exec gunicorn --config gunicorn.conf.py